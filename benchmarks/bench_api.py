@@ -0,0 +1,88 @@
+"""Check that the throughput of ``render`` stays flat across many consecutive
+reports generated in the same process. Reports alternate between the light
+and dark themes and two scalings, which used to accumulate in the fonts and
+in ``FPDF`` itself.
+
+Usage: python benchmarks/bench_api.py [-r RENDERS] [-c COMMITS] [-g GEN]
+[-d DIRECTORY]
+"""
+
+from argparse import ArgumentParser
+from os import path
+from tempfile import gettempdir
+from time import perf_counter
+from types import SimpleNamespace
+
+from git import Repo
+from synthetic import build_repo
+
+from commits2pdf import RenderOptions, render
+from commits2pdf.commits import CommitTable
+from commits2pdf.ingest import iter_git_log
+from commits2pdf.logger import logger
+
+BLOCKS = 10
+# Throughput may vary a little between blocks, but not grow or shrink
+MAX_SLOWDOWN = 1.25
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-r", "--renders", type=int, default=1000)
+    parser.add_argument("-c", "--commits", type=int, default=50)
+    parser.add_argument("-g", "--gen", default="gen3")
+    parser.add_argument("-d", "--directory", default=gettempdir())
+    args = parser.parse_args()
+    logger.disabled = True
+
+    rpath = build_repo(
+        path.join(args.directory, f"c2p-bench-{args.commits}"), args.commits
+    )
+    table = CommitTable("owner", "bench", "main")
+    report = SimpleNamespace(
+        rname="bench",
+        owner="owner",
+        branch="main",
+        authors=None,
+        start_date=None,
+        end_date=None,
+        newest_n_commits=None,
+        oldest_n_commits=None,
+        include=None,
+        exclude=None,
+        reverse=False,
+        filtered_commits=[
+            dict(table.append(commit))
+            for commit in iter_git_log(Repo(rpath), "main")
+        ],
+    )
+    options = [
+        RenderOptions(gen=args.gen, dark=dark, scaling=scaling)
+        for dark in (False, True)
+        for scaling in (1.0, 1.5)
+    ]
+
+    block = max(args.renders // BLOCKS, 1)
+    rates, sizes = [], set()
+    for start in range(0, args.renders, block):
+        count = min(block, args.renders - start)
+        began = perf_counter()
+        for i in range(start, start + count):
+            pdf = render(report, options[i % len(options)])
+            if i < len(options) * 2:
+                sizes.add(len(pdf))
+        rate = count / (perf_counter() - began)
+        rates.append(rate)
+        print(
+            f"renders {start + 1:>5}-{start + count:<5}:"
+            f" {rate:8.1f} renders/s"
+        )
+    # Repeating the same options must give PDFs of the same size
+    assert len(sizes) == len(options), "reports depend on earlier reports"
+    slowdown = rates[0] / min(rates)
+    print(f"slowest block is {slowdown:.2f}x slower than the first")
+    assert slowdown < MAX_SLOWDOWN, "throughput falls across renders"
+
+
+if __name__ == "__main__":
+    main()
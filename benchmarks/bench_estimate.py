@@ -0,0 +1,95 @@
+"""Compare the time taken to find the lines each commit of a synthetic
+repository wraps into, with ``FPDF.multi_cell`` and with ``LineCounter`` (with
+and without NumPy).
+
+Usage: python benchmarks/bench_estimate.py [-c COMMITS] [-d DIRECTORY]
+"""
+
+from argparse import ArgumentParser
+from os import path
+from tempfile import gettempdir
+from time import perf_counter
+from typing import List
+
+from fpdf import FPDF
+from git import Repo
+from synthetic import build_repo
+
+from commits2pdf import metrics
+from commits2pdf.commits import CommitTable
+from commits2pdf.constants import (
+    INFO_TEXT_FONT,
+    MARGIN_LR,
+    MARGIN_TB,
+    MEDIUM_TEXT_FONT_BOLD,
+    SMALL_TEXT_FONT,
+)
+from commits2pdf.ingest import iter_git_log
+from commits2pdf.metrics import ESTIMATE_BATCH_SIZE, LineCounter
+
+PARTS = (
+    ("info", INFO_TEXT_FONT),
+    ("title", MEDIUM_TEXT_FONT_BOLD),
+    ("description", SMALL_TEXT_FONT),
+)
+
+
+def with_fpdf(pdf: FPDF, texts: List[str], font: List[float]) -> List[int]:
+    pdf.set_font(*font)
+    return [
+        len(pdf.multi_cell(w=0, h=1, txt=txt, split_only=True))
+        for txt in texts
+    ]
+
+
+def with_counter(pdf: FPDF, texts: List[str], font: List[float]) -> List[int]:
+    counter = LineCounter(pdf, font)
+    lines = []
+    for i in range(0, len(texts), ESTIMATE_BATCH_SIZE):
+        lines.extend(counter.count(texts[i : i + ESTIMATE_BATCH_SIZE]))
+    return lines
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-c", "--commits", type=int, default=10_000)
+    parser.add_argument("-d", "--directory", default=gettempdir())
+    args = parser.parse_args()
+
+    rpath = build_repo(
+        path.join(args.directory, f"c2p-bench-{args.commits}"), args.commits
+    )
+    table = CommitTable("owner", "bench", "main")
+    commits = [
+        table.append(commit) for commit in iter_git_log(Repo(rpath), "main")
+    ]
+    pdf = FPDF()
+    pdf.set_margins(MARGIN_LR, MARGIN_TB)
+    pdf.add_page()
+    numpy = metrics.np
+    for name, count, np in (
+        ("multi_cell", with_fpdf, None),
+        ("python", with_counter, None),
+        ("numpy", with_counter, numpy),
+    ):
+        if name == "numpy" and numpy is None:
+            print("numpy: not installed")
+            continue
+        metrics.np = np
+        start = perf_counter()
+        lines = [
+            count(pdf, [commit[key] for commit in commits], font)
+            for key, font in PARTS
+        ]
+        elapsed = perf_counter() - start
+        if name == "multi_cell":
+            expected = lines
+        assert lines == expected, f"{name} disagrees with multi_cell"
+        print(
+            f"{name:>10}: {sum(map(sum, lines)):>8} lines in {elapsed:8.3f}s"
+        )
+    metrics.np = numpy
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Compare the GitPython and ``git log`` commit ingestion engines.
+
+Usage: python benchmarks/bench_ingest.py [-c COMMITS] [-d DIRECTORY]
+"""
+
+from argparse import ArgumentParser
+from os import path
+from tempfile import gettempdir
+from time import perf_counter
+
+from git import Repo
+from synthetic import build_repo
+
+from commits2pdf.commits import CommitTable
+from commits2pdf.ingest import iter_git_log
+
+
+def ingest(repo: Repo, engine: str) -> list:
+    """Gather and instantiate every commit on ``main`` with ``engine``."""
+    if engine == "git-log":
+        raw = iter_git_log(repo, "main")
+    else:
+        raw = repo.iter_commits(rev="main")
+    table = CommitTable("owner", "bench", "main")
+    return [table.append(commit) for commit in raw]
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-c", "--commits", type=int, default=10_000)
+    parser.add_argument("-d", "--directory", default=gettempdir())
+    args = parser.parse_args()
+
+    rpath = build_repo(
+        path.join(args.directory, f"c2p-bench-{args.commits}"), args.commits
+    )
+    results = {}
+    for engine in ("gitpython", "git-log"):
+        repo = Repo(rpath)  # Fresh object database caches for each engine
+        start = perf_counter()
+        results[engine] = ingest(repo, engine)
+        print(f"{engine:>10}: {perf_counter() - start:8.3f}s")
+
+    assert results["gitpython"] == results["git-log"], "Engines disagree"
+    print(
+        f"Both engines produced {len(results['git-log'])} identical commits."
+    )
+
+
+if __name__ == "__main__":
+    main()
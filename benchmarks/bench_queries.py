@@ -0,0 +1,91 @@
+"""Compare matching include queries one at a time against ``QueryMatcher``.
+
+Usage: python benchmarks/bench_queries.py [-c COMMITS] [-q QUERIES]
+[-d DIRECTORY]
+"""
+
+import random
+from argparse import ArgumentParser
+from os import path
+from tempfile import gettempdir
+from time import perf_counter
+from typing import List
+
+from git import Repo
+from synthetic import WORDS, build_repo
+
+from commits2pdf.commits import Commit, CommitTable
+from commits2pdf.ingest import iter_git_log
+from commits2pdf.matcher import QueryMatcher
+
+
+def make_queries(count: int, commits: int, seed: int = 0) -> List[str]:
+    """Make a mix of issue references and word pairs, as a long list of
+    queries would typically contain.
+    """
+    rng = random.Random(seed)
+    return [
+        (
+            f"#{rng.randrange(commits)}"
+            if i % 2
+            else f"{rng.choice(WORDS)} {rng.choice(WORDS)}"
+        )
+        for i in range(count)
+    ]
+
+
+def per_query(commits: List[Commit], queries: List[str]) -> List[Commit]:
+    """Match queries the way ``_include_commits`` did before
+    ``QueryMatcher``.
+    """
+    return [
+        commit
+        for commit in commits
+        if any(
+            q.casefold() in commit["description"].casefold()
+            or q.casefold() in commit["title"].casefold()
+            for q in queries
+        )
+    ]
+
+
+def compiled(commits: List[Commit], queries: List[str]) -> List[Commit]:
+    matcher = QueryMatcher(queries)
+    return [
+        commit
+        for commit in commits
+        if matcher.matches(commit["title"], commit["description"])
+    ]
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-c", "--commits", type=int, default=10_000)
+    parser.add_argument("-q", "--queries", default="1,10,100,250")
+    parser.add_argument("-d", "--directory", default=gettempdir())
+    args = parser.parse_args()
+
+    rpath = build_repo(
+        path.join(args.directory, f"c2p-bench-{args.commits}"), args.commits
+    )
+    table = CommitTable("owner", "bench", "main")
+    commits = [
+        table.append(commit) for commit in iter_git_log(Repo(rpath), "main")
+    ]
+    for count in map(int, args.queries.split(",")):
+        queries = make_queries(count, args.commits)
+        timings, results = [], []
+        for match in (per_query, compiled):
+            start = perf_counter()
+            results.append(match(commits, queries))
+            timings.append(perf_counter() - start)
+        assert results[0] == results[1], "Matchers disagree"
+        print(
+            f"{count:>5} queries: {timings[0]:8.3f}s per query,"
+            f" {timings[1]:8.3f}s compiled ({timings[0] / timings[1]:.1f}x),"
+            f" {len(results[1])} matching commits"
+        )
+
+
+if __name__ == "__main__":
+    main()
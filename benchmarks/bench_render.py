@@ -0,0 +1,105 @@
+"""Compare the time taken by the fpdf generation implementations to render a
+synthetic repository. gen2b copies the whole PDF for every commit, so it is
+only run on the first ``--gen2b-commits`` commits. gen3 is also run with
+``--jobs`` worker processes.
+
+Usage: python benchmarks/bench_render.py [-c COMMITS] [-b GEN2B_COMMITS]
+[-j JOBS] [-d DIRECTORY]
+"""
+
+from argparse import ArgumentParser
+from os import cpu_count, path
+from tempfile import TemporaryDirectory, gettempdir
+from time import perf_counter
+from types import SimpleNamespace
+from typing import List
+
+from git import Repo
+from synthetic import build_repo
+
+from commits2pdf.commits import Commit, CommitTable
+from commits2pdf.constants import FPDF_LIGHT
+from commits2pdf.ingest import iter_git_log
+from commits2pdf.render_fpdf import FPDF_PDF
+
+MODES = {"gen2a": "stable", "gen2b": "unstable", "gen3": "measured"}
+
+
+class TimedPDF(FPDF_PDF):
+    """Time writing the PDF separately from laying out the commits."""
+
+    def _write(self) -> None:
+        start = perf_counter()
+        super()._write()
+        self.write_time = perf_counter() - start
+
+
+def render(
+    commits: List[Commit], gen: str, output: str, jobs: int = 1
+) -> TimedPDF:
+    """Render ``commits`` with the generation implementation ``gen``."""
+    report = SimpleNamespace(
+        rname="bench",
+        owner="owner",
+        branch="main",
+        authors=None,
+        start_date=None,
+        end_date=None,
+        newest_n_commits=None,
+        oldest_n_commits=None,
+        include=None,
+        exclude=None,
+        reverse=False,
+        filtered_commits=commits,
+    )
+    return TimedPDF(
+        report, output, f"{gen}.pdf", FPDF_LIGHT, MODES[gen], 1.0, jobs=jobs
+    )
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-c", "--commits", type=int, default=10_000)
+    parser.add_argument("-b", "--gen2b-commits", type=int, default=500)
+    parser.add_argument("-j", "--jobs", type=int, default=cpu_count())
+    parser.add_argument("-d", "--directory", default=gettempdir())
+    args = parser.parse_args()
+
+    rpath = build_repo(
+        path.join(args.directory, f"c2p-bench-{args.commits}"), args.commits
+    )
+    table = CommitTable("owner", "bench", "main")
+    commits = [
+        table.append(commit) for commit in iter_git_log(Repo(rpath), "main")
+    ]
+    with TemporaryDirectory() as output:
+        pages = {}
+        for gen, count, jobs in (
+            ("gen2a", len(commits), 1),
+            ("gen3", len(commits), 1),
+            ("gen3", len(commits), args.jobs),
+            ("gen3", args.gen2b_commits, 1),
+            ("gen2b", args.gen2b_commits, 1),
+        ):
+            start = perf_counter()
+            pdf = render(commits[:count], gen, output, jobs)
+            elapsed = perf_counter() - start
+            pages[gen, count, jobs] = pdf._p.page_no()
+            print(
+                f"{gen:>6}: {count:>7} commits, {jobs:>2} job(s),"
+                f" {pages[gen, count, jobs]:>6} pages"
+                f" in {elapsed:8.3f}s ({elapsed - pdf.write_time:8.3f}s"
+                f" layout, {pdf.write_time:8.3f}s writing)"
+            )
+    assert (
+        pages["gen3", args.gen2b_commits, 1]
+        == pages["gen2b", args.gen2b_commits, 1]
+    ), "gen3 and gen2b disagree"
+    assert (
+        pages["gen3", len(commits), 1]
+        == pages["gen3", len(commits), args.jobs]
+    ), "gen3 disagrees with itself when drawn in parallel"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Check that starting ``c2p`` stays fast. Printing the help and rejecting an
+invalid argument must only import the standard library (apart from
+``commits2pdf`` itself), and the modules imported by each must take at most
+``--budget`` milliseconds to import, according to ``python -X importtime``.
+The import time of a bare interpreter is subtracted, and the fastest of
+``--repeat`` runs is used.
+
+Usage: python benchmarks/bench_startup.py [-b BUDGET] [-r REPEAT]
+"""
+
+import subprocess
+import sys
+from argparse import ArgumentParser
+from os import path
+from typing import Dict, List, Tuple
+
+# The packages which must only be imported once they are used, checked in
+# addition to the standard library on Python versions before 3.10
+HEAVY = ("cairo", "fpdf", "git", "pathvalidate", "tqdm")
+# The default budget in milliseconds
+BUDGET = 80.0
+COMMANDS = {
+    "help": ["-h"],
+    "invalid date": ["owner", "-s", "31/02/2024"],
+    "invalid email": ["owner", "-a", "not-an-email"],
+}
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+
+def import_times(args: List[str]) -> Dict[str, Tuple[int, int]]:
+    """Run ``c2p`` with ``args`` (or a bare interpreter if ``args`` is
+    ``None``) and return the self and cumulative import time in microseconds
+    of each module it imports.
+    """
+    command = (
+        ["-c", "pass"] if args is None else ["-m", "commits2pdf.cli", *args]
+    )
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", *command],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    ).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        # Modules are indented by the depth they were imported at
+        times[name.strip()] = (
+            int(own),
+            int(cumulative) if not name[1:].startswith(" ") else 0,
+        )
+    return times
+
+
+def is_third_party(module: str) -> bool:
+    package = module.split(".")[0]
+    if package == "commits2pdf":
+        return False
+    if hasattr(sys, "stdlib_module_names"):  # Python 3.10+
+        return package not in sys.stdlib_module_names
+    return package in HEAVY
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-b", "--budget", type=float, default=BUDGET)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # Modules imported by the interpreter itself (and ``site``)
+    bare = import_times(None)
+    failed = False
+    for command, argv in COMMANDS.items():
+        runs = [import_times(argv) for _ in range(args.repeat)]
+        modules = {
+            name: times for name, times in runs[0].items() if name not in bare
+        }
+        third_party = sorted(
+            {name.split(".")[0] for name in modules if is_third_party(name)}
+        )
+        best = min(
+            sum(cumulative for name, (_, cumulative) in run.items())
+            - sum(cumulative for _, cumulative in bare.values())
+            for run in runs
+        )
+        print(
+            f"{command:>14}: {best / 1000:7.1f}ms to import"
+            f" {len(modules)} module(s)"
+        )
+        if third_party:
+            print(f"{'':>16}imported {', '.join(third_party)}")
+            failed = True
+        if best / 1000 > args.budget:
+            slowest = sorted(
+                modules.items(), key=lambda item: item[1][0], reverse=True
+            )[:5]
+            print(
+                f"{'':>16}over the budget of {args.budget}ms. Slowest:"
+                f" {', '.join(f'{n} ({t[0] / 1000:.1f}ms)' for n, t in slowest)}"
+            )
+            failed = True
+    assert not failed, "Starting c2p imports too much"
+
+
+if __name__ == "__main__":
+    main()
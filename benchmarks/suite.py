@@ -0,0 +1,347 @@
+"""Benchmark every stage of ``commits2pdf`` on synthetic repositories and store
+the results as a JSON baseline, or compare two baselines to find regressions.
+
+``run`` times ingesting the commits with each engine, each kind of filter, and
+generating a PDF with each generator, theme and scaling, for each repository
+size. The time of each stage (see ``commits2pdf.profiling``) is stored with
+the time of each case, which is the fastest of ``--repeat`` runs. gen2b copies
+the whole PDF for every commit, so it only renders the newest
+``--gen2b-limit`` commits, and the other generators the newest
+``--render-limit``. gen1 is skipped if pycairo is not installed.
+
+``compare`` prints the change in the time of each case and exits with status
+1 if any case became slower by more than ``--threshold``.
+
+Usage: python benchmarks/suite.py run [-s SIZES] [-g GENERATORS]
+[-sc SCALINGS] [-r REPEAT] [-l RENDER_LIMIT] [-b GEN2B_LIMIT] [-d DIRECTORY]
+[-o OUTPUT]
+       python benchmarks/suite.py compare BASELINE RESULTS [-t THRESHOLD]
+[-m MIN_SECONDS]
+"""
+
+import json
+import platform
+import subprocess
+import sys
+from argparse import ArgumentParser, Namespace
+from datetime import datetime
+from os import cpu_count, path
+from tempfile import gettempdir
+from time import perf_counter
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Tuple
+
+from git import Repo
+from synthetic import (
+    START_TIMESTAMP,
+    SYNTHETIC_VERSION,
+    WORDS,
+    build_repo,
+)
+
+from commits2pdf import Profiler, RenderOptions, render
+from commits2pdf.commits import Commit, Commits, CommitTable
+from commits2pdf.ingest import iter_git_log
+from commits2pdf.logger import logger
+
+SUITE_VERSION = 1  # Increased whenever the cases change
+COMMITS_DEFAULTS: Dict[str, object] = dict(
+    owner="owner",
+    url=None,
+    branch="main",
+    authors=None,
+    start_date=None,
+    end_date=None,
+    reverse=False,
+    newest_n_commits=None,
+    oldest_n_commits=None,
+    include=None,
+    exclude=None,
+    regex_queries=False,
+    engine="git-log",
+    stream=False,
+    cache=False,
+    cache_dir=None,
+    clear_cache=False,
+    cache_size=None,
+    clone_cache=True,
+    clone_cache_size=None,
+    clone_filter="none",
+    after=None,
+)
+
+Case = Dict[str, object]
+
+
+def filters(size: int) -> Dict[str, Dict[str, object]]:
+    """The options of each kind of filter for a repository of ``size``
+    commits. Each keeps a part of its commits.
+    """
+    # The commits are 10 minutes apart, so the middle half is selected
+    start, end = (
+        datetime.fromtimestamp(START_TIMESTAMP + size * 600 * quarter // 4)
+        for quarter in (1, 3)
+    )
+    return {
+        "authors": dict(
+            authors=(
+                "author1@example.com,author2@example.com,author3@example.com"
+            )
+        ),
+        "dates": dict(start_date=start, end_date=end),
+        "include": dict(include=[WORDS[0], WORDS[5]]),
+        "exclude": dict(exclude=[WORDS[1]]),
+        "regex": dict(include=[r"#\d*7\b"], regex_queries=True),
+        "newest-n": dict(newest_n_commits=100),
+    }
+
+
+def measure(repeat: int, run: Callable[[Profiler], int]) -> Case:
+    """Call ``run`` with a profiler ``repeat`` times and keep the fastest
+    run. ``run`` returns the number of commits it processed.
+    """
+    best = None
+    for _ in range(repeat):
+        profiler = Profiler(memory=False)  # Tracing memory distorts times
+        profiler.start()
+        count = run(profiler)
+        profiler.stop()
+        if best is None or profiler.total.wall < best["seconds"]:
+            best = {
+                "seconds": round(profiler.total.wall, 6),
+                "count": count,
+                "stages": {
+                    name: round(stats.wall, 6)
+                    for name, stats in profiler.stages.items()
+                },
+            }
+    return best
+
+
+def collect(rpath: str, profiler: Profiler, **options) -> int:
+    """Collect and filter the commits of ``rpath`` with ``Commits``."""
+    commits = Commits(
+        rpath=rpath, profiler=profiler, **{**COMMITS_DEFAULTS, **options}
+    )
+    try:
+        return len(commits.filtered_commits)
+    finally:
+        commits.close()
+
+
+def report(commits: List[Commit]) -> SimpleNamespace:
+    """Stand in for ``Commits`` when rendering commits gathered earlier."""
+    return SimpleNamespace(
+        rname="bench",
+        owner="owner",
+        branch="main",
+        authors=None,
+        start_date=None,
+        end_date=None,
+        newest_n_commits=None,
+        oldest_n_commits=None,
+        include=None,
+        exclude=None,
+        reverse=False,
+        filtered_commits=commits,
+    )
+
+
+def generators(names: List[str]) -> List[str]:
+    """The generators in ``names`` that can run here."""
+    try:
+        import cairo  # noqa: F401
+    except ImportError:
+        if "gen1" in names:
+            print("Skipping gen1, since pycairo is not installed.")
+        return [name for name in names if name != "gen1"]
+    return names
+
+
+def run_suite(args: Namespace) -> Dict[str, Case]:
+    """Run every case, printing each result as it finishes."""
+    cases: Dict[str, Case] = {}
+
+    def record(name: str, run: Callable[[Profiler], int]) -> None:
+        if name in cases:  # Rendering is limited, so sizes can overlap
+            return
+        cases[name] = measure(args.repeat, run)
+        print(
+            f"{name:<40} {cases[name]['seconds']:10.3f}s"
+            f" {cases[name]['count']:>8} commit(s)"
+        )
+
+    gens = generators(args.generators.split(","))
+    scalings = [float(scaling) for scaling in args.scalings.split(",")]
+    for size in map(int, args.sizes.split(",")):
+        rpath = build_repo(
+            path.join(args.directory, f"c2p-bench-{size}"), size
+        )
+        for engine in ("gitpython", "git-log"):
+            record(
+                f"ingest/{engine}/{size}",
+                lambda p: collect(rpath, p, engine=engine),
+            )
+        for kind, options in filters(size).items():
+            record(
+                f"filter/{kind}/{size}",
+                lambda p: collect(rpath, p, **options),
+            )
+
+        table = CommitTable("owner", "bench", "main")
+        commits = [
+            table.append(commit)
+            for commit in iter_git_log(Repo(rpath), "main")
+        ]
+        for gen in gens:
+            limit = args.gen2b_limit if gen == "gen2b" else args.render_limit
+            chunk = commits[:limit]
+            for dark in (False, True):
+                # gen1 cannot be scaled
+                for scaling in [1.0] if gen == "gen1" else scalings:
+                    options = RenderOptions(
+                        gen=gen, dark=dark, scaling=scaling
+                    )
+                    record(
+                        f"render/{gen}/{'dark' if dark else 'light'}"
+                        f"/{scaling}/{len(chunk)}",
+                        lambda p: render_count(chunk, options, p),
+                    )
+    return cases
+
+
+def render_count(
+    commits: List[Commit], options: RenderOptions, profiler: Profiler
+) -> int:
+    """Render ``commits`` in memory and return how many were rendered."""
+    render(report(commits), options._replace(profiler=profiler))
+    return len(commits)
+
+
+def describe() -> Dict[str, object]:
+    """Describe where the suite was run, since times are only comparable on
+    the same machine.
+    """
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=path.dirname(path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": cpu_count(),
+    }
+
+
+def run(args: Namespace) -> None:
+    logger.disabled = True
+    start = perf_counter()
+    cases = run_suite(args)
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "version": SUITE_VERSION,
+                "synthetic_version": SYNTHETIC_VERSION,
+                **describe(),
+                "cases": cases,
+            },
+            f,
+            indent=2,
+        )
+    print(
+        f"Wrote {len(cases)} case(s) to {args.output}"
+        f" in {perf_counter() - start:.1f}s."
+    )
+
+
+def load(file: str) -> Tuple[Dict[str, object], Dict[str, Case]]:
+    with open(file) as f:
+        results = json.load(f)
+    if results.get("version") != SUITE_VERSION:
+        sys.exit(f"{file} was written by a different version of the suite.")
+    return results, results["cases"]
+
+
+def compare(args: Namespace) -> None:
+    baseline, old = load(args.baseline)
+    results, new = load(args.results)
+    if baseline["synthetic_version"] != results["synthetic_version"]:
+        sys.exit("The results were measured on different repositories.")
+    if baseline["platform"] != results["platform"]:
+        print("Warning: the results were measured on different platforms.")
+
+    regressions = 0
+    for name in sorted(old.keys() & new.keys()):
+        before, after = old[name]["seconds"], new[name]["seconds"]
+        change = after / before - 1 if before else 0.0
+        status = ""
+        if abs(after - before) >= args.min_seconds:
+            if change > args.threshold:
+                status = "REGRESSION"
+                regressions += 1
+            elif change < -args.threshold:
+                status = "improved"
+        print(
+            f"{name:<40} {before:10.3f}s {after:10.3f}s {change:+8.1%}"
+            f" {status}"
+        )
+        if status == "REGRESSION":  # Show the stages which became slower
+            stages = old[name]["stages"]
+            for stage, seconds in new[name]["stages"].items():
+                if seconds - stages.get(stage, 0.0) >= args.min_seconds:
+                    print(
+                        f"  {stage:<38} {stages.get(stage, 0.0):10.3f}s"
+                        f" {seconds:10.3f}s"
+                    )
+    for name in sorted(old.keys() - new.keys()):
+        print(f"{name:<40} only in the baseline")
+    for name in sorted(new.keys() - old.keys()):
+        print(f"{name:<40} only in the results")
+
+    print(f"{regressions} regression(s) over {args.threshold:.0%}.")
+    sys.exit(1 if regressions else 0)
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the suite.")
+    run_parser.add_argument("-s", "--sizes", default="1000,10000,100000")
+    run_parser.add_argument(
+        "-g", "--generators", default="gen1,gen2a,gen2b,gen3"
+    )
+    run_parser.add_argument("-sc", "--scalings", default="1.0,1.5")
+    run_parser.add_argument("-r", "--repeat", type=int, default=3)
+    run_parser.add_argument("-l", "--render-limit", type=int, default=10_000)
+    run_parser.add_argument("-b", "--gen2b-limit", type=int, default=500)
+    run_parser.add_argument("-d", "--directory", default=gettempdir())
+    run_parser.add_argument("-o", "--output", default="baseline.json")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser(
+        "compare", help="Compare results with a baseline."
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("results")
+    compare_parser.add_argument("-t", "--threshold", type=float, default=0.1)
+    # Ignore changes too small to measure reliably
+    compare_parser.add_argument(
+        "-m", "--min-seconds", type=float, default=0.01
+    )
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Build synthetic git repositories for benchmarking ``commits2pdf`` without
+network access. Repositories are written with ``git fast-import``, so even
+100k commits only take a few seconds to create.
+"""
+
+import random
+import subprocess
+from os import makedirs, path
+from shutil import rmtree
+from typing import List
+
+WORDS = (
+    "fix add update remove refactor build docs test bump merge feature "
+    "parser renderer cache layout branch commit author filter query page "
+    "font scaling theme clone fetch index tree blob über naïve café 日本 ✓"
+).split()
+NAMES = ("Author", "Zoë", "José", "Łukasz", "Søren", "Nguyễn", "李", "Андрей")
+START_TIMESTAMP = 1_600_000_000
+# Increased whenever the repositories change, so that they are rebuilt
+SYNTHETIC_VERSION = 2
+VERSION_FILE = path.join(".git", "c2p-synthetic")
+
+
+def _message(rng: random.Random, i: int) -> str:
+    """Make a commit message with a varied title and description length."""
+    title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 12)))
+    paragraphs: List[str] = []
+    for _ in range(rng.choice((0, 0, 1, 2, 4))):
+        paragraphs.append(
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 80)))
+        )
+    if rng.random() < 0.002:  # Rarely long enough to span several pages
+        paragraphs.append(" ".join(rng.choice(WORDS) for _ in range(3000)))
+    return "\n\n".join([f"{title} #{i}"] + paragraphs) + "\n"
+
+
+def build_repo(
+    dest: str,
+    commits: int,
+    authors: int = 50,
+    branch: str = "main",
+    seed: int = 0,
+) -> str:
+    """Create (or reuse) a repository at ``dest`` containing ``commits``
+    linear commits on ``branch`` and return its path. Repositories built by
+    an older version of this module are rebuilt.
+    """
+    try:
+        with open(path.join(dest, VERSION_FILE)) as f:
+            if f.read() == str(SYNTHETIC_VERSION):
+                return dest
+    except OSError:
+        pass
+    rmtree(dest, ignore_errors=True)
+    makedirs(dest)
+    subprocess.run(
+        ["git", "init", "-q", dest], check=True, stdout=subprocess.DEVNULL
+    )
+    rng = random.Random(seed)
+    proc = subprocess.Popen(
+        ["git", "-C", dest, "fast-import", "--quiet"],
+        stdin=subprocess.PIPE,
+    )
+    for i in range(commits):
+        n = rng.randrange(authors)
+        ident = f"{NAMES[n % len(NAMES)]} {n} <author{n}@example.com>"
+        timestamp = START_TIMESTAMP + i * 600
+        data = _message(rng, i).encode("utf-8")
+        blob = f"{i}\n".encode()
+        proc.stdin.write(
+            f"commit refs/heads/{branch}\n"
+            f"author {ident} {timestamp} +0000\n"
+            f"committer {ident} {timestamp} +0000\n"
+            f"data {len(data)}\n".encode()
+            + data
+            + f"M 644 inline file.txt\ndata {len(blob)}\n".encode()
+            + blob
+            + b"\n"
+        )
+    proc.stdin.close()
+    if proc.wait() != 0:
+        raise RuntimeError("git fast-import failed")
+    subprocess.run(
+        ["git", "-C", dest, "symbolic-ref", "HEAD", f"refs/heads/{branch}"],
+        check=True,
+    )
+    with open(path.join(dest, VERSION_FILE), "w") as f:
+        f.write(str(SYNTHETIC_VERSION))
+    return dest
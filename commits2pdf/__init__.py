@@ -1,3 +1,19 @@
-from .cli import main
+from importlib import import_module
 
-__all__ = ["main"]
+__all__ = ["main", "render", "Profiler", "RenderOptions"]
+__version__ = "1.1.17"  # The same as in setup.py
+
+# The module each name is imported from once it is first used, so importing
+# the package (including for ``python -m commits2pdf.cli``) stays cheap
+_EXPORTS = {
+    "main": "cli",
+    "render": "api",
+    "Profiler": "profiling",
+    "RenderOptions": "api",
+}
+
+
+def __getattr__(name: str) -> object:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(f".{_EXPORTS[name]}", __name__), name)
@@ -0,0 +1,138 @@
+"""A library API for generating reports in-process, such as from a service
+which generates many of them. Each report is independent of the reports
+generated before it in the same process, since the fonts and theme of a PDF
+belong to the instance generating it.
+"""
+
+from io import BytesIO
+from os import cpu_count, path
+from typing import BinaryIO, NamedTuple, Union
+
+from .constants import (
+    CAIRO_DARK,
+    CAIRO_LIGHT,
+    FILENAME,
+    FPDF_DARK,
+    FPDF_LIGHT,
+    WRAP_CACHE_SIZE,
+)
+from .profiling import stage
+
+MODES = {
+    "gen1": None,
+    "gen2a": "stable",
+    "gen2b": "unstable",
+    "gen3": "measured",
+}
+
+
+class RenderOptions(NamedTuple):
+    """How a report is generated, mirroring the command line arguments. The
+    PDF is written to the ``output`` directory, or to ``output`` if it is a
+    binary file object (such as a socket file or ``sys.stdout.buffer``), or
+    returned as bytes if it is ``None``. A ``timestamp`` (in Unix time) is
+    shown as the time the PDF was generated instead of the current time, so
+    that the same report always has the same bytes. With gen3, the commits can
+    be appended to an earlier report given its ``AppendState`` (see
+    ``append.py``), in which case an incremental update of it is written.
+    Each stage of generating the report is timed by a ``profiler`` if one is
+    given (see ``profiling.py``). The fpdf generators can share a
+    ``wrap_cache`` between reports, instead of filling a new one of
+    ``wrap_cache_size`` texts for each.
+    """
+
+    gen: str = "gen3"
+    dark: bool = False
+    scaling: float = 1.0
+    output: Union[str, BinaryIO, None] = None
+    name: str = FILENAME
+    wrap_cache_size: int = WRAP_CACHE_SIZE
+    jobs: int = 1  # Only used by gen3, or 0 for one per CPU
+    stream_write: bool = False
+    timestamp: Union[int, None] = None
+    append: object = None  # An ``AppendState``
+    profiler: object = None  # A ``Profiler``
+    wrap_cache: object = None  # A ``WrapCache``
+
+
+def render(
+    commits: object, options: RenderOptions = RenderOptions()
+) -> Union[bytes, str, None]:
+    """Generate a report of ``commits`` (a ``Commits`` instance). Return the
+    path of the PDF, its bytes if ``options.output`` is ``None``, or nothing
+    if it is written to a file object.
+    """
+    buffer = None
+    if options.output is None:
+        buffer = BytesIO()
+        options = options._replace(output=buffer)
+    pdf = make_pdf(commits, options)
+    if pdf.err_flag:
+        raise RuntimeError(f"Failed to generate a report of {commits.rname}")
+    if buffer is not None:
+        return buffer.getvalue()
+    if isinstance(options.output, str):
+        return path.join(options.output, pdf_filename(commits, options))
+    return None
+
+
+def make_pdf(commits: object, options: RenderOptions) -> object:
+    """Generate a report of ``commits`` with the generation implementation
+    selected by ``options``. Return the instance of the implementation, which
+    holds its wrap cache and (for gen3) layout plan.
+    """
+    if options.gen not in MODES:
+        raise ValueError(f"Unknown PDF generator: {options.gen}")
+    if isinstance(options.output, str):
+        output, fp = options.output, None
+    else:  # Nothing is written to the file system
+        output, fp = ".", options.output
+    args = [commits, output, pdf_filename(commits, options)]
+    # The commits are also walked while rendering them if they are streamed
+    with stage(options.profiler, "render"):
+        return _make_pdf(options, args, fp)
+
+
+def _make_pdf(options: RenderOptions, args: list, fp: object) -> object:
+    if options.gen == "gen1":
+        from .render_cairo import Cairo_PDF
+
+        return Cairo_PDF(
+            *args,
+            CAIRO_DARK if options.dark else CAIRO_LIGHT,
+            wrap_cache_size=options.wrap_cache_size,
+            fp=fp,
+            timestamp=options.timestamp,
+        )
+
+    from .render_fpdf import FPDF_PDF
+
+    return FPDF_PDF(
+        *args,
+        FPDF_DARK if options.dark else FPDF_LIGHT,
+        MODES[options.gen],
+        options.scaling,
+        wrap_cache_size=options.wrap_cache_size,
+        jobs=(
+            (options.jobs or cpu_count() or 1) if options.gen == "gen3" else 1
+        ),
+        stream_write=options.stream_write,
+        fp=fp,
+        timestamp=options.timestamp,
+        append=options.append if options.gen == "gen3" else None,
+        profiler=options.profiler,
+        wrap_cache=options.wrap_cache,
+    )
+
+
+def pdf_filename(commits: object, options: RenderOptions) -> str:
+    """The filename of the PDF, which is named after the repository by
+    default.
+    """
+    if options.name == FILENAME:
+        return FILENAME.format(commits.rname)
+    return (
+        options.name
+        if options.name.endswith(".pdf")
+        else options.name + ".pdf"
+    )
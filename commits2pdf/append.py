@@ -0,0 +1,83 @@
+"""The state of a report which new commits can be appended to, for
+``--append``. It is stored alongside the PDF and holds the layout and drawing
+state of the last page before its footer was drawn, and where the objects of
+the PDF are, so that only the new commits are drawn and added to the PDF with
+an incremental update.
+"""
+
+import json
+from os import getpid, path, remove, replace
+from typing import Dict, List, NamedTuple, Tuple, Union
+
+from .writer import DocumentState
+
+APPEND_STATE_VERSION = 1
+APPEND_STATE = "{}.c2p.json"  # The path of the state of a PDF
+
+
+class AppendState(NamedTuple):
+    """Where drawing the commits of a report left off."""
+
+    hexsha: str  # The tip of the branch the report was generated from
+    options: Dict[str, object]  # The arguments which affect the report
+    commit_count: int
+    page: int  # The last page
+    y: float  # Where the layout planner left off on the last page
+    placed: int  # The number of commits placed by the layout planner
+    content: str  # The content stream of the last page, without its footer
+    links: List[Tuple]  # The links of the last page
+    drawing: Dict[str, object]  # The state of ``FPDF`` on the last page
+    fonts: List[str]  # The keys of the fonts, in the order they were used
+    document: DocumentState
+
+
+def normalise(options: Dict[str, object]) -> Dict[str, object]:
+    """Normalise the options of a report to what they are stored as."""
+    return json.loads(json.dumps(options, sort_keys=True, default=str))
+
+
+def load_state(
+    pdf: str, options: Dict[str, object]
+) -> Union[AppendState, None]:
+    """Read the state of the PDF at ``pdf``. Return ``None`` if it has no
+    state, was generated with different ``options``, or has been changed
+    since the state was stored.
+    """
+    try:
+        with open(APPEND_STATE.format(pdf)) as f:
+            data = json.load(f)
+        if data.pop("version") != APPEND_STATE_VERSION:
+            return None
+        state = AppendState(**data)
+        state = state._replace(document=DocumentState(*state.document))
+        if (
+            state.options != normalise(options)
+            or path.getsize(pdf) != state.document.length
+        ):
+            return None
+        return state
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def dump_state(pdf: str, state: AppendState) -> None:
+    """Store the state of the PDF at ``pdf``."""
+    file = APPEND_STATE.format(pdf)
+    tmp = f"{file}.{getpid()}.tmp"  # Never read an incomplete state
+    with open(tmp, "w") as f:
+        json.dump(
+            {
+                "version": APPEND_STATE_VERSION,
+                **state._replace(options=normalise(state.options))._asdict(),
+            },
+            f,
+        )
+    replace(tmp, file)
+
+
+def discard_state(pdf: str) -> None:
+    """Remove the state of the PDF at ``pdf`` if it has one."""
+    try:
+        remove(APPEND_STATE.format(pdf))
+    except FileNotFoundError:
+        pass
@@ -2,7 +2,21 @@
 
 from argparse import ArgumentParser
 
-from .constants import FILENAME, USAGE_INFO
+from .constants import (
+    BATCH_USAGE_INFO,
+    CACHE_SIZE,
+    CLONE_CACHE_SIZE,
+    FILENAME,
+    REPORT_CACHE_SIZE,
+    SERVE_HOST,
+    SERVE_MAX_QUEUE,
+    SERVE_PORT,
+    SERVE_USAGE_INFO,
+    SERVE_WARM_REPOS,
+    SERVE_WRAP_CACHE_SIZE,
+    USAGE_INFO,
+    WRAP_CACHE_SIZE,
+)
 
 # General arguments
 parser = ArgumentParser(
@@ -20,8 +34,8 @@ parser.add_argument(
     default=".",
     help=(
         'Directory path to your PDF output. Set to "." (your current'
-        " directory) by default. Will be created if it does not exist."
-        " Example: ./work/my_pdfs"
+        " directory) by default. Will be created if it does not exist. Use -"
+        " to write the PDF to stdout instead. Example: ./work/my_pdfs"
     ),
 )
 parser.add_argument(
@@ -99,8 +113,21 @@ parser.add_argument(
     type=float,
     default=1.0,
     help=(
-        "Set the scaling of the output PDF. Only available with gen2a and"
-        " gen2b."
+        "Set the scaling of the output PDF. Only available with gen2a, gen2b"
+        " and gen3."
+    ),
+)
+parser.add_argument(
+    "-wcs",
+    "--wrap-cache-size",
+    dest="wrap_cache_size",
+    type=int,
+    default=WRAP_CACHE_SIZE,
+    help=(
+        "The number of wrapped texts to keep in memory, so that text which is"
+        " measured and then drawn, or repeated, is only wrapped once. The"
+        " cache's hit rate is logged after generating the PDF. Set to"
+        f" {WRAP_CACHE_SIZE} by default, or 0 to disable."
     ),
 )
 parser.add_argument(
@@ -124,6 +151,233 @@ parser.add_argument(
         " sensitive and case insensitive."
     ),
 )
+parser.add_argument(
+    "-rx",
+    "--regex-queries",
+    dest="regex_queries",
+    action="store_true",
+    help=(
+        "Treat include and exclude queries as case insensitive regular"
+        " expressions (Python syntax) instead of string sequences. Each query"
+        " is a single expression, which is not split on commas, so use | to"
+        " match any of several."
+    ),
+)
+parser.add_argument(
+    "-eng",
+    "--engine",
+    dest="engine",
+    choices=["gitpython", "git-log"],
+    default="gitpython",
+    help=(
+        'The commit ingestion engine. "git-log" reads every commit from a '
+        "single git subprocess, which is much faster for large repositories."
+        ' Set to "gitpython" by default.'
+    ),
+)
+parser.add_argument(
+    "-st",
+    "--stream",
+    dest="stream",
+    action="store_true",
+    help=(
+        "Stream commits from the repository to the PDF renderer one at a time"
+        " instead of gathering them all first, keeping memory usage flat for"
+        " long histories."
+    ),
+)
+parser.add_argument(
+    "-ca",
+    "--cache",
+    dest="cache",
+    action="store_true",
+    help=(
+        "Cache commit metadata on disk, so that repeated reports for the same"
+        " repository only read new commits from git."
+    ),
+)
+parser.add_argument(
+    "-cd",
+    "--cache-dir",
+    dest="cache_dir",
+    help=(
+        "Directory to store caches in. Set to"
+        ' "<user cache directory>/commits2pdf" by default.'
+    ),
+)
+parser.add_argument(
+    "-cc",
+    "--clear-cache",
+    dest="clear_cache",
+    action="store_true",
+    help=(
+        "Invalidate the cached commits of the repository before generating"
+        " the PDF. Only available with --cache."
+    ),
+)
+parser.add_argument(
+    "-cs",
+    "--cache-size",
+    dest="cache_size",
+    type=int,
+    default=CACHE_SIZE,
+    help=(
+        "The maximum number of commits to keep in the commit cache. The least"
+        f" recently used repositories are evicted first. Set to {CACHE_SIZE}"
+        " by default."
+    ),
+)
+parser.add_argument(
+    "-ncc",
+    "--no-clone-cache",
+    dest="clone_cache",
+    action="store_false",
+    help=(
+        "Clone the repository into a temporary directory that is removed"
+        " once the PDF is generated, instead of reusing a cached clone. Only"
+        " available with --repo-from-clone."
+    ),
+)
+parser.add_argument(
+    "-ccs",
+    "--clone-cache-size",
+    dest="clone_cache_size",
+    type=int,
+    default=CLONE_CACHE_SIZE,
+    help=(
+        "The maximum size of the clone cache in megabytes. The least recently"
+        f" used clones are evicted first. Set to {CLONE_CACHE_SIZE} by"
+        " default."
+    ),
+)
+parser.add_argument(
+    "-cf",
+    "--clone-filter",
+    dest="clone_filter",
+    choices=["tree:0", "blob:none", "none"],
+    default="tree:0",
+    help=(
+        "The partial clone filter used with --repo-from-clone. Reports only"
+        " need commits, so trees and blobs are not downloaded by default. Only"
+        " the selected branch is cloned, and temporary clones are also"
+        " shallowed to the start date if one is given. Set to tree:0 by"
+        " default, or none for a full clone."
+    ),
+)
+parser.add_argument(
+    "-lp",
+    "--layout-plan",
+    dest="layout_plan",
+    help=(
+        "Write the layout plan of the PDF (the page and position of each"
+        " commit) to the given file as JSON. Only available with gen3."
+    ),
+)
+parser.add_argument(
+    "-j",
+    "--jobs",
+    dest="jobs",
+    type=int,
+    default=1,
+    help=(
+        "Draw the commits in the given number of worker processes, or 0 for"
+        " one per CPU. The commits are laid out first and drawn in chunks of"
+        " whole pages, which are merged into the PDF. Only available with"
+        " gen3. Set to 1 by default."
+    ),
+)
+parser.add_argument(
+    "-sw",
+    "--stream-write",
+    dest="stream_write",
+    action="store_true",
+    help=(
+        "Write each page to the PDF as soon as the next page is started,"
+        " rather than keeping every page in memory until the PDF is written,"
+        " so that memory use does not grow with the number of pages. gen1"
+        " always writes pages this way."
+    ),
+)
+parser.add_argument(
+    "-ap",
+    "--append",
+    dest="append",
+    action="store_true",
+    help=(
+        "Append the commits made since the PDF was last generated to it with"
+        " an incremental update, instead of generating the whole PDF again."
+        " The state this needs is stored alongside the PDF in"
+        " <filename>.c2p.json, and the PDF is generated from scratch if it has"
+        " no state (or if the history of the branch or any other argument has"
+        " changed). Existing pages keep the time they were generated at. Only"
+        " available with gen3, when sorting from oldest to newest and without"
+        " selecting the newest or oldest n commits."
+    ),
+)
+parser.add_argument(
+    "-dt",
+    "--deterministic",
+    dest="deterministic",
+    action="store_true",
+    help=(
+        "Show the commit date of the tip of the branch as the time the PDF"
+        " was generated, instead of the current time, so that generating the"
+        " same report again gives an identical PDF."
+    ),
+)
+parser.add_argument(
+    "-rc",
+    "--report-cache",
+    dest="report_cache",
+    action="store_true",
+    help=(
+        "Cache generated PDFs in <cache directory>/reports, keyed by the tip"
+        " of the branch and every argument that affects the PDF, and copy the"
+        " cached PDF instead of generating it again if neither has changed."
+        " Implies --deterministic. Not available with --layout-plan."
+    ),
+)
+parser.add_argument(
+    "-rcs",
+    "--report-cache-size",
+    dest="report_cache_size",
+    type=int,
+    default=REPORT_CACHE_SIZE,
+    help=(
+        "The maximum size of the report cache in megabytes. The least"
+        " recently used reports are evicted first. Set to"
+        f" {REPORT_CACHE_SIZE} by default."
+    ),
+)
+parser.add_argument(
+    "-pf",
+    "--profile",
+    dest="profile",
+    action="store_true",
+    help=(
+        "Log the wall time, CPU time, peak memory and number of items of each"
+        " stage of generating the report as key=value lines."
+    ),
+)
+parser.add_argument(
+    "-pfo",
+    "--profile-output",
+    dest="profile_output",
+    help=(
+        "Write the profile (see --profile) to the given file as JSON instead"
+        " of logging it."
+    ),
+)
+parser.add_argument(
+    "-pnm",
+    "--profile-no-memory",
+    dest="profile_memory",
+    action="store_false",
+    help=(
+        "Do not trace the peak memory of each stage when profiling, since"
+        " tracing it slows generation down several times over."
+    ),
+)
 parser.add_argument(
     "-q",
     "--quiet",
@@ -158,6 +412,17 @@ gen_group.add_argument(
         "default option."
     ),
 )
+gen_group.add_argument(
+    "-gen3",
+    "--pdf-gen-3",
+    action="store_true",
+    dest="gen3",
+    help=(
+        "The third PDF rendering implementation with ``fpdf``. Makes the same"
+        " page breaks as gen2b, but measures each commit instead of drawing a"
+        " copy of the PDF, so it is fast for large amounts of commits."
+    ),
+)
 
 # Group for specifying either a path to a git repo or the name of the repo
 # to clone from
@@ -179,8 +444,9 @@ repo_group.add_argument(
     dest="rname",
     type=str,
     help=(
-        "Clone a repo into the working directory and generate the commits "
-        "PDF from it automatically. Format: <repo name> (case insensitive)."
+        "Clone a repo and generate the commits PDF from it automatically."
+        " Clones are cached in <cache directory>/clones and fetched on"
+        " subsequent runs. Format: <repo name> (case insensitive)."
     ),
 )
 
@@ -206,3 +472,194 @@ n_commits_group.add_argument(
         "filtering."
     ),
 )
+
+# Arguments of ``c2p-serve``
+serve_parser = ArgumentParser(
+    description="Commits to PDF report server",
+    prog="c2p-serve",
+    epilog=SERVE_USAGE_INFO,
+)
+serve_parser.add_argument(
+    "-s",
+    "--socket",
+    dest="socket",
+    help=(
+        "Listen on the Unix socket at the given path instead of an HTTP port."
+        " Not available on Windows."
+    ),
+)
+serve_parser.add_argument(
+    "-H",
+    "--host",
+    dest="host",
+    default=SERVE_HOST,
+    help=f"The address to listen on. Set to {SERVE_HOST} by default.",
+)
+serve_parser.add_argument(
+    "-p",
+    "--port",
+    dest="port",
+    type=int,
+    default=SERVE_PORT,
+    help=f"The port to listen on. Set to {SERVE_PORT} by default.",
+)
+serve_parser.add_argument(
+    "-or",
+    "--output-root",
+    dest="output_root",
+    default=".",
+    help=(
+        "The directory the output directories of reports are relative to,"
+        " and confined to. Set to the current directory by default."
+    ),
+)
+serve_parser.add_argument(
+    "-rr",
+    "--repo-root",
+    dest="repo_root",
+    default=".",
+    help=(
+        "The directory the paths of repositories (see --repo-path) are"
+        " relative to, and confined to. Set to the current directory by"
+        " default."
+    ),
+)
+serve_parser.add_argument(
+    "-w",
+    "--workers",
+    dest="workers",
+    type=int,
+    default=0,
+    help=(
+        "Generate reports in the given number of worker processes, or 0 for"
+        " one per CPU. Set to 0 by default."
+    ),
+)
+serve_parser.add_argument(
+    "-mq",
+    "--max-queue",
+    dest="max_queue",
+    type=int,
+    default=SERVE_MAX_QUEUE,
+    help=(
+        "The number of reports which can wait for a worker. Further requests"
+        f" are rejected until one finishes. Set to {SERVE_MAX_QUEUE} by"
+        " default."
+    ),
+)
+serve_parser.add_argument(
+    "-wr",
+    "--warm-repos",
+    dest="warm_repos",
+    type=int,
+    default=SERVE_WARM_REPOS,
+    help=(
+        "The number of recently used repositories each worker keeps open,"
+        " along with their commit caches. Set to"
+        f" {SERVE_WARM_REPOS} by default."
+    ),
+)
+serve_parser.add_argument(
+    "-ws",
+    "--wrap-cache-size",
+    dest="wrap_cache_size",
+    type=int,
+    default=SERVE_WRAP_CACHE_SIZE,
+    help=(
+        "The number of wrapped texts each worker keeps between reports. Set"
+        f" to {SERVE_WRAP_CACHE_SIZE} by default."
+    ),
+)
+serve_parser.add_argument(
+    "-cs",
+    "--cache-size",
+    dest="cache_size",
+    type=int,
+    default=CACHE_SIZE,
+    help=(
+        "The maximum number of commits to keep in the commit cache of the"
+        f" reports. Set to {CACHE_SIZE} by default."
+    ),
+)
+serve_parser.add_argument(
+    "-ccs",
+    "--clone-cache-size",
+    dest="clone_cache_size",
+    type=int,
+    default=CLONE_CACHE_SIZE,
+    help=(
+        "The maximum size of the clone cache of the reports in megabytes."
+        f" Set to {CLONE_CACHE_SIZE} by default."
+    ),
+)
+serve_parser.add_argument(
+    "-rcs",
+    "--report-cache-size",
+    dest="report_cache_size",
+    type=int,
+    default=REPORT_CACHE_SIZE,
+    help=(
+        "The maximum size of the report cache of the reports in megabytes."
+        f" Set to {REPORT_CACHE_SIZE} by default."
+    ),
+)
+serve_parser.add_argument(
+    "-q",
+    "--quiet",
+    dest="quiet",
+    action="store_true",
+    help="Suppress all logger messages except for errors.",
+)
+
+# Arguments of ``c2p-batch``
+batch_parser = ArgumentParser(
+    description="Commits to PDF batch reports",
+    prog="c2p-batch",
+    epilog=BATCH_USAGE_INFO,
+)
+batch_parser.add_argument(
+    "manifest",
+    help=(
+        "A JSON or TOML file listing the reports to generate. TOML requires"
+        " Python 3.11+ or the tomli package."
+    ),
+)
+batch_parser.add_argument(
+    "-w",
+    "--workers",
+    dest="workers",
+    type=int,
+    default=0,
+    help=(
+        "Generate reports in the given number of worker processes, or 0 for"
+        " one per CPU. The reports of each repository are generated by the"
+        " same worker. Set to 0 by default."
+    ),
+)
+batch_parser.add_argument(
+    "-su",
+    "--summary",
+    dest="summary",
+    help=(
+        "Write the outcome, time and logs of each report to the given file"
+        " as JSON."
+    ),
+)
+batch_parser.add_argument(
+    "-ws",
+    "--wrap-cache-size",
+    dest="wrap_cache_size",
+    type=int,
+    default=SERVE_WRAP_CACHE_SIZE,
+    help=(
+        "The number of wrapped texts each worker keeps between reports. Set"
+        f" to {SERVE_WRAP_CACHE_SIZE} by default."
+    ),
+)
+batch_parser.add_argument(
+    "-q",
+    "--quiet",
+    dest="quiet",
+    action="store_true",
+    help="Suppress all logger messages except for errors.",
+)
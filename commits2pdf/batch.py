@@ -0,0 +1,327 @@
+"""``c2p-batch``: generate the reports listed in a JSON or TOML manifest on a
+pool of worker processes. The options of each job are named like the
+attributes of the arguments ``c2p`` parses (such as ``rpath``, ``branch`` or
+``dark``), and ``defaults`` apply to every job:
+
+    {
+        "defaults": {"owner": "tomasvana10", "gen3": true, "output": "pdfs"},
+        "jobs": [
+            {"rpath": "commits2pdf", "branch": "main"},
+            {"rname": "other-repo", "dark": true, "args": ["-sc", "1.5"]}
+        ]
+    }
+
+The jobs of each repository are generated one after another by the same
+worker (see ``workers.py``), so that each repository is opened, or cloned and
+fetched, once per batch. A job which fails is reported in the summary without
+stopping the others.
+"""
+
+import json
+from argparse import Action, Namespace
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from logging import ERROR
+from multiprocessing import get_context
+from os import cpu_count, path
+from time import perf_counter
+from traceback import format_exc
+from typing import Dict, List, NamedTuple, Union
+
+from .args import batch_parser, parser
+from .constants import (
+    BATCH_JOB_ERROR,
+    BATCH_JOB_INFO,
+    BATCH_SUMMARY_INFO,
+    INVALID_ARG_WARNING,
+    INVALID_JOB_OPTION_ERROR,
+    INVALID_MANIFEST_ERROR,
+    MANIFEST_FORMAT_ERROR,
+    NO_TOML_ERROR,
+    REPORT_FAILED_ERROR,
+    SERVE_WARM_REPOS,
+    WORKER_DIED_ERROR,
+    WROTE_SUMMARY_INFO,
+)
+from .logger import logger
+from .workers import JobResult, init_worker, run_group
+
+
+class Job(NamedTuple):
+    """A report of the manifest, its ``c2p`` arguments and the repo they
+    select, or why its options are invalid.
+    """
+
+    id: str
+    argv: List[str]
+    repo: str
+    error: Union[str, None] = None
+
+
+def load_manifest(file: str) -> Dict[str, object]:
+    """Read a manifest, as TOML if it is named ``*.toml`` or otherwise as
+    JSON.
+    """
+    try:
+        if file.endswith(".toml"):
+            try:
+                import tomllib  # Python 3.11+
+            except ImportError:
+                try:
+                    import tomli as tomllib
+                except ImportError:
+                    logger.error(NO_TOML_ERROR)
+                    exit(1)
+            with open(file, "rb") as f:
+                return tomllib.load(f)
+        with open(file) as f:
+            return json.load(f)
+    except (OSError, ValueError) as ex:
+        logger.error(INVALID_MANIFEST_ERROR.format(file, ex))
+        exit(1)
+
+
+def job_argv(options: Dict[str, object]) -> List[str]:
+    """Convert the options of a job into ``c2p`` arguments. Raise
+    ``ValueError`` if an option does not exist or has the wrong type.
+    """
+    actions: Dict[str, Action] = {
+        action.dest: action
+        for action in parser._actions
+        if action.dest != "help"
+    }
+    argv, owner = [], []
+    extra = options.get("args", [])
+    if not isinstance(extra, list):
+        raise ValueError(INVALID_JOB_OPTION_ERROR.format("args", extra))
+    regex = options.get("regex_queries") is True or any(
+        arg in ("-rx", "--regex-queries") for arg in extra
+    )
+    for key, value in options.items():
+        action = actions.get(key)
+        if key in ("id", "args"):
+            continue
+        if action is None or isinstance(value, dict):
+            raise ValueError(INVALID_JOB_OPTION_ERROR.format(key, value))
+        if not action.option_strings:  # The owner
+            owner = ["--", str(value)]
+        elif action.nargs == 0:  # A flag
+            if not isinstance(value, bool):
+                raise ValueError(INVALID_JOB_OPTION_ERROR.format(key, value))
+            if value == action.const:
+                argv.append(action.option_strings[-1])
+        elif value is not None:
+            if (
+                isinstance(value, list)
+                and regex
+                and key in ("include", "exclude")
+            ):
+                # Regex queries are not split on commas, so the queries are
+                # joined into one which matches any of them
+                value = "|".join(f"(?:{query})" for query in value)
+            elif isinstance(value, list):  # Authors, or include or exclude
+                value = ",".join(map(str, value))
+            # Joined, so that values starting with "-" are not options
+            argv.append(f"{action.option_strings[-1]}={value}")
+    return argv + [str(arg) for arg in extra] + owner
+
+
+def read_jobs(manifest: Dict[str, object]) -> List[Job]:
+    """The jobs of a manifest, in order, with the repo each one selects."""
+    defaults, entries = manifest.get("defaults", {}), manifest.get("jobs")
+    if not isinstance(defaults, dict) or not isinstance(entries, list):
+        logger.error(MANIFEST_FORMAT_ERROR)
+        exit(1)
+    jobs: List[Job] = []
+    for i, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict):
+            entry = {"id": str(i), "args": entry}
+        name = str(entry.get("id", i))
+        try:
+            # Extra arguments are added to those of the defaults
+            argv = job_argv(
+                {
+                    **defaults,
+                    **entry,
+                    "args": defaults.get("args", []) + entry.get("args", []),
+                }
+            )
+        except (ValueError, TypeError) as ex:
+            jobs.append(Job(name, [], "", str(ex)))
+            continue
+        jobs.append(Job(name, argv, _repo(argv)))
+    return jobs
+
+
+def _repo(argv: List[str]) -> Union[str, None]:
+    """The repo ``c2p`` would report on given ``argv``, or an empty string
+    if the arguments are invalid.
+    """
+    try:
+        with redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+            args: Namespace = parser.parse_args(argv)
+    except SystemExit:  # The worker logs why when running the job
+        return ""
+    if args.rname:
+        return f"https://github.com/{args.owner}/{args.rname}"
+    return path.realpath(args.rpath)
+
+
+def run_batch(
+    jobs: List[Job], workers: int, wrap_cache_size: int
+) -> List[JobResult]:
+    """Generate the reports of ``jobs`` on a pool of ``workers`` processes,
+    logging the outcome of each as it finishes, and return their results. If
+    a worker dies, the jobs of the repos it was generating are retried one at
+    a time, so that only the job which killed it fails.
+    """
+    results: Dict[int, JobResult] = {}
+    groups: Dict[str, List[int]] = {}
+    for i, job in enumerate(jobs):
+        if job.error is not None:
+            result = JobResult(400, None, [job.error], 0.0, 0.0)
+            _finish(jobs, i, result, results)
+        else:
+            groups.setdefault(job.repo, []).append(i)
+    broken: List[List[int]] = []
+    # The largest groups are started first, so that they finish sooner
+    with _pool(min(workers, len(groups) or 1), wrap_cache_size) as pool:
+        futures = {
+            pool.submit(run_group, [jobs[i].argv for i in group]): group
+            for group in sorted(groups.values(), key=len, reverse=True)
+        }
+        for future in as_completed(futures):
+            group = futures[future]
+            try:
+                group_results = future.result()
+            except BrokenProcessPool:
+                broken.append(group)
+                continue
+            except Exception:
+                group_results = [
+                    JobResult(500, None, [format_exc()], 0.0, 0.0)
+                ] * len(group)
+            for i, result in zip(group, group_results):
+                _finish(jobs, i, result, results)
+    for group in broken:
+        _retry(jobs, group, results, wrap_cache_size)
+    return [results[i] for i in range(len(jobs))]
+
+
+def _retry(
+    jobs: List[Job],
+    group: List[int],
+    results: Dict[int, JobResult],
+    wrap_cache_size: int,
+) -> None:
+    """Generate the reports of a group one at a time on a single worker,
+    starting a new worker whenever one dies.
+    """
+    while group:
+        with _pool(1, wrap_cache_size) as pool:
+            for n, i in enumerate(group):
+                try:
+                    result = pool.submit(run_group, [jobs[i].argv]).result()[0]
+                except BrokenProcessPool:
+                    result = JobResult(
+                        500, None, [WORKER_DIED_ERROR], 0.0, 0.0
+                    )
+                _finish(jobs, i, result, results)
+                if result.logs == [WORKER_DIED_ERROR]:
+                    group = group[n + 1 :]
+                    break
+            else:
+                group = []
+
+
+def _pool(workers: int, wrap_cache_size: int) -> ProcessPoolExecutor:
+    """A pool of workers, which are spawned rather than forked, so that they
+    behave the same on every platform.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=init_worker,
+        initargs=(SERVE_WARM_REPOS, wrap_cache_size),
+    )
+
+
+def _finish(
+    jobs: List[Job], i: int, result: JobResult, results: Dict[int, JobResult]
+) -> None:
+    """Record and log the result of the ``i``th job."""
+    results[i] = result
+    if result.status == 200:
+        logger.info(
+            BATCH_JOB_INFO.format(
+                len(results), len(jobs), jobs[i].id, result.pdf, result.seconds
+            )
+        )
+        return
+    errors = [
+        log[len("ERROR: ") :] for log in result.logs if log.startswith("ERROR")
+    ] or result.logs
+    reason = errors[-1].strip().splitlines()[-1] if errors else ""
+    logger.error(
+        BATCH_JOB_ERROR.format(
+            len(results), len(jobs), jobs[i].id, reason or REPORT_FAILED_ERROR
+        )
+    )
+
+
+def main(argv: Union[List[str], None] = None) -> None:
+    """Generate the reports of a manifest, given the arguments of
+    ``c2p-batch`` (or those of the command line). Exit with status 1 if any
+    report could not be generated.
+    """
+    args: Namespace = batch_parser.parse_args(argv)
+    if args.quiet:  # Suppress all logs except for errors
+        logger.setLevel(ERROR)
+    if args.workers < 0:
+        logger.error(INVALID_ARG_WARNING.format("number of workers"))
+        exit(1)
+    jobs = read_jobs(load_manifest(args.manifest))
+    workers: int = args.workers or cpu_count() or 1
+
+    start = perf_counter()
+    results = run_batch(jobs, workers, args.wrap_cache_size)
+    seconds = perf_counter() - start
+    failed = sum(result.status != 200 for result in results)
+    logger.info(
+        BATCH_SUMMARY_INFO.format(
+            len(jobs) - failed,
+            len(jobs),
+            len({job.repo for job in jobs if job.repo}),
+            seconds,
+            failed,
+        )
+    )
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(
+                {
+                    "seconds": round(seconds, 6),
+                    "workers": workers,
+                    "completed": len(jobs) - failed,
+                    "failed": failed,
+                    "jobs": [
+                        {
+                            "id": job.id,
+                            "repo": job.repo or None,
+                            "ok": result.status == 200,
+                            "status": result.status,
+                            "seconds": round(result.seconds, 6),
+                            "path": result.pdf,
+                            "logs": result.logs,
+                        }
+                        for job, result in zip(jobs, results)
+                    ],
+                },
+                f,
+                indent=2,
+            )
+        logger.info(WROTE_SUMMARY_INFO.format(args.summary))
+    if failed:
+        exit(1)
@@ -0,0 +1,282 @@
+"""Persistent SQLite cache of commit metadata, so that repeated reports for
+the same repository only read new commits from git. Commits are keyed by
+repository identity and hexsha, and the branch tips that have been fully
+ingested are recorded so that a refresh only has to walk the commits that are
+reachable from the current tip but not from a previously ingested one.
+"""
+
+import sqlite3
+from os import environ, makedirs, path
+from time import time
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+from git import Actor, Repo
+
+from .ingest import RawCommit, iter_git_log, split_message
+
+CACHE_FILENAME = "commits.sqlite3"
+BATCH_SIZE = 500
+MAX_TIPS = 32  # The most recently ingested tips to keep per repository
+
+
+class CachedCommit(NamedTuple):
+    """A commit read from the cache, with its message already split into an
+    encoded title and description by ``split_message``.
+    """
+
+    hexsha: str
+    author: Actor
+    committed_date: int
+    title: str
+    description: str
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    id INTEGER PRIMARY KEY,
+    identity TEXT NOT NULL UNIQUE,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tips (
+    repo_id INTEGER NOT NULL,
+    hexsha TEXT NOT NULL,
+    ingested REAL NOT NULL,
+    PRIMARY KEY (repo_id, hexsha)
+);
+CREATE TABLE IF NOT EXISTS commits (
+    repo_id INTEGER NOT NULL,
+    hexsha TEXT NOT NULL,
+    author_name TEXT NOT NULL,
+    author_email TEXT NOT NULL,
+    date INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    PRIMARY KEY (repo_id, hexsha)
+) WITHOUT ROWID;
+"""
+
+
+def get_cache_dir() -> str:
+    """Find the directory commits2pdf stores its caches in."""
+    if "C2P_CACHE_DIR" in environ:
+        return environ["C2P_CACHE_DIR"]
+    base = environ.get("XDG_CACHE_HOME") or environ.get("LOCALAPPDATA")
+    return path.join(
+        base or path.join(path.expanduser("~"), ".cache"), "commits2pdf"
+    )
+
+
+def repo_identity(repo: Repo) -> str:
+    """Identify a repository by its origin URL if it has one, so clones of
+    the same remote share their cache, otherwise by its git directory.
+    """
+    if len(repo.remotes) > 0:
+        return repo.remotes.origin.url
+    return path.realpath(repo.git_dir)
+
+
+class CommitCache:
+    """A connection to the commit metadata cache for a single repository."""
+
+    def __init__(self, repo: Repo, cache_dir: str, max_commits: int) -> None:
+        self._repo, self._max_commits = repo, max_commits
+        self._actors: Dict[Tuple[str, str], Actor] = {}
+        makedirs(cache_dir, exist_ok=True)
+        self._db = sqlite3.connect(
+            path.join(cache_dir, CACHE_FILENAME), timeout=60
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._identity = repo_identity(repo)
+        with self._db:
+            self._touch()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def clear(self) -> None:
+        """Invalidate every cached commit of the repository."""
+        with self._db:
+            self._db.execute(
+                "DELETE FROM commits WHERE repo_id = ?", (self._id,)
+            )
+            self._db.execute("DELETE FROM tips WHERE repo_id = ?", (self._id,))
+
+    def refresh(self, rev: str) -> int:
+        """Ingest the commits reachable from ``rev`` that are not reachable
+        from an already ingested tip, then record ``rev``'s commit as an
+        ingested tip. Return the number of newly cached commits.
+        """
+        tip: str = self._repo.commit(rev).hexsha
+        count = 0
+        with self._db:  # Only record the tip if every commit was ingested
+            # Other processes cannot evict the repository until the tip is
+            # recorded, as this takes the write lock
+            self._touch()
+            tips: List[str] = [
+                row[0]
+                for row in self._db.execute(
+                    "SELECT hexsha FROM tips WHERE repo_id = ?", (self._id,)
+                )
+            ]
+            if tip not in tips:
+                # Tips that no longer exist (e.g. after a force push) are
+                # ignored by git, so their commits are ingested again
+                commits = iter_git_log(
+                    self._repo, [tip, "--not"] + tips, ignore_missing=True
+                )
+                count = self._insert(commits)
+            self._db.execute(
+                "INSERT OR REPLACE INTO tips VALUES (?, ?, ?)",
+                (self._id, tip, time()),
+            )
+            self._db.execute(
+                "DELETE FROM tips WHERE repo_id = ? AND hexsha NOT IN (SELECT"
+                " hexsha FROM tips WHERE repo_id = ? ORDER BY ingested DESC"
+                " LIMIT ?)",
+                (self._id, self._id, MAX_TIPS),
+            )
+        self._evict()
+        return count
+
+    def iter_commits(self, rev: str, **kwargs) -> Iterator[CachedCommit]:
+        """Walk the hexshas of ``rev`` with ``git rev-list`` and the same
+        options as ``Repo.iter_commits``, and read the commits from the cache
+        in batches.
+        """
+        proc = self._repo.git.rev_list(rev, "--", as_process=True, **kwargs)
+        batch: List[str] = []
+        for line in proc.stdout:
+            batch.append(line.strip().decode("ascii"))
+            if len(batch) == BATCH_SIZE:
+                yield from self._read(batch)
+                batch = []
+        if batch:
+            yield from self._read(batch)
+        proc.wait()
+
+    def _read(self, hexshas: List[str]) -> List[CachedCommit]:
+        """Read a batch of commits from the cache, ingesting any that are
+        missing, and return them in the given order.
+        """
+        found = self._select(hexshas)
+        missing = [hexsha for hexsha in hexshas if hexsha not in found]
+        if missing:
+            with self._db:
+                self._touch()
+                self._insert(
+                    iter_git_log(self._repo, missing, no_walk="unsorted")
+                )
+            found.update(self._select(missing))
+        return [
+            _to_cached_commit(found[hexsha], self._actors)
+            for hexsha in hexshas
+        ]
+
+    def _select(self, hexshas: List[str]) -> Dict[str, Tuple]:
+        """Map hexshas to the rows of the commits that are cached."""
+        return {
+            row[0]: row
+            for row in self._db.execute(
+                "SELECT hexsha, author_name, author_email, date, title, "
+                "description FROM commits WHERE repo_id = ? AND hexsha IN "
+                f"({', '.join('?' * len(hexshas))})",
+                [self._id] + hexshas,
+            )
+        }
+
+    def _touch(self) -> None:
+        """Mark the repository as used, adding it again if another process
+        evicted it, so that the commits inserted in the same transaction
+        always belong to a repository which can be evicted.
+        """
+        self._db.execute(
+            "INSERT OR IGNORE INTO repos (identity, last_used) VALUES (?, ?)",
+            (self._identity, time()),
+        )
+        self._db.execute(
+            "UPDATE repos SET last_used = ? WHERE identity = ?",
+            (time(), self._identity),
+        )
+        self._id: int = self._db.execute(
+            "SELECT id FROM repos WHERE identity = ?", (self._identity,)
+        ).fetchone()[0]
+
+    def _insert(self, commits: Iterator[RawCommit]) -> int:
+        """Insert commits into the cache in batches."""
+        count = 0
+        rows: List[Tuple] = []
+        for commit in commits:
+            rows.append(_to_row(self._id, commit))
+            if len(rows) == BATCH_SIZE:
+                count += self._insert_rows(rows)
+                rows = []
+        return count + self._insert_rows(rows)
+
+    def _insert_rows(self, rows: List[Tuple]) -> int:
+        self._db.executemany(
+            "INSERT OR REPLACE INTO commits VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+        )
+        return len(rows)
+
+    def _evict(self) -> None:
+        """Remove the least recently used repositories (other than this one)
+        until the cache holds at most ``self._max_commits`` commits. Whole
+        repositories are evicted so that their ingested tips stay accurate.
+        """
+        total: int = self._db.execute(
+            "SELECT COUNT(*) FROM commits"
+        ).fetchone()[0]
+        if total <= self._max_commits:
+            return
+        with self._db:
+            # The commits of repositories which were evicted while they were
+            # being cached by older versions
+            total -= self._db.execute(
+                "DELETE FROM commits WHERE repo_id NOT IN (SELECT id FROM "
+                "repos)"
+            ).rowcount
+            self._db.execute(
+                "DELETE FROM tips WHERE repo_id NOT IN (SELECT id FROM repos)"
+            )
+            for repo_id, count in self._db.execute(
+                "SELECT repos.id, COUNT(commits.hexsha) FROM repos LEFT JOIN "
+                "commits ON commits.repo_id = repos.id WHERE repos.id != ? "
+                "GROUP BY repos.id ORDER BY repos.last_used",
+                (self._id,),
+            ).fetchall():
+                if total <= self._max_commits:
+                    break
+                for table in ("commits", "tips"):
+                    self._db.execute(
+                        f"DELETE FROM {table} WHERE repo_id = ?", (repo_id,)
+                    )
+                self._db.execute("DELETE FROM repos WHERE id = ?", (repo_id,))
+                total -= count
+
+
+def _to_row(repo_id: int, commit: RawCommit) -> Tuple:
+    """Derive the fields stored in the cache from a commit in the same way as
+    ``CommitTable.append``.
+    """
+    return (
+        repo_id,
+        commit.hexsha,
+        commit.author.name,
+        commit.author.email,
+        commit.committed_date,
+        *split_message(commit.message),
+    )
+
+
+def _to_cached_commit(
+    row: Tuple, actors: Dict[Tuple[str, str], Actor]
+) -> CachedCommit:
+    """Convert a cached row to a ``CachedCommit``, sharing identical
+    authors.
+    """
+    hexsha, name, email, date, title, description = row
+    author = actors.get((name, email))
+    if author is None:
+        author = actors[(name, email)] = Actor(name, email)
+    return CachedCommit(hexsha, author, date, title, description)
@@ -1,35 +1,54 @@
 """Console entry point for ``commits2pdf``. Uses the ``argparse`` module to
 handle arguments. Imports a PDF generation implementation from this package
-(either ``pycairo`` or ``fpdf``) based on the users input.
+(either ``pycairo`` or ``fpdf``) based on the users input. Arguments are
+parsed and validated with the standard library alone, and the modules which
+import GitPython or a PDF library are only imported once they are needed, so
+that ``c2p -h`` and invalid arguments return quickly.
 """
 
 from argparse import Namespace
 from datetime import datetime
+from io import BytesIO
 from logging import ERROR
-from os import path
+from os import makedirs, path
+from re import error as RegexError
 from re import match, search
-from typing import Dict, List, Tuple, Union
-
-from pathvalidate import ValidationError, validate_filename, validate_filepath
+from shutil import copyfileobj
+from sys import stdout
+from typing import BinaryIO, Dict, List, Tuple, Union
 
+from .api import RenderOptions, make_pdf, pdf_filename
 from .args import parser
-from .commits import Commits
+from .matcher import QueryMatcher
 from .constants import (
-    CAIRO_DARK,
+    APPEND_JOBS_WARNING,
+    APPENDING_INFO,
+    CACHED_REPORT_INFO,
     CAIRO_DEPRECATION_ERROR,
-    CAIRO_LIGHT,
+    CANNOT_APPEND_WARNING,
+    CANNOT_USE_JOBS_WARNING,
+    CANNOT_USE_REPORT_CACHE_WARNING,
     CANNOT_USE_SCALE_WARNING,
+    CANNOT_WRITE_LAYOUT_PLAN_WARNING,
     DATE,
     EMAILS,
     FILENAME,
-    FPDF_DARK,
-    FPDF_LIGHT,
     INVALID_ARG_WARNING,
     INVALID_FILENAME_ERROR,
     INVALID_OUTPUT_DIR_ERROR,
     INVALID_QUERIES,
+    PORTABLE_FILENAME,
+    PORTABLE_PATH,
+    PROFILE_INFO,
+    REPORT_CACHE_WARNING,
+    STDOUT,
+    UP_TO_DATE_INFO,
+    WRAP_CACHE_INFO,
+    WROTE_LAYOUT_PLAN_INFO,
+    WROTE_PROFILE_INFO,
 )
 from .logger import logger
+from .profiling import Profiler, stage
 
 
 def main() -> None:
@@ -39,25 +58,107 @@ def main() -> None:
     args: Namespace = parser.parse_args()
     if args.quiet:  # Suppress all logs except for errors
         logger.setLevel(ERROR)
+    profiler: Union[Profiler, None] = None
+    if args.profile or args.profile_output:
+        profiler = Profiler(memory=args.profile_memory)
+        profiler.start()
     try:
-        validate_filepath(args.output)
-    except ValidationError:
-        logger.error(INVALID_OUTPUT_DIR_ERROR)
-        exit(1)
-    (
-        appearance,
-        rpath,
-        url,
-        authors,
-        start_date,
-        end_date,
-        include,
-        exclude,
-        gen,
-        mode,
-        scaling,
-        name,
-    ) = _validate_args(args)
+        _main(args, profiler)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            _report_profile(args, profiler)
+
+
+def _main(
+    args: Namespace,
+    profiler: Union[Profiler, None],
+    pipe: Union[BinaryIO, None] = None,
+    commits_options: Union[Dict[str, object], None] = None,
+    render_options: Union[Dict[str, object], None] = None,
+) -> Union[str, None]:
+    """Generate the report, timing each stage with ``profiler`` if it is
+    given. A report written to stdout is written to ``pipe`` instead if it is
+    given, and ``commits_options`` and ``render_options`` are passed on to
+    ``Commits`` and ``RenderOptions``. Return the path of the PDF, unless it
+    was written to stdout or could not be generated.
+    """
+    with stage(profiler, "validate"):
+        if not _is_valid_path(args.output):
+            logger.error(INVALID_OUTPUT_DIR_ERROR)
+            exit(1)
+        (
+            rpath,
+            url,
+            authors,
+            start_date,
+            end_date,
+            include,
+            exclude,
+            gen,
+            scaling,
+            name,
+        ) = _validate_args(args)
+
+    from .cache import get_cache_dir
+    from .commits import Commits
+    from .reports import ReportCache, report_key, resolve_report
+
+    # The arguments which affect the report, apart from how it is written
+    settings: Dict[str, object] = {
+        "repo": url or path.realpath(rpath),
+        "owner": args.owner,
+        "branch": args.branch,
+        "authors": authors,
+        "start_date": start_date,
+        "end_date": end_date,
+        "reverse": args.reverse,
+        "newest_n_commits": args.newest_n_commits,
+        "oldest_n_commits": args.oldest_n_commits,
+        "include": include,
+        "exclude": exclude,
+        "regex_queries": args.regex_queries,
+        "gen": gen,
+        "dark": args.dark,
+        "scaling": float(scaling),
+        "name": name,
+    }
+    # Look for the report before collecting commits
+    found = None
+    if args.report_cache or args.append:
+        with stage(profiler, "resolve"):
+            found = resolve_report(rpath, url, args.branch)
+
+    report: Union[Tuple[ReportCache, str], None] = None
+    if args.report_cache:
+        if found is None:
+            logger.warning(REPORT_CACHE_WARNING)
+        else:
+            tip, rname = found
+            reports = ReportCache(
+                path.join(args.cache_dir or get_cache_dir(), "reports"),
+                args.report_cache_size * 1024**2,
+            )
+            key: str = report_key(
+                tip, {**settings, "stream_write": args.stream_write}
+            )
+            entry = reports.get(key)
+            if entry is not None:
+                return _copy_cached_report(
+                    entry, args, rname, _pdf_name(rname, name), pipe
+                )
+            report = (reports, key)
+
+    append = None  # The ``AppendState`` of the report
+    if args.append and found is not None:
+        from .append import load_state
+
+        tip, rname = found
+        pdf = path.join(path.abspath(args.output), _pdf_name(rname, name))
+        append = load_state(pdf, settings)
+        if append is not None and append.hexsha == tip:
+            logger.info(UP_TO_DATE_INFO.format(pdf))
+            return pdf
 
     commits = Commits(
         rpath=rpath,
@@ -72,55 +173,213 @@ def main() -> None:
         oldest_n_commits=args.oldest_n_commits,
         include=include,
         exclude=exclude,
+        regex_queries=args.regex_queries,
+        engine=args.engine,
+        stream=args.stream,
+        cache=args.cache,
+        cache_dir=args.cache_dir,
+        clear_cache=args.clear_cache,
+        cache_size=args.cache_size,
+        clone_cache=args.clone_cache,
+        clone_cache_size=args.clone_cache_size,
+        clone_filter=args.clone_filter,
+        after=append.hexsha if append else None,
+        profiler=profiler,
+        **(commits_options or {}),
     )
 
-    if not commits.err_flag:
-        _make_pdf(commits, appearance, args, gen, mode, scaling, name)
-    else:
-        return  # Any errors would have been logged by ``commits.py``, so exit
+    try:
+        if not commits.err_flag:
+            return _make_pdf(
+                commits,
+                args,
+                gen,
+                scaling,
+                name,
+                report,
+                append,
+                settings,
+                profiler,
+                pipe,
+                render_options,
+            )
+        else:
+            return  # Any errors would have been logged by ``commits.py``
+    finally:
+        commits.close()
 
 
 def _make_pdf(
-    commits: Commits,
-    appearance: str,
+    commits: object,
     args: Namespace,
     gen: str,
-    mode: str,
-    scaling: int,
+    scaling: float,
     name: str,
-) -> None:
-    """Generate the PDF based on the user's specified generation module."""
-    output_filename = (
-        FILENAME.format(commits.rname) if name == FILENAME else name
+    report: Union[Tuple[object, str], None] = None,
+    append: object = None,
+    settings: Union[Dict[str, object], None] = None,
+    profiler: Union[Profiler, None] = None,
+    pipe: Union[BinaryIO, None] = None,
+    render_options: Union[Dict[str, object], None] = None,
+) -> Union[str, None]:
+    """Generate the PDF based on the user's specified generation module, and
+    store it in the report cache if ``report`` (the cache and the key of the
+    report) is given. With ``--append``, append the commits to the report if
+    its state (``append``) is given, then store the state of the report and
+    the arguments which affect it (``settings``). Each stage is timed with
+    ``profiler`` if it is given. See ``_main`` for the other arguments.
+    """
+    if args.append:  # Imports the fpdf backend
+        from .append import discard_state, dump_state
+
+    to_stdout: bool = args.output == STDOUT
+    pipe = stdout.buffer if pipe is None else pipe
+    # A PDF written to stdout is kept in memory if it must also be cached
+    buffer = BytesIO() if to_stdout and report else None
+    if buffer is not None:
+        output = buffer
+    else:
+        output = pipe if to_stdout else args.output
+    if commits.after is None:  # The history of the branch was rewritten
+        append = None
+    tip = None
+    if args.deterministic or args.append:
+        tip = commits.r.commit(str(commits.branch))
+    timestamp = None
+    if args.deterministic:  # Generated when the last commit was committed
+        timestamp = tip.committed_date
+    options = RenderOptions(
+        gen=gen,
+        dark=args.dark,
+        scaling=scaling,
+        output=output,
+        name=name,
+        wrap_cache_size=args.wrap_cache_size,
+        jobs=1 if args.append else args.jobs,
+        stream_write=args.stream_write,
+        timestamp=timestamp,
+        append=append,
+        profiler=profiler,
+        **(render_options or {}),
     )
     output_dir = path.abspath(args.output)
-    full_output_path = path.join(output_dir, output_filename)
-    gen_args = [
-        commits,
-        args.output,
-        output_filename,
-        appearance,
-    ]
-
-    if gen == "gen1":
-        from .render_cairo import Cairo_PDF
-
-        cls = Cairo_PDF
-    else:
-        from .render_fpdf import FPDF_PDF
+    full_output_path = path.join(output_dir, pdf_filename(commits, options))
 
-        cls = FPDF_PDF
-        gen_args.append(mode)
-        gen_args.append(scaling)
+    if append is not None:
+        if not commits.filtered_commits:  # The new commits were filtered out
+            dump_state(full_output_path, append._replace(hexsha=tip.hexsha))
+            logger.info(UP_TO_DATE_INFO.format(full_output_path))
+            return full_output_path
+        logger.info(APPENDING_INFO.format(full_output_path))
 
-    pdf = cls(*gen_args)
+    pdf = make_pdf(commits, options)
     if pdf.err_flag:
         return
 
-    logger.info(f"Wrote {full_output_path} successfully!")
+    if buffer is not None:
+        pipe.write(buffer.getvalue())
+    if to_stdout:
+        pipe.flush()
+        logger.info("Wrote the PDF to stdout successfully!")
+    else:
+        logger.info(f"Wrote {full_output_path} successfully!")
+    logger.info(
+        WRAP_CACHE_INFO.format(
+            pdf.wrap_cache.hit_rate,
+            pdf.wrap_cache.hits,
+            pdf.wrap_cache.misses,
+        )
+    )
 
+    if args.layout_plan and gen == "gen3":
+        with open(args.layout_plan, "w") as f:
+            pdf.plan.dump(f)
+        logger.info(WROTE_LAYOUT_PLAN_INFO.format(args.layout_plan))
+
+    if report is not None:
+        reports, key = report
+        reports.put(key, buffer.getvalue() if to_stdout else full_output_path)
+
+    if args.append:
+        if pdf.append_state is not None:
+            dump_state(
+                full_output_path,
+                pdf.append_state._replace(hexsha=tip.hexsha, options=settings),
+            )
+        else:  # No commits were drawn
+            discard_state(full_output_path)
+
+    if to_stdout:
+        return
     if not args.prevent_open:
         _open_pdf(args, output_dir)
+    return full_output_path
+
+
+def _report_profile(args: Namespace, profiler: Profiler) -> None:
+    """Write the profile to ``--profile-output``, or log it."""
+    if args.profile_output:
+        with open(args.profile_output, "w") as f:
+            profiler.dump(f)
+        logger.info(WROTE_PROFILE_INFO.format(args.profile_output))
+    else:
+        for line in profiler.lines():
+            logger.info(PROFILE_INFO.format(line))
+
+
+def _is_valid_path(value: str, filename: bool = False) -> bool:
+    """Check that ``value`` is a valid path, or filename if ``filename`` is
+    set. Names which are valid on every platform are accepted without
+    importing ``pathvalidate``.
+    """
+    if match(PORTABLE_FILENAME if filename else PORTABLE_PATH, value):
+        return True
+    from pathvalidate import (
+        ValidationError,
+        validate_filename,
+        validate_filepath,
+    )
+
+    try:
+        (validate_filename if filename else validate_filepath)(value)
+    except ValidationError:
+        return False
+    return True
+
+
+def _pdf_name(rname: str, name: str) -> str:
+    """The filename of the PDF of the repository ``rname``."""
+    return FILENAME.format(rname) if name == FILENAME else name
+
+
+def _copy_cached_report(
+    entry: str,
+    args: Namespace,
+    rname: str,
+    filename: str,
+    pipe: Union[BinaryIO, None] = None,
+) -> Union[str, None]:
+    """Copy a PDF from the report cache to the output directory or stdout
+    (or ``pipe``), instead of generating it, and return where it was copied.
+    """
+    from .reports import copy_report
+
+    if args.output == STDOUT:
+        pipe = stdout.buffer if pipe is None else pipe
+        with open(entry, "rb") as f:
+            copyfileobj(f, pipe)
+        pipe.flush()
+        logger.info(CACHED_REPORT_INFO.format(rname, "stdout"))
+        return
+    output_dir = path.abspath(args.output)
+    makedirs(output_dir, exist_ok=True)
+    copy_report(entry, path.join(output_dir, filename))
+    logger.info(
+        CACHED_REPORT_INFO.format(rname, path.join(output_dir, filename))
+    )
+    if not args.prevent_open:
+        _open_pdf(args, output_dir)
+    return path.join(output_dir, filename)
 
 
 def _open_pdf(args, p) -> None:
@@ -175,17 +434,35 @@ def _validate_args(args: Namespace) -> Tuple[Union[None, str, List[str]]]:
             exit(1)
         end_date: datetime = datetime.strptime(args.end_date, "%d/%m/%Y")
 
+    # A regex query is a single pattern, as patterns may contain commas
     if args.include:
-        if search(INVALID_QUERIES, args.include):
+        if not args.regex_queries and search(INVALID_QUERIES, args.include):
             logger.error(INVALID_ARG_WARNING.format("query"))
             exit(1)
-        include: List[str] = args.include.split(",")
+        include: List[str] = (
+            [args.include] if args.regex_queries else args.include.split(",")
+        )
 
     if args.exclude:
-        if search(INVALID_QUERIES, args.exclude):
+        if not args.regex_queries and search(INVALID_QUERIES, args.exclude):
             logger.error(INVALID_ARG_WARNING.format("query"))
             exit(1)
-        exclude: List[str] = args.exclude.split(",")
+        exclude: List[str] = (
+            [args.exclude] if args.regex_queries else args.exclude.split(",")
+        )
+
+    if args.jobs < 0:
+        logger.error(INVALID_ARG_WARNING.format("number of jobs"))
+        exit(1)
+
+    if args.regex_queries:
+        try:
+            for queries in (include, exclude):
+                if queries:
+                    QueryMatcher(queries, regex=True)
+        except RegexError:
+            logger.error(INVALID_ARG_WARNING.format("regex query"))
+            exit(1)
 
     if args.gen1:
         try:
@@ -193,32 +470,48 @@ def _validate_args(args: Namespace) -> Tuple[Union[None, str, List[str]]]:
         except ImportError:
             logger.error(CAIRO_DEPRECATION_ERROR)
             exit(1)
-        gen, mode = "gen1", None
-        appearance: Dict[str, Tuple[int]] = (
-            CAIRO_LIGHT if not args.dark else CAIRO_DARK
-        )
+        gen, scaling = "gen1", 1.0
         if args.scaling != 1.0:
             logger.warning(CANNOT_USE_SCALE_WARNING)
     else:
-        gen, mode = (
-            ("gen2a", "stable") if args.gen2a else ("gen2b", "unstable")
-        )
-        appearance: Dict[str, Tuple[int]] = (
-            FPDF_LIGHT if not args.dark else FPDF_DARK
-        )
+        if args.gen2a:
+            gen = "gen2a"
+        elif args.gen3:
+            gen = "gen3"
+        else:
+            gen = "gen2b"
+        if args.layout_plan and gen != "gen3":
+            logger.warning(CANNOT_WRITE_LAYOUT_PLAN_WARNING)
         scaling = args.scaling
+    if args.jobs != 1 and gen != "gen3":
+        logger.warning(CANNOT_USE_JOBS_WARNING)
+    if args.append:
+        if (
+            gen != "gen3"
+            or args.reverse
+            or args.newest_n_commits
+            or args.oldest_n_commits
+            or args.output == STDOUT
+        ):
+            logger.warning(CANNOT_APPEND_WARNING)
+            args.append = False
+        elif args.jobs != 1:
+            logger.warning(APPEND_JOBS_WARNING)
+    if args.report_cache:
+        if (args.layout_plan and gen == "gen3") or args.append:
+            logger.warning(CANNOT_USE_REPORT_CACHE_WARNING)
+            args.report_cache = False
+        else:  # Cached reports must not depend on when they were generated
+            args.deterministic = True
 
     if name != FILENAME:
         if not name.endswith(".pdf"):
             name += ".pdf"
-    try:
-        validate_filename(name)
-    except ValidationError:
+    if not _is_valid_path(name, filename=True):
         logger.error(INVALID_FILENAME_ERROR)
         exit(1)
 
     return (
-        appearance,
         rpath,
         url,
         authors,
@@ -227,7 +520,10 @@ def _validate_args(args: Namespace) -> Tuple[Union[None, str, List[str]]]:
         include,
         exclude,
         gen,
-        mode,
         scaling,
         name,
     )
+
+
+if __name__ == "__main__":
+    main()
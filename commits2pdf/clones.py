@@ -0,0 +1,154 @@
+"""A managed cache of bare clones for ``--repo-from-clone``. Each remote URL
+is cloned once and fetched on subsequent runs. Entries are locked while in
+use, so concurrent runs are safe, and the least recently used entries are
+evicted once the cache exceeds its size limit.
+"""
+
+from hashlib import sha1
+from os import fstat, makedirs, path, remove, scandir, stat, utime
+from shutil import rmtree
+from time import sleep
+from typing import List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_POLL_INTERVAL = 0.1
+
+
+class FileLock:
+    """An exclusive lock on a file, which is released by the operating system
+    if its process dies.
+    """
+
+    def __init__(self, lock_path: str) -> None:
+        self._path = lock_path
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Acquire the lock, returning ``False`` if it is held elsewhere and
+        ``blocking`` is not set.
+        """
+        while True:
+            self._file = open(self._path, "a+")
+            while not self._lock():
+                if not blocking:
+                    self._file.close()
+                    self._file = None
+                    return False
+                sleep(LOCK_POLL_INTERVAL)
+            if self._is_current():
+                return True
+            # The file was deleted while waiting for it, so lock the file
+            # which has replaced it instead
+            self.release()
+
+    def release(self, delete: bool = False) -> None:
+        """Release the lock, and delete its file if ``delete`` is set."""
+        if self._file is None:
+            return
+        if delete and fcntl:  # Deleted while locked, so waiting runs notice
+            _remove(self._path)
+        if fcntl:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+        if delete and not fcntl:  # Open files cannot be deleted on Windows
+            _remove(self._path)
+
+    def _lock(self) -> bool:
+        try:
+            if fcntl:
+                fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _is_current(self) -> bool:
+        """Whether the locked file is still the one at the lock's path."""
+        try:
+            return stat(self._path).st_ino == fstat(self._file.fileno()).st_ino
+        except OSError:
+            return False
+
+
+class CloneCache:
+    """A directory of bare clones, keyed by remote URL."""
+
+    def __init__(self, cache_dir: str, max_bytes: int) -> None:
+        self._dir, self._max_bytes = cache_dir, max_bytes
+        makedirs(cache_dir, exist_ok=True)
+
+    def acquire(self, url: str) -> Tuple[str, bool, FileLock]:
+        """Lock the entry for ``url``, blocking while another run uses it.
+        Return the path of the entry's clone, whether it has already been
+        cloned, and the held lock.
+        """
+        key = sha1(url.encode("utf-8")).hexdigest()[:20]
+        name = url.rstrip("/").split("/")[-1].split(".git")[0]
+        entry = path.join(self._dir, f"{name}-{key}")
+        lock = FileLock(f"{entry}.lock")
+        lock.acquire()
+        exists = path.isdir(path.join(entry, "objects"))
+        if exists:
+            utime(entry)  # Mark the entry as recently used
+        else:  # Remove anything left behind by an interrupted clone
+            rmtree(entry, ignore_errors=True)
+        return entry, exists, lock
+
+    def evict(self, keep: str) -> List[str]:
+        """Remove the least recently used entries that are not in use until
+        the cache is no larger than its size limit. Return the removed paths.
+        """
+        entries = sorted(
+            (
+                (entry.stat().st_mtime, entry.path, _size(entry.path))
+                for entry in scandir(self._dir)
+                if entry.is_dir()
+            ),
+            reverse=True,
+        )
+        total = sum(size for _, _, size in entries)
+        evicted = []
+        while entries and total > self._max_bytes:
+            _, entry, size = entries.pop()  # Least recently used
+            if entry == keep:
+                continue
+            lock = FileLock(f"{entry}.lock")
+            if not lock.acquire(blocking=False):  # In use by another run
+                continue
+            try:
+                rmtree(entry, ignore_errors=True)
+            finally:
+                lock.release(delete=not path.exists(entry))
+            total -= size
+            evicted.append(entry)
+        return evicted
+
+
+def _size(directory: str) -> int:
+    """Find the total size of the files in a directory."""
+    total = 0
+    for entry in scandir(directory):
+        if entry.is_dir(follow_symlinks=False):
+            total += _size(entry.path)
+        else:
+            total += entry.stat(follow_symlinks=False).st_size
+    return total
+
+
+def _remove(file: str) -> None:
+    """Remove a file if it exists and is not in use."""
+    try:
+        remove(file)
+    except OSError:
+        pass
@@ -1,14 +1,28 @@
 from __future__ import annotations
 
+import sqlite3
 from tempfile import mkdtemp
 
+from array import array
+from collections.abc import Mapping
 from datetime import datetime
+from itertools import islice
 from os import path
 from shutil import rmtree
-from typing import Dict, List, Union
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    MutableMapping,
+    Tuple,
+    Union,
+)
 
 from git import Commit as GitCommit
 from git import (
+    Actor,
+    Git,
     GitCommandError,
     Head,
     InvalidGitRepositoryError,
@@ -17,11 +31,15 @@ from git import (
 )
 
 from .constants import (
+    CACHE_ERROR,
+    CACHED_COMMITS_INFO,
     CLONING_REPO_INFO,
-    CODING,
     DETACHED_BRANCH_ERROR,
+    FETCH_FAILED_WARNING,
+    FETCHING_REPO_INFO,
     FILTER_INFO,
     GATHERED_COMMITS_INFO,
+    HISTORY_REWRITTEN_WARNING,
     INVALID_GIT_REPO_ERROR,
     MUST_RECLONE_ERROR,
     N_COMMITS_INFO,
@@ -29,9 +47,17 @@ from .constants import (
     NONEXISTING_BRANCH_WARNING,
     NONEXISTING_OR_INVALID_REPO_ERROR,
     NONEXISTING_REPO_ERROR,
+    PUSHDOWN_INFO,
     ZERO_COMMITS_WARNING,
 )
+from .cache import CachedCommit, CommitCache, get_cache_dir
+from .clones import CloneCache, FileLock
+from .ingest import RawCommit, code, iter_git_log, split_message
 from .logger import logger
+from .matcher import QueryMatcher
+from .profiling import Profiler, iterate, stage
+
+TRIM_BATCH_SIZE = 1024  # The number of consumed rows to forget at once
 
 
 class Commits:
@@ -40,41 +66,102 @@ class Commits:
     def __init__(self, **kwargs) -> None:
         """Save filter and repo information from kwargs."""
         self.err_flag: bool = False  # Detected in ``cli.py`` to stop execution
+        self._temporary_clone: bool = False  # Removed in ``close``
+        self._clone_lock: Union[FileLock, None] = None
+        self._commit_cache: Union[CommitCache, None] = None
+        self.profiler: Union[Profiler, None] = None  # Times each stage
+        # Open repos and commit caches kept between reports by ``c2p-serve``,
+        # which are reused instead of being opened, and left open by ``close``
+        self.repos: Union[MutableMapping[str, Repo], None] = None
+        self.commit_caches: Union[
+            MutableMapping[Tuple[str, str, int], CommitCache], None
+        ] = None
+        self._shared_repo = self._shared_cache = False
+        # The branch each cached clone and branch was fetched as earlier by
+        # ``c2p-batch``, which are not fetched again
+        self.fetched: Union[MutableMapping[Tuple[str, str], str], None] = None
 
         for arg in kwargs:
             setattr(self, arg, kwargs[arg])
 
-        self.r: Repo = self._get_repo()
+        with stage(self.profiler, "repo"):  # Open, clone or fetch the repo
+            self.r: Repo = self._get_repo()
         if isinstance(self.r, Repo):  # Repo was successfully found, continue
             self._init_repo_data()
         elif self.r == "DELTREE":  # Perform buffered deletion due to errors in
-                                   # ``_get_repo``.
+            # ``_get_repo``.
             rmtree(self.rpath, ignore_errors=True)
             self.err_flag = True
         elif not self.r:  # ``_get_repo`` returned NoneType, so the repo could
-                          # not be accessed
+            # not be accessed
             self.err_flag = True
 
+    def close(self) -> None:
+        """Release the repo once the commits have been consumed, removing it if
+        it was cloned into a temporary directory.
+        """
+        if isinstance(self.r, Repo) and not self._shared_repo:
+            self.r.close()
+        if self._commit_cache and not self._shared_cache:
+            self._commit_cache.close()
+        if self._temporary_clone:
+            rmtree(self.rpath, ignore_errors=True)
+        if self._clone_lock:
+            self._clone_lock.release()
+
     def _init_repo_data(self) -> None:
-        """Find the repo name (preferrably from the remote), then
-        sequentially build the filtered commits from the commits of the
-        repo.
+        """Find the repo name (preferrably from the remote), then build a
+        generator pipeline that walks, instantiates and filters the commits of
+        the repo. The pipeline is consumed immediately unless streaming.
         """
-        if len(self.r.remotes) > 0:  # Use remote name
-            self.rname: str = self.r.remotes.origin.url.split(".git")[0].split(
-                "/"
-            )[-1]
-        else:  # No remote exists, just get the name of the directory
-            self.rname: str = path.basename(
-                self.r.working_tree_dir.split("/")[-1]
+        self.rname: str = repo_name(self.r)
+        if self.after and not self._contains(self.after):
+            logger.warning(HISTORY_REWRITTEN_WARNING)
+            self.after = None
+
+        if self.cache:
+            with stage(self.profiler, "cache"):
+                self._commit_cache = self._open_cache()
+        self._python_filters: List[str] = self._pushdown_filters()
+        self._newest_first: bool = bool(self.newest_n_commits) or (
+            self.reverse and not self.oldest_n_commits
+        )
+        self._table = CommitTable(self.owner, self.rname, self.branch)
+        # Each stage of the pipeline is timed separately if profiling
+        commits: Iterator[Commit] = iterate(
+            self.profiler,
+            "filter",
+            self._filter_commits(
+                iterate(
+                    self.profiler,
+                    "instantiate",
+                    self._instantiate_commits(
+                        iterate(
+                            self.profiler, "gather", self._gather_commits()
+                        )
+                    ),
+                )
+            ),
+        )
+        if self.stream:  # Commits are produced as the renderer consumes them
+            # Reversed selections are buffered anyway, so only trim the table
+            # when the commits are produced in the order they are walked
+            self.filtered_commits: CommitStream = CommitStream(
+                commits,
+                None if self._reverses_selection() else self._table,
             )
-
-        self.raw_commits: List[Repo.commit] = self._gather_commits()
-        self.commit_objects: List[Commit] = self._instantiate_commits()
-        self.filtered_commits: List[Commit] = self._filter_commits()
-        if len(self.filtered_commits) == 0:
+        else:
+            self.filtered_commits: List[Commit] = list(commits)
+        if not self.filtered_commits and not self.after:
             logger.warning(ZERO_COMMITS_WARNING)
 
+    def _contains(self, hexsha: str) -> bool:
+        """Check whether the branch contains the commit ``hexsha``."""
+        try:
+            return self.r.is_ancestor(hexsha, self.branch)
+        except (GitCommandError, ValueError):  # ``hexsha`` does not exist
+            return False
+
     def _validate_branch(self, r: Repo) -> Union[bool, None]:
         """Ensure that ``self.branch`` exists. If not, attempt to set it to the
         repo's active branch.
@@ -91,39 +178,76 @@ class Commits:
         self.branch: Head = b  # Update the branch to the repo's active branch
         return True
 
-    def _retry_clone(self, e) -> Union[Repo, str, None]:
-        """Reattempt cloning if possible and update ``self.branch`` accordingly."""
-        rmtree(self.rpath, ignore_errors=True)
-        if "remote branch" in str(e).casefold(): # User entered invalid branch, 
-                                                 # so clone repo without specifying 
-                                                 # a branch argument
-            r: Repo = Repo.clone_from(self.url, self.rpath, no_checkout=True)
-            try:
-                b: Head = r.active_branch
-            except TypeError:  # Repo branch is detached
-                return logger.error(DETACHED_BRANCH_ERROR.format(self.branch))
-
-            logger.warning(NONEXISTING_BRANCH_WARNING.format(self.branch, b))
-            self.branch = b
-            return r
+    def _resolve_remote_branch(self) -> Union[bool, None]:
+        """Check that ``self.branch`` exists on the remote with a single
+        ``git ls-remote`` call before cloning or fetching. If not, select the
+        remote's default branch instead. Raise ``GitCommandError`` if the
+        remote cannot be reached.
+        """
+        output: str = Git().ls_remote(
+            "--symref", self.url, "HEAD", f"refs/heads/{self.branch}"
+        )
+        refs: List[List[str]] = [
+            line.split("\t") for line in output.splitlines()
+        ]
+        if any(ref == f"refs/heads/{self.branch}" for _, ref in refs):
+            return True
+
+        heads: List[str] = [  # Only present if HEAD is not detached
+            target[len("ref: refs/heads/") :]
+            for target, ref in refs
+            if ref == "HEAD" and target.startswith("ref: refs/heads/")
+        ]
+        if not heads:
+            return logger.error(DETACHED_BRANCH_ERROR.format(self.branch))
+        b: str = heads[0]
+        logger.warning(NONEXISTING_BRANCH_WARNING.format(self.branch, b))
+        self.branch = b
+        return True
 
-        else:  # Some other error occurred
-            logger.error(NONEXISTING_OR_INVALID_REPO_ERROR.format(self.url))
-            return "DELTREE"
+    def _clone_options(self, shallow: bool) -> Dict[str, object]:
+        """Build options for ``git clone`` that only download what a commit
+        report needs: the commits of a single branch (see
+        ``--clone-filter``), optionally only back to the start date.
+        """
+        options: Dict[str, object] = dict(
+            branch=self.branch, single_branch=True
+        )
+        if self.clone_filter != "none":
+            options["filter"] = self.clone_filter
+        if shallow and self.start_date:
+            options["shallow_since"] = self.start_date
+        return options
 
     def _clone_repo(self) -> Union[Repo, str, None]:
         """Attempt to clone a repo's .git directory."""
-        logger.info(CLONING_REPO_INFO)
         try:
-            r: Repo = Repo.clone_from(
-                self.url,
-                self.rpath,
-                branch=self.branch,
-                no_checkout=True,
-            )
+            if not self._resolve_remote_branch():
+                return "DELTREE"
+            logger.info(CLONING_REPO_INFO)
+            try:
+                r: Repo = Repo.clone_from(
+                    self.url,
+                    self.rpath,
+                    no_checkout=True,
+                    **self._clone_options(shallow=True),
+                )
+            except GitCommandError:
+                if not self.start_date:
+                    raise
+                # Git refuses shallow clones that select no commits, so clone
+                # the full branch instead
+                rmtree(self.rpath, ignore_errors=True)
+                r: Repo = Repo.clone_from(
+                    self.url,
+                    self.rpath,
+                    no_checkout=True,
+                    **self._clone_options(shallow=False),
+                )
             return r
-        except GitCommandError as e:
-            return self._retry_clone(e)
+        except GitCommandError:
+            logger.error(NONEXISTING_OR_INVALID_REPO_ERROR)
+            return "DELTREE"
 
     def _get_repo(self) -> Union[Repo, str, None]:
         """Access a repo, or clone it and then access it, and update
@@ -131,12 +255,15 @@ class Commits:
         ensuring a high chance of the user's requests being processed.
         """
         if self.url:  # User wants to clone a repo
+            if self.clone_cache:
+                return self._get_cached_clone()
             self.rpath = mkdtemp()
+            self._temporary_clone = True
             return self._clone_repo()
 
         else:  # Access the repo normally
             try:
-                r: Repo = Repo(self.rpath)
+                r: Repo = self._open_repo()
                 return r if self._validate_branch(r) else None
 
             except InvalidGitRepositoryError:
@@ -144,154 +271,501 @@ class Commits:
             except NoSuchPathError:
                 return logger.error(NONEXISTING_REPO_ERROR)
 
-    def _gather_commits(self) -> List[GitCommit]:
-        """Find all the commits that match the user's since, until and branch
-        specifications.
+    def _open_repo(self) -> Repo:
+        """Open the repo at ``self.rpath``, or reuse it from ``self.repos``."""
+        if self.repos is None:
+            return Repo(self.rpath)
+        key: str = path.realpath(self.rpath)
+        r: Union[Repo, None] = self.repos.get(key)
+        if r is None:
+            r = self.repos[key] = Repo(self.rpath)
+        self._shared_repo = True
+        return r
+
+    def _get_cached_clone(self) -> Union[Repo, str, None]:
+        """Fetch the repo into its entry in the clone cache, or clone it there
+        if it has not been cloned before. The entry stays locked until
+        ``close`` is called.
         """
+        clones = CloneCache(
+            path.join(self.cache_dir or get_cache_dir(), "clones"),
+            self.clone_cache_size * 1024**2,
+        )
+        self.rpath, exists, self._clone_lock = clones.acquire(self.url)
+        key = (self.url, self.branch)
         try:
-            commits: List[GitCommit] = list(
-                self.r.iter_commits(
-                    since=self.start_date,
-                    until=self.end_date,
-                    rev=self.branch,
+            if exists and self.fetched is not None and key in self.fetched:
+                if self.fetched[key] != self.branch:  # Selected when fetched
+                    logger.warning(
+                        NONEXISTING_BRANCH_WARNING.format(
+                            self.branch, self.fetched[key]
+                        )
+                    )
+                    self.branch = self.fetched[key]
+                r: Repo = Repo(self.rpath)
+            elif exists:
+                logger.info(FETCHING_REPO_INFO)
+                r: Repo = Repo(self.rpath)
+                try:  # Only fetch the selected branch
+                    if not self._resolve_remote_branch():
+                        return None
+                    r.git.fetch(
+                        "origin",
+                        f"+refs/heads/{self.branch}:refs/heads/{self.branch}",
+                    )
+                except GitCommandError:  # Use the cached commits if possible
+                    if self.branch not in r.heads:
+                        raise
+                    logger.warning(FETCH_FAILED_WARNING)
+            else:
+                if not self._resolve_remote_branch():
+                    return "DELTREE"
+                logger.info(CLONING_REPO_INFO)
+                # Shallow clones are not cached, as later runs may need
+                # commits from before the start date
+                r: Repo = Repo.clone_from(
+                    self.url,
+                    self.rpath,
+                    bare=True,
+                    **self._clone_options(shallow=False),
                 )
+        except GitCommandError:
+            logger.error(NONEXISTING_OR_INVALID_REPO_ERROR)
+            # Only remove an entry this run created, as others may use it
+            return None if exists else "DELTREE"
+        if self.fetched is not None:
+            self.fetched[key] = self.branch
+        clones.evict(keep=self.rpath)
+        return r
+
+    def _open_cache(self) -> Union[CommitCache, None]:
+        """Open the commit metadata cache and ingest any new commits of the
+        branch into it. Fall back to reading commits from git if the cache
+        cannot be used.
+        """
+        cache_dir: str = self.cache_dir or get_cache_dir()
+        # Caches are only kept with the repo they were opened for
+        self._shared_cache = (
+            self._shared_repo and self.commit_caches is not None
+        )
+        key = (path.realpath(self.rpath), cache_dir, self.cache_size)
+        try:
+            cache = self.commit_caches.get(key) if self._shared_cache else None
+            if cache is None:
+                cache = CommitCache(self.r, cache_dir, self.cache_size)
+                if self._shared_cache:
+                    self.commit_caches[key] = cache
+            if self.clear_cache:
+                cache.clear()
+            logger.info(CACHED_COMMITS_INFO.format(cache.refresh(self.branch)))
+            return cache
+        except sqlite3.Error as ex:
+            if self._shared_cache and key in self.commit_caches:
+                self.commit_caches.pop(key).close()  # Do not reuse it
+            self.cache = False
+            return logger.warning(CACHE_ERROR.format(ex))
+
+    def _pushdown_filters(self) -> List[str]:
+        """Translate the author, include and exclude filters into options for
+        git where git's matching is equivalent to ``_filter_commits``, so that
+        filtered out commits are never instantiated. Return the names of the
+        filters that must still be applied in Python.
+        """
+        self._git_filters: Dict[str, object] = {}
+        python_filters: List[str] = []
+        pushed: List[str] = []
+
+        # git can only match one set of message patterns, so include queries
+        # take priority over exclude queries. Regex queries are never pushed
+        # down, as git's regex syntax differs from Python's.
+        if (
+            self.include
+            and not self.regex_queries
+            and _can_pushdown_queries(self.include)
+        ):
+            self._git_filters.update(
+                grep=self.include, regexp_ignore_case=True
+            )
+            pushed.append("include queries")
+        elif self.include:
+            python_filters.append("include")
+        if (
+            self.exclude
+            and "grep" not in self._git_filters
+            and not self.regex_queries
+            and _can_pushdown_queries(self.exclude)
+        ):
+            self._git_filters.update(
+                grep=self.exclude, regexp_ignore_case=True, invert_grep=True
             )
+            pushed.append("exclude queries")
+        elif self.exclude:
+            python_filters.append("exclude")
+
+        if self.authors:
+            emails: List[str] = self.authors.split(",")
+            if all(email.isascii() for email in emails):
+                # Match the "<email>" part of the "Name <email>" author line
+                self._git_filters["author"] = [f"<{e}>" for e in emails]
+                pushed.append("author email")
+            # Queries are case insensitive, and ``-i`` applies to every git
+            # pattern, so matching author emails must be verified in Python
+            if (
+                "author" not in self._git_filters
+                or "grep" in self._git_filters
+            ):
+                python_filters.append("authors")
+
+        if self._git_filters:
+            self._git_filters["fixed_strings"] = True
+            logger.info(PUSHDOWN_INFO.format(", ".join(pushed)))
+        return python_filters
+
+    def _gather_commits(
+        self,
+    ) -> Iterator[Union[GitCommit, RawCommit, CachedCommit]]:
+        """Lazily walk all the commits that match the user's since, until and
+        branch specifications (only those made after ``self.after`` if it is
+        given), using either GitPython or a single ``git log`` subprocess (see
+        ``ingest.py``), or from the commit metadata cache (see ``cache.py``).
+        """
+        options = dict(
+            since=self.start_date,
+            until=self.end_date,
+            reverse=not self._newest_first,
+            **self._git_filters,
+        )
+        if self.newest_n_commits and not self._python_filters:
+            # Every filter is applied by git, so it only needs to walk one
+            # more commit than is selected to tell if there are more than n
+            options["max_count"] = self.newest_n_commits + 1
+
+        rev: Union[str, Head] = (
+            f"{self.after}..{self.branch}" if self.after else self.branch
+        )
+        count = 0
+        try:
+            if self.cache:  # Read the commits from the commit metadata cache
+                commits: Iterator[CachedCommit] = (
+                    self._commit_cache.iter_commits(rev, **options)
+                )
+            elif self.engine == "git-log":  # Parse a ``git log`` stream
+                commits: Iterator[RawCommit] = iter_git_log(
+                    self.r, rev, **options
+                )
+            else:
+                commits: Iterator[GitCommit] = self.r.iter_commits(
+                    rev=rev, **options
+                )
+            for commit in commits:
+                count += 1
+                yield commit
         except Exception:
             logger.error(MUST_RECLONE_ERROR)
             self.err_flag = True
             exit(1)
 
-        logger.info(GATHERED_COMMITS_INFO.format(len(commits)))
+        logger.info(GATHERED_COMMITS_INFO.format(count))
 
-        return commits
-
-    def _instantiate_commits(self) -> List[Dict[str, str]]:
-        """Instantiate all the filtered ``Repo.commit`` objects into my own
-        simple class that inherits from a dictionary.
+    def _instantiate_commits(
+        self, raw_commits: Iterable[Union[GitCommit, RawCommit, CachedCommit]]
+    ) -> Iterator[Commit]:
+        """Add the commits to ``self._table`` one at a time, yielding a
+        dictionary-like view of each.
         """
-        commit_objects = []
-        for commit in self.raw_commits:
-            commit_objects.append(
-                Commit(self.owner, self.rname, self.branch, commit)
-            )
+        for commit in raw_commits:
+            yield self._table.append(commit)
 
-        return commit_objects
-
-    def _filter_commits(self) -> List[Commit]:
-        """Process the Commit objects based on user-specified criteria such as
-        authors and queries.
+    def _filter_commits(self, commits: Iterable[Commit]) -> Iterator[Commit]:
+        """Chain generators that process the Commit objects based on
+        user-specified criteria such as authors and queries, then select the
+        newest or oldest n commits.
         """
-        filtered_commits: List[Commit] = self.commit_objects
-        if self.include:
-            filtered_commits: List[Commit] = [
-                commit
-                for commit in self.commit_objects
-                for q in self.include
-                if q.casefold() in commit["description"].casefold()
-                or q.casefold() in commit["title"].casefold()
-            ]
-            logger.info(
-                FILTER_INFO.format(
-                    len(filtered_commits),
-                    len(self.commit_objects),
-                    "include queries",
-                )
-            )
-        if self.exclude:
-            prior_len: int = len(filtered_commits)
-            filtered_commits: List[Commit] = [
-                commit
-                for commit in filtered_commits
-                for q in self.exclude
-                if q.casefold() not in commit["description"].casefold()
-                and q.casefold() not in commit["title"].casefold()
-            ]
-            logger.info(
-                FILTER_INFO.format(
-                    len(filtered_commits), prior_len, "exclude queries"
-                )
+        if "include" in self._python_filters:
+            commits = self._include_commits(
+                commits, QueryMatcher(self.include, self.regex_queries)
             )
-        if self.authors:
-            prior_len: int = len(filtered_commits)
-            filtered_commits: List[Commit] = [
-                commit
-                for commit in filtered_commits
-                if commit["author_email"] in self.authors
-            ]
-            logger.info(
-                FILTER_INFO.format(
-                    len(filtered_commits), prior_len, "author email"
-                )
+        if "exclude" in self._python_filters:
+            commits = self._exclude_commits(
+                commits, QueryMatcher(self.exclude, self.regex_queries)
             )
+        if "authors" in self._python_filters:
+            commits = self._filter_authors(commits)
 
+        # The commits are walked in the order they will be drawn in, unless
+        # the newest or oldest n commits are selected. In that case they are
+        # walked newest or oldest first respectively, so that the walk stops
+        # once n commits are selected, then reversed if necessary.
         if self.newest_n_commits:
-            if not self.newest_n_commits >= len(filtered_commits):
-                filtered_commits = filtered_commits[: self.newest_n_commits]
-                logger.info(
-                    N_COMMITS_INFO.format("newest", self.newest_n_commits)
-                )
-            else:
-                logger.warn(
-                    N_COMMITS_WARNING.format(
-                        "Newest", self.newest_n_commits, len(filtered_commits)
-                    )
-                )
+            commits = self._select_head(
+                commits, self.newest_n_commits, "newest"
+            )
         elif self.oldest_n_commits:
-            if not self.oldest_n_commits >= len(filtered_commits):
-                filtered_commits = filtered_commits[-self.oldest_n_commits :]
-                logger.info(
-                    N_COMMITS_INFO.format(
-                        "oldest", self.oldest_n_commits, len(filtered_commits)
-                    )
-                )
+            commits = self._select_head(
+                commits, self.oldest_n_commits, "oldest"
+            )
+        if self._reverses_selection():
+            commits = self._reverse_commits(commits)
+
+        return commits
+
+    def _reverses_selection(self) -> bool:
+        """Check whether the selected newest or oldest n commits are walked
+        in the opposite order to the one they are drawn in.
+        """
+        if self.newest_n_commits:
+            return not self.reverse
+        return bool(self.oldest_n_commits and self.reverse)
+
+    def _include_commits(
+        self, commits: Iterable[Commit], matcher: QueryMatcher
+    ) -> Iterator[Commit]:
+        """Yield commits that contain the include queries."""
+        prior_len = filtered_len = 0
+        for commit in commits:
+            prior_len += 1
+            if matcher.matches(commit["title"], commit["description"]):
+                filtered_len += 1
+                yield commit
             else:
-                logger.warn(
-                    N_COMMITS_WARNING.format(
-                        "Oldest", self.oldest_n_commits, len(filtered_commits)
-                    )
-                )
+                self._table.discard(commit)
+        logger.info(
+            FILTER_INFO.format(filtered_len, prior_len, "include queries")
+        )
 
-        step: int = -1 if not self.reverse else 1
-        filtered_commits = filtered_commits[::step]
+    def _exclude_commits(
+        self, commits: Iterable[Commit], matcher: QueryMatcher
+    ) -> Iterator[Commit]:
+        """Yield commits that do not contain the exclude queries."""
+        prior_len = filtered_len = 0
+        for commit in commits:
+            prior_len += 1
+            if not matcher.matches(commit["title"], commit["description"]):
+                filtered_len += 1
+                yield commit
+            else:
+                self._table.discard(commit)
+        logger.info(
+            FILTER_INFO.format(filtered_len, prior_len, "exclude queries")
+        )
 
-        return filtered_commits
+    def _filter_authors(self, commits: Iterable[Commit]) -> Iterator[Commit]:
+        """Yield commits made by one of the specified authors."""
+        emails: List[str] = self.authors.split(",")
+        prior_len = filtered_len = 0
+        for commit in commits:
+            prior_len += 1
+            if commit["author_email"] in emails:
+                filtered_len += 1
+                yield commit
+            else:
+                self._table.discard(commit)
+        logger.info(
+            FILTER_INFO.format(filtered_len, prior_len, "author email")
+        )
 
+    def _select_head(
+        self, commits: Iterable[Commit], n: int, which: str
+    ) -> Iterator[Commit]:
+        """Yield the first ``n`` commits, stopping the walk as soon as they
+        have been yielded.
+        """
+        taken = 0
+        for commit in commits:
+            if taken == n:  # There are more than n commits
+                self._table.discard(commit)
+                return logger.info(N_COMMITS_INFO.format(which, n))
+            taken += 1
+            yield commit
+        logger.warning(N_COMMITS_WARNING.format(which.capitalize(), n, taken))
 
-class Commit(dict):
-    """A simple way of representing a commit as a dictionary."""
+    @staticmethod
+    def _reverse_commits(commits: Iterable[Commit]) -> Iterator[Commit]:
+        """Yield a bounded selection of commits in reverse order."""
+        yield from reversed(list(commits))
+
+
+def _can_pushdown_queries(queries: List[str]) -> bool:
+    """Check whether git's case insensitive fixed string matching is
+    equivalent to matching the casefolded queries in Python. Commit text is
+    encoded to ``CODING`` (replacing other characters with "?") before it is
+    matched, and "ß" is the only ``CODING`` character that casefolds to ASCII.
+    """
+    return all(
+        q
+        and q.isascii()
+        and q.isprintable()
+        and "?" not in q
+        and "ss" not in q.casefold()
+        for q in queries
+    )
+
+
+class CommitStream:
+    """A single-pass iterable of lazily produced commits. Its truthiness can
+    be checked without losing the first commit.
+    """
 
     def __init__(
-        self, owner: str, rname: str, branch: str, commit: Repo.commit
+        self, commits: Iterator[Commit], table: Union[CommitTable, None]
     ) -> None:
-        """Assign commit data to the instance."""
-        self["rname"] = rname
-        self["branch"] = branch
-        self["author_name"] = commit.author
-        self["author_email"] = commit.author.email
-        self["date"] = datetime.fromtimestamp(commit.committed_date)
-        self["hexsha_short"] = commit.hexsha[:7]
-        self["hexsha_long"] = commit.hexsha
-        self["diff_url"] = (
-            f"https://github.com/{owner}/{rname}/commit/{commit.hexsha}"
+        self._commits, self._table = commits, table
+        self._peeked: List[Commit] = []
+
+    def __bool__(self) -> bool:
+        if not self._peeked:
+            self._peeked.extend(islice(self._commits, 1))
+        return bool(self._peeked)
+
+    def __iter__(self) -> Iterator[Commit]:
+        while self._peeked:
+            yield self._peeked.pop()
+        for commit in self._commits:
+            yield commit
+            if self._table is not None:  # The commit has been consumed
+                self._table.trim(commit._row + 1)
+
+
+class CommitTable:
+    """Columnar storage for the commits of a repo. Each commit is a row of
+    compact columns (binary hexsha, interned author id, timestamp, title and
+    description) sharing one repo context, and is accessed through a ``Commit``
+    view. Fields such as ``info`` and ``diff_url`` are derived on access.
+    """
+
+    def __init__(self, owner: str, rname: str, branch: str) -> None:
+        self.owner, self.rname, self.branch = owner, rname, branch
+        self.authors: List[Actor] = []
+        self._author_ids: Dict[Tuple[str, str], int] = {}
+        self._offset = 0  # The number of rows that have been trimmed
+        self._sha_size = 0  # 20 bytes for SHA-1 repos, 32 for SHA-256
+        self._hexshas = bytearray()
+        self._author_col = array("L")
+        self._dates = array("q")
+        self._titles: List[str] = []
+        self._descriptions: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    def append(
+        self, commit: Union[GitCommit, RawCommit, CachedCommit]
+    ) -> Commit:
+        """Add a commit as a new row and return a view of it."""
+        sha: bytes = bytes.fromhex(commit.hexsha)
+        self._sha_size = self._sha_size or len(sha)
+        key: Tuple[str, str] = (commit.author.name, commit.author.email)
+        author_id: Union[int, None] = self._author_ids.get(key)
+        if author_id is None:
+            author_id = self._author_ids[key] = len(self.authors)
+            self.authors.append(commit.author)
+
+        if isinstance(commit, CachedCommit):  # Already split and encoded
+            title, description = commit.title, commit.description
+        else:
+            title, description = split_message(commit.message)
+
+        self._hexshas += sha
+        self._author_col.append(author_id)
+        self._dates.append(commit.committed_date)
+        self._titles.append(title)
+        self._descriptions.append(description)
+        return Commit(self, self._offset + len(self._titles) - 1)
+
+    def discard(self, commit: Commit) -> None:
+        """Remove a filtered out commit if it is the last row."""
+        if commit._row == self._offset + len(self._titles) - 1:
+            del self._hexshas[-self._sha_size :]
+            for column in (
+                self._author_col,
+                self._dates,
+                self._titles,
+                self._descriptions,
+            ):
+                column.pop()
+
+    def trim(self, row: int) -> None:
+        """Forget the rows before ``row`` once they have been consumed, in
+        batches. Views of forgotten rows must not be used afterwards.
+        """
+        count: int = row - self._offset
+        if count < TRIM_BATCH_SIZE:
+            return
+        del self._hexshas[: count * self._sha_size]
+        for column in (
+            self._author_col,
+            self._dates,
+            self._titles,
+            self._descriptions,
+        ):
+            del column[:count]
+        self._offset = row
+
+    def hexsha_long(self, row: int) -> str:
+        i: int = (row - self._offset) * self._sha_size
+        return self._hexshas[i : i + self._sha_size].hex()
+
+    def hexsha_short(self, row: int) -> str:
+        return self.hexsha_long(row)[:7]
+
+    def author_name(self, row: int) -> Actor:
+        return self.authors[self._author_col[row - self._offset]]
+
+    def author_email(self, row: int) -> str:
+        return self.author_name(row).email
+
+    def date(self, row: int) -> datetime:
+        return datetime.fromtimestamp(self._dates[row - self._offset])
+
+    def title(self, row: int) -> str:
+        return self._titles[row - self._offset]
+
+    def description(self, row: int) -> str:
+        return self._descriptions[row - self._offset]
+
+    def diff_url(self, row: int) -> str:
+        return (
+            f"https://github.com/{self.owner}/{self.rname}/commit/"
+            f"{self.hexsha_long(row)}"
         )
 
-        self["info"] = (
-            f"{self['hexsha_short']} | "
-            f"By {self['author_name']} ({self['author_email']}) | "
-            f"At {self['date'].strftime('%d/%m/%Y')}"
+    def info(self, row: int) -> str:
+        return code(
+            f"{self.hexsha_short(row)} | "
+            f"By {self.author_name(row)} ({self.author_email(row)}) | "
+            f"At {self.date(row).strftime('%d/%m/%Y')}"
         )
-        self["info"] = Commit._code(self["info"])
 
-        # Extract the message from the title
-        msg = commit.message.split("\n")
-        self["title"] = Commit._code(msg[0])
-        self["description"] = (
-            Commit._code("\n".join(msg[1:])) if len(msg) > 1 else ""
-        )
 
-    @staticmethod
-    def _code(text: str, coding: str = CODING) -> str:
-        return text.encode(CODING, "replace").decode(CODING)
+class Commit(Mapping):
+    """A read-only, dictionary-like view of a row of a ``CommitTable``."""
+
+    __slots__ = ("_table", "_row")
+    _FIELDS = {
+        "rname": lambda table, row: table.rname,
+        "branch": lambda table, row: table.branch,
+        "author_name": CommitTable.author_name,
+        "author_email": CommitTable.author_email,
+        "date": CommitTable.date,
+        "hexsha_short": CommitTable.hexsha_short,
+        "hexsha_long": CommitTable.hexsha_long,
+        "diff_url": CommitTable.diff_url,
+        "info": CommitTable.info,
+        "title": CommitTable.title,
+        "description": CommitTable.description,
+    }
+
+    def __init__(self, table: CommitTable, row: int) -> None:
+        self._table, self._row = table, row
+
+    def __getitem__(self, key: str) -> object:
+        return self._FIELDS[key](self._table, self._row)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._FIELDS)
+
+    def __len__(self) -> int:
+        return len(self._FIELDS)
 
     def __str__(self) -> str:
         """View the commit in the terminal."""
@@ -304,3 +778,16 @@ class Commit(dict):
             f"View diff: {self['diff_url']}\n"
             "=============================\n"
         )
+
+
+def repo_name(r: Repo) -> str:
+    """Find the name of a repository, preferrably from its remote."""
+    if len(r.remotes) > 0:  # Use remote name
+        return url_name(r.remotes.origin.url)
+    # No remote exists, just get the name of the directory
+    return path.basename(r.working_tree_dir.split("/")[-1])
+
+
+def url_name(url: str) -> str:
+    """Find the name of a repository from its URL."""
+    return url.split(".git")[0].split("/")[-1]
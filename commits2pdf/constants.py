@@ -1,21 +1,30 @@
-import re
-
-# Regex for arg parser
-DATE = re.compile(
-    (
-        r"^(?:(?:31(\/|-|\.)(?:0?[13578]|1[02]))\1|(?:(?:29|30)(\/|-|\.)(?:0?[13-9]"
-        r"|1[0-2])\2))(?:(?:1[6-9]|[2-9]\d)?\d{2})$|^(?:29(\/|-|\.)0?2\3(?:(?:(?:1"
-        r"[6-9]|[2-9]\d)?(?:0[48]|[2468][048]|[13579][26])|(?:(?:16|[2468][048]|[3"
-        r"579][26])00))))$|^(?:0?[1-9]|1\d|2[0-8])(\/|-|\.)(?:(?:0?[1-9])|(?:1[0-2]"
-        r"))\4(?:(?:1[6-9]|[2-9]\d)?\d{2})$"
-    )
+# Regex for arg parser. The patterns are compiled when they are first used,
+# rather than whenever ``commits2pdf`` is imported
+DATE = (
+    r"^(?:(?:31(\/|-|\.)(?:0?[13578]|1[02]))\1|(?:(?:29|30)(\/|-|\.)(?:0?[13-9]"
+    r"|1[0-2])\2))(?:(?:1[6-9]|[2-9]\d)?\d{2})$|^(?:29(\/|-|\.)0?2\3(?:(?:(?:1"
+    r"[6-9]|[2-9]\d)?(?:0[48]|[2468][048]|[13579][26])|(?:(?:16|[2468][048]|[3"
+    r"579][26])00))))$|^(?:0?[1-9]|1\d|2[0-8])(\/|-|\.)(?:(?:0?[1-9])|(?:1[0-2]"
+    r"))\4(?:(?:1[6-9]|[2-9]\d)?\d{2})$"
 )  # d/m/yyyy or dd/mm/yyyy
 
-EMAILS = re.compile(
-    r"^([\w+-.%]+@[\w.-]+\.[A-Za-z]{2,4})(,[\w+-.%]+@[\w.-]+\.[A-Za-z]{2,4})*$"
+EMAILS = (
+    r"^([\w+-.%]+@[\w.-]+\.[A-Za-z]{2,4})"
+    r"(,[\w+-.%]+@[\w.-]+\.[A-Za-z]{2,4})*$"
 )  # usr@email.com or usr@email.com,user2@email.com, etc
 
-INVALID_QUERIES = re.compile(r"^,|,$")
+INVALID_QUERIES = r"^,|,$"
+
+# Filenames and relative paths which are valid on every platform, so that
+# they can be validated without importing ``pathvalidate``
+_PORTABLE_NAME = (
+    r"(?:\.\.?|(?!(?:con|prn|aux|nul|com\d|lpt\d)(?:[./]|$))"
+    r"[\w.-](?:[\w .-]*[\w-])?)"
+)
+PORTABLE_FILENAME = rf"(?ai)(?=.{{1,200}}$)(?!\.\.?$){_PORTABLE_NAME}$"
+PORTABLE_PATH = (
+    rf"(?ai)(?=.{{1,200}}$){_PORTABLE_NAME}(?:/{_PORTABLE_NAME})*/?$"
+)
 
 # Other stuff for arg parsing process
 USAGE_INFO = (
@@ -29,6 +38,27 @@ INVALID_ARG_WARNING = (
 CANNOT_USE_SCALE_WARNING = (
     "You cannot set scaling when using the gen1 PDF generator."
 )
+CANNOT_WRITE_LAYOUT_PLAN_WARNING = (
+    "A layout plan can only be written when using the gen3 PDF generator."
+)
+WROTE_LAYOUT_PLAN_INFO = "Wrote the layout plan to {}."
+PROFILE_INFO = "Profile: {}"
+WROTE_PROFILE_INFO = "Wrote the profile to {}."
+CANNOT_USE_JOBS_WARNING = (
+    "Commits can only be drawn in parallel when using the gen3 PDF generator."
+)
+CANNOT_USE_REPORT_CACHE_WARNING = (
+    "The report cache is not used when writing a layout plan or appending to"
+    " a report."
+)
+CANNOT_APPEND_WARNING = (
+    "Commits can only be appended to a report when using the gen3 PDF"
+    " generator, sorting commits from oldest to newest, without selecting the"
+    " newest or oldest n commits, and writing the report to a directory."
+)
+APPEND_JOBS_WARNING = (
+    "Commits are drawn in a single process when appending to a report."
+)
 
 
 # Handling the processing of the repository
@@ -37,7 +67,7 @@ DETACHED_BRANCH_ERROR = (
     " ({}) is detached. Try updating your repository with `git pull`."
 )
 NONEXISTING_BRANCH_WARNING = (
-    "The branch \"{}\" does not exist. Selecting the active branch"
+    'The branch "{}" does not exist. Selecting the active branch'
     " ({}) instead."
 )
 NONEXISTING_OR_INVALID_REPO_ERROR = (
@@ -47,8 +77,24 @@ INVALID_GIT_REPO_ERROR = (
     "The path you entered ({}) does not contain a .git file."
 )
 CLONING_REPO_INFO = "Cloning - This may take a while."
+FETCHING_REPO_INFO = "Fetching the cached clone of the repository."
+FETCH_FAILED_WARNING = (
+    "The cached clone of the repository could not be fetched. Using the"
+    " cached commits instead."
+)
 NONEXISTING_REPO_ERROR = "The repository does not exist."
 MUST_RECLONE_ERROR = "Please delete your repository and try again."
+CACHED_COMMITS_INFO = "Cached {} new commit(s)."
+CACHE_SIZE = 1_000_000  # Commits
+CLONE_CACHE_SIZE = 2048  # Megabytes
+CACHE_ERROR = (
+    "The commit cache could not be used ({}). Reading commits from git "
+    "instead."
+)
+HISTORY_REWRITTEN_WARNING = (
+    "The branch no longer contains the last commit of the report, so the"
+    " whole report will be generated again."
+)
 ZERO_COMMITS_WARNING = (
     "Based on your filtering parameters, the total commit count has been reduced "
     "to zero. Your commits PDF will be empty."
@@ -62,6 +108,7 @@ N_COMMITS_WARNING = (
     "{} n number of commits ({}) could not be selected as it is greater than"
     " or equal to the current amount of commits ({})."
 )
+PUSHDOWN_INFO = "Filtering commits by {} with git."
 GATHERED_COMMITS_INFO = (
     "Gathered {} commit(s) based on since, until and branch filters."
 )
@@ -69,9 +116,130 @@ GATHERED_COMMITS_INFO = (
 
 # General PDF messages
 WRITING_PDF_INFO = "Writing PDF to {}"
+WRAP_CACHE_INFO = "Wrap cache hit rate: {:.1%} ({} hit(s), {} miss(es))."
+WRAP_CACHE_SIZE = 1024
+CACHED_REPORT_INFO = "Copied the cached report of {} at {}."
+REPORT_CACHE_SIZE = 256  # Megabytes
+REPORT_CACHE_WARNING = (
+    "The tip of the branch could not be found. The report will not be cached."
+)
+APPENDING_INFO = "Appending the new commits to {}."
+UP_TO_DATE_INFO = "{} is already up to date."
 INVALID_OUTPUT_DIR_ERROR = "Invalid characters in output directory."
 INVALID_FILENAME_ERROR = "Invalid characters in filename."
 FILENAME = "{}-commit_report.pdf"
+STDOUT = "-"  # The output directory which writes the PDF to stdout
+
+
+# For ``c2p-serve``
+SERVE_USAGE_INFO = (
+    "Run ``c2p-serve`` and POST the arguments of a report, such as"
+    ' {"args": ["tomasvana10", "-gen3"]}, to /reports to generate it.'
+    " GET /metrics for the queue depth and latency of the reports."
+)
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 8421
+SERVE_MAX_QUEUE = 64
+SERVE_WARM_REPOS = 8
+SERVE_WRAP_CACHE_SIZE = 16 * WRAP_CACHE_SIZE
+# The names of the loopback address, which the Host header of requests sent to
+# it may use
+SERVE_LOOPBACK = frozenset(("127.0.0.1", "localhost", "::1"))
+# The options of ``c2p`` which the reports requested from ``c2p-serve`` may
+# set. The others read or write files named by the request, such as the
+# profile or layout plan, select another cache directory, or set the size of
+# the caches, which only the server sets
+SERVE_OPTIONS = frozenset(
+    (
+        "owner",
+        "output",
+        "name",
+        "branch",
+        "authors",
+        "start_date",
+        "end_date",
+        "reverse",
+        "dark",
+        "prevent_open",
+        "scaling",
+        "wrap_cache_size",
+        "include",
+        "exclude",
+        "regex_queries",
+        "engine",
+        "stream",
+        "cache",
+        "clone_cache",
+        "clone_filter",
+        "jobs",
+        "stream_write",
+        "append",
+        "deterministic",
+        "report_cache",
+        "profile",
+        "profile_memory",
+        "quiet",
+        "gen1",
+        "gen2a",
+        "gen2b",
+        "gen3",
+        "rpath",
+        "rname",
+        "newest_n_commits",
+        "oldest_n_commits",
+    )
+)
+LATENCY_SAMPLES = 1024  # The number of recent reports latencies are of
+SERVING_INFO = "Serving reports on {} with {} worker(s)."
+SERVE_STOPPED_INFO = "Stopped serving reports."
+REPORT_JOB_INFO = (
+    "Generated the report of `c2p {}` in {:.3f}s ({:.3f}s waiting), with"
+    " status {}."
+)
+NO_UNIX_SOCKETS_ERROR = "Unix sockets are not supported on this platform."
+INVALID_JOB_ERROR = (
+    'Expected a JSON object such as {"args": ["owner"], "return": "bytes"}.'
+)
+PATH_TO_STDOUT_ERROR = "Reports written to stdout cannot be returned as paths."
+QUEUE_FULL_ERROR = "Too many reports are waiting. Try again later."
+NOT_JSON_ERROR = "Expected a request with Content-Type: application/json."
+FORBIDDEN_REQUEST_ERROR = (
+    "Requests must be sent to the address of the server, without an Origin"
+    " header."
+)
+DISALLOWED_OPTION_ERROR = (
+    "{} cannot be set in reports requested from c2p-serve."
+)
+OUTSIDE_ROOT_ERROR = (
+    "{} is outside of {}, which the reports requested from c2p-serve are"
+    " confined to."
+)
+NOT_A_DIRECTORY_ERROR = "{} is not a directory."
+REPORT_FAILED_ERROR = "The report could not be generated."
+
+# For ``c2p-batch``
+BATCH_USAGE_INFO = (
+    "Run ``c2p-batch manifest.json``, where the manifest lists the options"
+    ' of each report, such as {"jobs": [{"owner": "tomasvana10", "rpath":'
+    ' ".", "gen3": true}]}. Options are named like the destinations of the'
+    " arguments of ``c2p`` (see the README)."
+)
+BATCH_JOB_INFO = "[{}/{}] Generated {} at {} in {:.3f}s."
+BATCH_JOB_ERROR = "[{}/{}] Could not generate {}: {}"
+BATCH_SUMMARY_INFO = (
+    "Generated {} of {} report(s) of {} repo(s) in {:.1f}s ({} failed)."
+)
+WROTE_SUMMARY_INFO = "Wrote the summary to {}."
+INVALID_MANIFEST_ERROR = "Could not read the manifest {}: {}"
+MANIFEST_FORMAT_ERROR = (
+    'Expected a manifest such as {"defaults": {...}, "jobs": [{...}]}.'
+)
+NO_TOML_ERROR = (
+    "Reading TOML requires Python 3.11+. Run `pip install tomli` and try"
+    " again, or use JSON."
+)
+INVALID_JOB_OPTION_ERROR = "Invalid option {} = {!r}."
+WORKER_DIED_ERROR = "The worker process generating the report died."
 
 
 # For the pycairo PDF implementation
@@ -0,0 +1,50 @@
+"""The fonts of the fpdf generation implementations. Each PDF scales a copy of
+the fonts in ``constants.py``, so that PDFs with different scalings can be
+generated in the same process.
+"""
+
+from typing import List, NamedTuple
+
+from .constants import (
+    INFO_TEXT_FONT,
+    MARGIN_FONT,
+    MEDIUM_TEXT_FONT,
+    MEDIUM_TEXT_FONT_BOLD,
+    SMALL_TEXT_FONT,
+    SUBTITLE_FONT,
+    TITLE_FONT,
+    TITLE_PAGE_INFO_FONT,
+)
+
+
+class Fonts(NamedTuple):
+    """The family, style and size of each font of a PDF."""
+
+    title: List[float]
+    title_page_info: List[float]
+    subtitle: List[float]
+    margin: List[float]
+    small: List[float]
+    medium: List[float]
+    medium_bold: List[float]
+    info: List[float]
+
+    @classmethod
+    def scaled(cls, scaling: float = 1.0) -> "Fonts":
+        """Scale the fonts based on the user-selected scaling, apart from the
+        margin font.
+        """
+
+        def scale(font: List[float]) -> List[float]:
+            return [font[0], font[1], font[2] * scaling]
+
+        return cls(
+            title=scale(TITLE_FONT),
+            title_page_info=scale(TITLE_PAGE_INFO_FONT),
+            subtitle=scale(SUBTITLE_FONT),
+            margin=list(MARGIN_FONT),
+            small=scale(SMALL_TEXT_FONT),
+            medium=scale(MEDIUM_TEXT_FONT),
+            medium_bold=scale(MEDIUM_TEXT_FONT_BOLD),
+            info=scale(INFO_TEXT_FONT),
+        )
@@ -0,0 +1,91 @@
+"""Bulk ingestion of commits through a single ``git log`` subprocess. Used as
+an alternative to walking ``Repo.iter_commits``, which lazily reads each
+commit's author, date and message from the object database one at a time.
+"""
+
+from typing import Dict, Iterator, List, NamedTuple, Tuple, Union
+
+from git import Actor, Repo
+
+from .constants import CODING
+
+# Hexsha, author name, author email, committer timestamp and raw message,
+# separated by NUL bytes. ``-z`` also separates each record with a NUL byte.
+LOG_FORMAT = "%H%x00%an%x00%ae%x00%ct%x00%B"
+FIELD_COUNT = 5
+CHUNK_SIZE = 1 << 16
+
+
+class RawCommit(NamedTuple):
+    """The subset of a ``git.Commit`` read by ``CommitTable.append``."""
+
+    hexsha: str
+    author: Actor
+    committed_date: int
+    message: str
+
+
+def iter_git_log(
+    repo: Repo, rev: Union[str, List[str]], **kwargs
+) -> Iterator[RawCommit]:
+    """Yield ``RawCommit`` records for ``rev`` by streaming and parsing the
+    output of ``git log`` in a single pass. ``kwargs`` are passed to
+    ``git log`` in the same way as ``Repo.iter_commits`` passes them to
+    ``git rev-list``, so since/until semantics are identical.
+    """
+    proc = repo.git.log(
+        rev,
+        "--",
+        format=LOG_FORMAT,
+        z=True,
+        no_color=True,
+        no_show_signature=True,
+        as_process=True,
+        **kwargs,
+    )
+    actors: Dict[Tuple[str, str], Actor] = {}  # Share identical authors
+    fields: List[str] = []
+    tail = b""
+    while True:
+        chunk = proc.stdout.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        parts = (tail + chunk).split(b"\0")
+        tail = parts.pop()  # Possibly incomplete, so wait for more data
+        for part in parts:
+            fields.append(part.decode("utf-8", "replace"))
+            if len(fields) == FIELD_COUNT:
+                yield _make_record(fields, actors)
+                fields = []
+    if tail:  # The final record is not followed by a separator
+        fields.append(tail.decode("utf-8", "replace"))
+        if len(fields) == FIELD_COUNT:
+            yield _make_record(fields, actors)
+    # Raises ``GitCommandError`` if git failed. If the caller stops iterating
+    # early, ``AutoInterrupt`` kills the process once it is garbage collected.
+    proc.wait()
+
+
+def _make_record(
+    fields: List[str], actors: Dict[Tuple[str, str], Actor]
+) -> RawCommit:
+    """Convert the fields of a single ``git log`` record to a ``RawCommit``."""
+    hexsha, name, email, timestamp, message = fields
+    key = (name, email)
+    author = actors.get(key)
+    if author is None:
+        author = actors[key] = Actor(name, email)
+    return RawCommit(hexsha, author, int(timestamp), message)
+
+
+def code(text: str) -> str:
+    """Replace the characters of ``text`` that cannot be encoded in
+    ``CODING``.
+    """
+    return text.encode(CODING, "replace").decode(CODING)
+
+
+def split_message(message: str) -> Tuple[str, str]:
+    """Split a commit message into its title and description."""
+    msg = message.split("\n")
+    return code(msg[0]), code("\n".join(msg[1:])) if len(msg) > 1 else ""
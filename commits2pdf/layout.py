@@ -0,0 +1,219 @@
+"""Layout planning for the gen3 generation implementation. The planner decides
+where each commit is placed (page, y position, page splits and the divider)
+using only font metrics, and ``FPDF_PDF`` then draws the commits according to
+the plan. The plan is a list of ``Placement`` records, which can be written to
+and read from JSON to be cached or inspected.
+"""
+
+import json
+from typing import IO, Dict, Iterator, List, NamedTuple, Tuple
+
+from fpdf import FPDF
+
+from .constants import MARGIN_LR, MARGIN_TB
+from .fonts import Fonts
+from .metrics import LineCounter, WrapCache, split_lines
+
+PLAN_VERSION = 1
+# Commits passing this fraction of the page height are moved to a new page
+BREAK_THRESHOLD = 0.95
+# The font (a field of ``Fonts``), line height scale, text (the key of a
+# commit field, or ``None`` for the diff link) and trailing ``ln`` scale of
+# each part of a commit
+PARTS = (
+    ("info", 1.25, "info", 0.75),
+    ("medium_bold", 1.25, "title", -0.5),
+    ("small", 1.5, "description", 1.5),
+    ("small", 1.5, None, 4.75),
+)
+LINK_PART = 3  # The index of the diff link in ``PARTS``
+LINK_TEXT = "View diff on GitHub"
+
+
+class Placement(NamedTuple):
+    """Where a commit is drawn. A multipage commit is moved to the top of a
+    new page and drawn with automatic page breaks, so it may be split across
+    several pages.
+    """
+
+    page: int  # The page the commit starts on
+    y: float
+    multipage: bool
+    end_page: int  # The page the commit ends on, which holds its divider
+    end_y: float
+    divider_y: float
+
+
+class PagePlan:
+    """The placements of the commits of a PDF, in drawing order."""
+
+    def __init__(self, placements: List[Placement] = None) -> None:
+        self.placements: List[Placement] = placements or []
+
+    def __len__(self) -> int:
+        return len(self.placements)
+
+    def __iter__(self) -> Iterator[Placement]:
+        return iter(self.placements)
+
+    def append(self, placement: Placement) -> None:
+        self.placements.append(placement)
+
+    @property
+    def page_count(self) -> int:
+        """The number of pages the commits are drawn on."""
+        if not self.placements:
+            return 0
+        return self.placements[-1].end_page - self.placements[0].page + 1
+
+    def dump(self, fp: IO[str]) -> None:
+        """Write the plan to a file as JSON."""
+        json.dump(
+            {
+                "version": PLAN_VERSION,
+                "fields": Placement._fields,
+                "placements": self.placements,
+            },
+            fp,
+        )
+
+    @classmethod
+    def load(cls, fp: IO[str]) -> "PagePlan":
+        """Read a plan written by ``dump``."""
+        data = json.load(fp)
+        if data["version"] != PLAN_VERSION:
+            raise ValueError(f"Unsupported plan version: {data['version']}")
+        return cls([Placement(*placement) for placement in data["placements"]])
+
+
+class LayoutPlanner:
+    """Place commits one at a time, tracking the position that drawing them
+    with ``FPDF_PDF._commit`` would leave the PDF at. Positions are advanced
+    one line at a time, like ``FPDF.cell`` does, so that they are identical
+    to the drawn positions. The parts of a commit and their spacing mirror
+    ``FPDF_PDF._commit``. Placing can continue where another planner left
+    off, given its position and the number of commits it ``placed``.
+    """
+
+    def __init__(
+        self,
+        page: int,
+        y: float,
+        wrap_cache: WrapCache,
+        fonts: Fonts,
+        placed: int = 0,
+    ) -> None:
+        self.page, self.y, self.placed = page, y, placed
+        self._wrap_cache, self._fonts = wrap_cache, fonts
+        self._counters: List[Tuple[LineCounter, str]] = None
+        self._m = FPDF()  # Only used to split text into lines
+        # Positioned like the commits are drawn, so that the lines split here
+        # are found in the wrap cache when the commits are drawn
+        self._m.set_margins(MARGIN_LR, MARGIN_TB)
+        self._m.set_auto_page_break(auto=False)
+        self._m.add_page()
+        self._break_y = self._m.h * BREAK_THRESHOLD
+        self._trigger = self._m.h - MARGIN_TB  # When splitting a commit
+
+    def place(
+        self, commit: Dict[str, str], lines: Tuple[int, ...] = ()
+    ) -> Placement:
+        """Decide where the next commit is drawn and advance past it.
+        Commits that would pass ``BREAK_THRESHOLD`` are moved to a new page,
+        except the first commit, which is already at the top of a page.
+        ``lines`` can give the number of lines of the commit's parts if they
+        have already been counted.
+        """
+        parts = self._measure(commit, lines)
+        multipage = self._passes_break(parts)
+        if multipage:
+            if self.placed:
+                self.page += 1
+            self.y = MARGIN_TB
+        page, y = self.page, self.y
+        divider_y = self._advance(parts, split=multipage)
+        self.placed += 1
+        return Placement(page, y, multipage, self.page, self.y, divider_y)
+
+    def place_batch(self, commits: List[Dict[str, str]]) -> List[Placement]:
+        """Place a batch of commits, counting the lines of all their parts
+        together with ``LineCounter`` rather than splitting each text.
+        """
+        if self._counters is None:
+            self._counters = [
+                (LineCounter(self._m, getattr(self._fonts, name)), key)
+                for name, _, key, _ in PARTS[:LINK_PART]
+            ]
+        counts = zip(
+            *(
+                counter.count([commit[key] for commit in commits])
+                for counter, key in self._counters
+            )
+        )
+        return [
+            self.place(commit, lines) for commit, lines in zip(commits, counts)
+        ]
+
+    def _split_lines(
+        self, font: List[float], h_scale: float, txt: str
+    ) -> Tuple[int, float]:
+        """Find the number of lines ``multi_cell`` would split ``txt`` into,
+        and the height of each line.
+        """
+        self._m.set_font(*font)
+        h = self._m.font_size * h_scale
+        return len(split_lines(self._m, txt, self._wrap_cache)), h
+
+    def _measure(
+        self, commit: Dict[str, str], lines: Tuple[int, ...] = ()
+    ) -> List[Tuple[int, float, float]]:
+        """Find the number of lines, line height and trailing ``ln`` height of
+        each part of a commit. The diff link is drawn with ``write``, so its
+        last line does not move down.
+        """
+        parts = []
+        for i, (name, h_scale, key, ln_scale) in enumerate(PARTS):
+            font = getattr(self._fonts, name)
+            if i < len(lines):
+                self._m.set_font(*font)
+                count, h = lines[i], self._m.font_size * h_scale
+            else:
+                count, h = self._split_lines(
+                    font, h_scale, commit[key] if key else LINK_TEXT
+                )
+            parts.append((count, h, self._m.font_size * ln_scale))
+        return parts
+
+    def _passes_break(self, parts: List[Tuple[int, float, float]]) -> bool:
+        """Check whether drawing the commit without page breaks would pass
+        ``BREAK_THRESHOLD`` after any of its parts.
+        """
+        y = self.y
+        for i, (lines, h, ln) in enumerate(parts):
+            for _ in range(lines if i < LINK_PART else lines - 1):
+                y += h
+            y += ln
+            if y > self._break_y:
+                return True
+        return False
+
+    def _advance(
+        self, parts: List[Tuple[int, float, float]], split: bool
+    ) -> float:
+        """Advance past the commit, starting a new page whenever a line passes
+        the bottom margin if it is ``split``. Return the y of its divider.
+        """
+        for i, (lines, h, ln) in enumerate(parts):
+            for _ in range(lines if i < LINK_PART else lines - 1):
+                self._line(h, split)
+            if i == LINK_PART and split and self.y + h > self._trigger:
+                # The last chunk of ``write`` can also break the page
+                self.page, self.y = self.page + 1, MARGIN_TB
+            self.y += ln
+        return self.y - self._m.font_size * 3.25 / 2
+
+    def _line(self, h: float, split: bool) -> None:
+        """Advance past a line of height ``h``."""
+        if split and self.y + h > self._trigger:
+            self.page, self.y = self.page + 1, MARGIN_TB
+        self.y += h
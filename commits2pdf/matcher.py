@@ -0,0 +1,81 @@
+"""Matching of include and exclude queries against commit messages. Every
+query is matched in a single pass over each commit's text, which is casefolded
+only once, rather than casefolding the text again for each query.
+"""
+
+import re
+from typing import Dict, List, Pattern
+
+# With fewer queries than this, scanning the text once per query is faster
+# than matching them all with a single trie-shaped regex (see
+# ``benchmarks/bench_queries.py``)
+TRIE_THRESHOLD = 50
+
+
+class QueryMatcher:
+    """A compiled set of queries which matches a commit if any of the queries
+    is found in its title or description. Queries are case insensitive
+    substrings, or regular expressions if ``regex`` is set.
+    """
+
+    def __init__(self, queries: List[str], regex: bool = False) -> None:
+        self._regex = regex
+        if regex:
+            self._pattern: Pattern = re.compile(
+                "|".join(f"(?:{q})" for q in queries), re.IGNORECASE
+            )
+        else:
+            # Remove duplicates, preserving order so that the most likely
+            # queries (typically given first) are tried first
+            self._queries: List[str] = list(
+                dict.fromkeys(q.casefold() for q in queries)
+            )
+            self._pattern = (
+                _compile_trie(self._queries)
+                if len(self._queries) >= TRIE_THRESHOLD
+                else None
+            )
+
+    def matches(self, title: str, description: str) -> bool:
+        """Check whether any query is found in ``title`` or ``description``."""
+        if self._regex:
+            return bool(
+                self._pattern.search(title)
+                or self._pattern.search(description)
+            )
+        # Queries cannot contain NUL, so no query can match across the
+        # boundary between the title and description
+        text: str = f"{title}\0{description}".casefold()
+        if self._pattern:
+            return self._pattern.search(text) is not None
+        return any(q in text for q in self._queries)
+
+
+def _compile_trie(queries: List[str]) -> Pattern:
+    """Compile literal queries into a regex shaped like a trie of the queries,
+    so that queries sharing a prefix are matched together and the regex engine
+    only tries the branches that can match at each position.
+    """
+    trie: Dict[str, Dict] = {}
+    for q in queries:
+        node = trie
+        for char in q:
+            node = node.setdefault(char, {})
+        node[""] = {}  # Marks the end of a query
+
+    def to_regex(node: Dict[str, Dict]) -> str:
+        prefix = ""
+        while len(node) == 1 and "" not in node:  # Iterate over long chains
+            char, node = next(iter(node.items()))
+            prefix += re.escape(char)
+        branches = [re.escape(c) + to_regex(node[c]) for c in node if c]
+        if not branches:
+            return prefix
+        group = (
+            branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        )
+        if "" in node:  # A query ends here, so the rest is optional
+            group = f"(?:{group})?" if len(branches) == 1 else f"{group}?"
+        return prefix + group
+
+    return re.compile(to_regex(trie))
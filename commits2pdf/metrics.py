@@ -0,0 +1,237 @@
+"""Estimation of commit heights for the gen2a generation implementation. The
+number of lines ``FPDF.multi_cell`` wraps a text into is found from the glyph
+widths of fpdf's core fonts, for a whole batch of texts at once. If NumPy is
+installed, the texts of a batch are wrapped together with vectorised
+operations, otherwise they are wrapped one at a time.
+
+Wrapped text is also memoised by ``WrapCache``, so that renderers which wrap
+the same text more than once (to measure it and then draw it) or draw
+repeated text only wrap it once.
+"""
+
+from collections import OrderedDict
+from functools import lru_cache
+from math import floor
+from typing import Callable, Dict, Hashable, List, Tuple, TypeVar
+
+from fpdf import FPDF
+from fpdf.fonts import fpdf_charwidths
+
+from .constants import WRAP_CACHE_SIZE
+from .fonts import Fonts
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ESTIMATE_BATCH_SIZE = 256
+
+T = TypeVar("T")
+
+
+@lru_cache(maxsize=None)
+def char_widths(family: str, style: str) -> Tuple[int, ...]:
+    """Find the widths of the 256 characters of a core font, in thousandths
+    of the font size. Each font is only looked up once per process.
+    """
+    family = family.lower()
+    if family == "arial":  # An alias used by fpdf
+        family = "helvetica"
+    widths = fpdf_charwidths[family + "".join(sorted(style.upper()))]
+    return tuple(widths[chr(code)] for code in range(256))
+
+
+class LineCounter:
+    """Count the lines ``FPDF.multi_cell`` wraps texts into when drawn from
+    the left margin of ``pdf`` with a width of 0 (up to the right margin).
+    """
+
+    def __init__(self, pdf: FPDF, font: List[float]) -> None:
+        self._widths = list(char_widths(font[0], font[1]))
+        self._widths[ord("\n")] = 0  # Line breaks are never measured
+        font_size = font[2] / pdf.k
+        # ``multi_cell`` compares integer widths against this limit, so it can
+        # be rounded down without changing the comparison
+        self._wmax = floor(
+            (pdf.w - pdf.r_margin - pdf.l_margin - 2 * pdf.c_margin)
+            * 1000.0
+            / font_size
+        )
+        if np is not None:
+            # Characters outside latin-1 have no width, like in ``multi_cell``
+            self._np_widths = np.array(self._widths + [0], dtype=np.int64)
+
+    def count(self, texts: List[str]) -> List[int]:
+        texts = [_strip(txt) for txt in texts]
+        if np is None:
+            return [self._count_one(txt) for txt in texts]
+        return self._count_batch(texts)
+
+    def _count_one(self, s: str) -> int:
+        """Wrap a text the way ``multi_cell`` does, but only count the
+        lines.
+        """
+        widths, wmax = self._widths, self._wmax
+        lines, sep, i, j, l, nb = 1, -1, 0, 0, 0, len(s)
+        while i < nb:
+            c = s[i]
+            if c == "\n":
+                lines += 1
+                i += 1
+                sep, j, l = -1, i, 0
+                continue
+            if c == " ":
+                sep = i
+            code = ord(c)
+            l += widths[code] if code < 256 else 0
+            if l > wmax:
+                if sep == -1:
+                    if i == j:
+                        i += 1
+                else:
+                    i = sep + 1
+                lines += 1
+                sep, j, l = -1, i, 0
+            else:
+                i += 1
+        return lines
+
+    def _count_batch(self, texts: List[str]) -> List[int]:
+        """Wrap all the texts together, advancing every unfinished text by one
+        line per iteration. The width of any range of characters is the
+        difference of two cumulative widths, so the end of each line is found
+        with a binary search rather than by adding up its characters.
+        """
+        lengths = np.array([len(txt) for txt in texts], dtype=np.int64)
+        ends = np.cumsum(lengths)
+        codes = np.frombuffer(
+            "".join(texts).encode("utf-32-le"), dtype=np.uint32
+        )
+        cumulative = np.zeros(len(codes) + 1, dtype=np.int64)
+        np.cumsum(self._np_widths[np.minimum(codes, 256)], out=cumulative[1:])
+        # Sentinels keep the searches below in bounds
+        newlines = np.append(np.flatnonzero(codes == 10), len(codes))
+        spaces = np.insert(np.flatnonzero(codes == 32), 0, -1)
+
+        lines = np.zeros(len(texts), dtype=np.int64)
+        active = np.arange(len(texts))  # The texts with lines left to wrap
+        j = ends - lengths  # The start of the current line of each text
+        while active.size:
+            lines[active] += 1
+            end = ends[active]
+            # The end of the paragraph the line is in
+            nl = np.minimum(newlines[np.searchsorted(newlines, j)], end)
+            # The first character that does not fit on the line
+            i = (
+                np.searchsorted(
+                    cumulative, cumulative[j] + self._wmax, side="right"
+                )
+                - 1
+            )
+            # The last space up to and including that character
+            sep = spaces[np.searchsorted(spaces, i, side="right") - 1]
+            wrapped = i < nl
+            j = np.where(
+                wrapped,
+                np.where(sep >= j, sep + 1, np.where(i == j, i + 1, i)),
+                nl + 1,
+            )
+            more = wrapped | (nl < end)
+            active, j = active[more], j[more]
+        return lines.tolist()
+
+
+class HeightEstimator:
+    """Estimate the height of commits drawn by ``FPDF_PDF._commit``, from the
+    top of a commit to its divider. The parts of a commit and their spacing
+    mirror ``FPDF_PDF._commit``.
+    """
+
+    def __init__(self, pdf: FPDF, fonts: Fonts) -> None:
+        self._parts = []
+        for key, font, h_scale, ln_scale in (
+            ("info", fonts.info, 1.25, 0.75),
+            ("title", fonts.medium_bold, 1.25, -0.5),
+            ("description", fonts.small, 1.5, 1.5),
+        ):
+            font_size = font[2] / pdf.k
+            self._parts.append(
+                (
+                    key,
+                    LineCounter(pdf, font),
+                    font_size * h_scale,
+                    font_size * ln_scale,
+                )
+            )
+        # The diff link is a single line drawn with ``write``, followed by the
+        # divider
+        self._link = fonts.small[2] / pdf.k * (4.75 - 3.25 / 2)
+
+    def heights(self, commits: List[Dict[str, str]]) -> List[float]:
+        heights = [self._link] * len(commits)
+        for key, counter, h, ln in self._parts:
+            counts = counter.count([commit[key] for commit in commits])
+            heights = [
+                height + lines * h + ln
+                for height, lines in zip(heights, counts)
+            ]
+        return heights
+
+
+class WrapCache:
+    """A bounded memo of wrapped text, keyed by the text, font, size and
+    width it is wrapped with. The least recently used entries are evicted
+    once it holds ``size`` entries. Hits and misses are counted so that its
+    size can be tuned.
+    """
+
+    def __init__(self, size: int = WRAP_CACHE_SIZE) -> None:
+        self.size = size
+        self.hits = self.misses = 0
+        self._entries: "OrderedDict[Hashable, object]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups: int = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def lookup(self, key: Hashable, wrap: Callable[[], T]) -> T:
+        """Find the wrapped text for ``key``, calling ``wrap`` to wrap it if
+        it is not cached.
+        """
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            value = wrap()
+            if self.size > 0:
+                self._entries[key] = value
+                if len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+            return value
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+
+def split_lines(pdf: FPDF, txt: str, cache: WrapCache) -> Tuple[str, ...]:
+    """Split ``txt`` into the lines ``multi_cell`` draws with the current
+    font and position of ``pdf`` and a width of 0, using ``cache``.
+    """
+    w: float = pdf.w - pdf.r_margin - pdf.x
+    return cache.lookup(
+        (txt, pdf.font_family, pdf.font_style, pdf.font_size_pt, w),
+        lambda: tuple(pdf.multi_cell(w=w, h=0, txt=txt, split_only=True)),
+    )
+
+
+def _strip(txt: str) -> str:
+    """Remove what ``multi_cell`` ignores: carriage returns and a trailing
+    line break.
+    """
+    txt = txt.replace("\r", "")
+    return txt[:-1] if txt.endswith("\n") else txt
@@ -0,0 +1,175 @@
+"""Parallel drawing for the gen3 generation implementation. All the commits
+are laid out first, which gives the page each commit is drawn on, and are then
+split into contiguous chunks at page breaks. Each chunk is drawn by a worker
+process on its own ``FPDF`` instance, and the content streams of the pages it
+draws are merged into the PDF by ``FPDF_PDF``.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from math import ceil
+from multiprocessing import get_context
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+from fpdf import FPDF
+
+from .constants import MARGIN_LR, MARGIN_TB
+from .fonts import Fonts
+from .layout import Placement
+from .metrics import WrapCache
+from .render_fpdf import FPDF_PDF, footer
+
+CHUNKS_PER_JOB = 4  # More chunks than jobs balance the load of the workers
+# The fonts of the commits in the order they are first used, after the fonts
+# of the title page (which is drawn first). Every ``FPDF`` instance registers
+# them in the same order, so that pages drawn by different processes refer to
+# each font by the same index.
+TITLE_PAGE_FONTS = ("title", "subtitle", "title_page_info")
+FONT_ORDER = ("info", "medium_bold", "small")
+
+
+class ChunkResult(NamedTuple):
+    """The pages drawn by a worker, as page content streams and links keyed
+    by page number, and the counters of its wrap cache.
+    """
+
+    pages: Dict[int, str]
+    links: Dict[int, List[Tuple]]
+    hits: int
+    misses: int
+
+
+class ChunkPDF(FPDF_PDF):
+    """Draws a chunk of commits where the layout plan has placed them, in the
+    same way ``FPDF_PDF`` draws them, without writing a file. A chunk which
+    does not start on the first page of commits starts on a scratch page that
+    is left in the state drawing the previous chunk would leave the PDF in.
+    """
+
+    def __init__(
+        self,
+        commits: List[Dict[str, str]],
+        placements: List[Placement],
+        first: bool,
+        last: bool,
+        footer_first: bool,
+        appearance: dict,
+        timestamp: str,
+        scaling: float,
+        wrap_cache_size: int,
+    ) -> None:
+        self._init_state(
+            appearance,
+            "measured",
+            scaling,
+            timestamp,
+            WrapCache(wrap_cache_size),
+        )
+        self.do_pre_vis: bool = False
+        self._p.set_fill_color(*self._ap["background"])
+        self._p.set_margins(MARGIN_LR, MARGIN_TB)
+        self._p.set_auto_page_break(auto=False)
+        register_fonts(self._p, self._fonts, footer_first)
+
+        start, end = placements[0].page, placements[-1].end_page
+        if first:
+            self._p.page = start - 1
+            self._p.add_page()
+            self._bg()
+        else:
+            self._p.page = start - 2
+            self._p.add_page()  # The scratch page
+            self._p.set_draw_color(*self._ap["background"])
+        self.commit_counter: int = 0
+        for commit, placement in zip(commits, placements):
+            self._p.footer = self.footer
+            self._emit_commit(commit, placement)
+            self._p.footer = footer
+        self.footer()
+        if not last:  # Break the page like the next chunk's first commit does
+            self._p.footer = self.footer
+            self._p.add_page()
+
+        self.result = ChunkResult(
+            {page: self._p.pages[page] for page in range(start, end + 1)},
+            {
+                page: links
+                for page, links in self._p.page_links.items()
+                if start <= page <= end
+            },
+            self.wrap_cache.hits,
+            self.wrap_cache.misses,
+        )
+
+
+def register_fonts(pdf: FPDF, fonts: Fonts, footer_first: bool) -> None:
+    """Register the fonts in the order drawing the title page and the commits
+    on a single ``FPDF`` instance would, without selecting any of them. The
+    footer is drawn before the first commit if it is moved to a new page
+    (hence ``footer_first``), and after the commits of the first page
+    otherwise.
+    """
+    if footer_first:
+        names = ("margin",) + FONT_ORDER
+    else:
+        names = FONT_ORDER + ("margin",)
+    for name in TITLE_PAGE_FONTS + names:
+        pdf.set_font(*getattr(fonts, name))
+    pdf.font_family = ""
+
+
+def partition(placements: List[Placement], chunks: int) -> List[range]:
+    """Split the commits into about ``chunks`` contiguous ranges of similar
+    length, each starting with a commit that starts a new page.
+    """
+    target: int = ceil(len(placements) / chunks)
+    starts = [0]
+    for i in range(1, len(placements)):
+        if (
+            i - starts[-1] >= target
+            and placements[i].page > placements[i - 1].end_page
+        ):
+            starts.append(i)
+    starts.append(len(placements))
+    return [range(start, end) for start, end in zip(starts, starts[1:])]
+
+
+def draw_chunks(
+    commits: List[Dict[str, str]],
+    placements: List[Placement],
+    jobs: int,
+    appearance: dict,
+    timestamp: str,
+    scaling: float,
+    wrap_cache_size: int,
+) -> Iterator[Tuple[int, ChunkResult]]:
+    """Draw the commits in chunks with a pool of ``jobs`` worker processes.
+    Yield the number of commits and the result of each chunk as it is drawn.
+    Workers are spawned rather than forked, so that they behave the same on
+    every platform.
+    """
+    chunks = partition(placements, jobs * CHUNKS_PER_JOB)
+    with ProcessPoolExecutor(
+        max_workers=min(jobs, len(chunks)),
+        mp_context=get_context("spawn"),
+    ) as pool:
+        futures = {
+            pool.submit(
+                _draw_chunk,
+                commits[chunk.start : chunk.stop],
+                placements[chunk.start : chunk.stop],
+                chunk.start == 0,
+                chunk.stop == len(placements),
+                placements[0].multipage,
+                appearance,
+                timestamp,
+                scaling,
+                wrap_cache_size,
+            ): len(chunk)
+            for chunk in chunks
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def _draw_chunk(*args) -> ChunkResult:
+    return ChunkPDF(*args).result
@@ -0,0 +1,200 @@
+"""Per-stage instrumentation for ``--profile``. A ``Profiler`` records the
+wall time, CPU time, peak traced memory and number of items of each stage of
+generating a report. Stages nest (and the lazily walked commits are processed
+by several stages at once), so the time of a stage excludes the time spent in
+the stages it calls. Code is only instrumented when a profiler is given, so
+profiling costs nothing otherwise.
+"""
+
+import json
+from contextlib import contextmanager, nullcontext
+from importlib import import_module
+from time import perf_counter, process_time
+from typing import (
+    IO,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    TypeVar,
+    Union,
+)
+
+PROFILE_VERSION = 1
+T = TypeVar("T")
+
+
+class StageStats:
+    """The totals of a stage."""
+
+    __slots__ = ("name", "wall", "cpu", "peak", "count")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.wall = self.cpu = 0.0  # Excluding the stages it called
+        self.peak = 0  # The peak traced memory while it was running
+        self.count = 0  # The number of items or calls
+
+    def as_dict(self, memory: bool = True) -> Dict[str, object]:
+        """The totals, without the peak memory unless it was traced."""
+        stats = {
+            "name": self.name,
+            "wall_s": round(self.wall, 6),
+            "cpu_s": round(self.cpu, 6),
+            "peak_bytes": self.peak,
+            "count": self.count,
+        }
+        if not memory:
+            del stats["peak_bytes"]
+        return stats
+
+
+class Profiler:
+    """Records the stages run between ``start`` and ``stop``. Memory is traced
+    with ``tracemalloc`` if ``memory`` is set, which slows the stages down
+    several times over, so their times are only comparable without it.
+    CPU time is that of this process, so it excludes worker processes.
+    """
+
+    def __init__(self, memory: bool = True) -> None:
+        self.stages: Dict[str, StageStats] = {}
+        self.total = StageStats("total")
+        self._memory, self._tracing = memory, False
+        # Only imported when memory is traced
+        self._tracemalloc = import_module("tracemalloc") if memory else None
+        # The stats, start wall and CPU times, and wall and CPU times of the
+        # stages called by each running stage
+        self._stack: List[list] = []
+        self._began = (0.0, 0.0)
+
+    def start(self) -> None:
+        if self._memory and not self._tracemalloc.is_tracing():
+            self._tracemalloc.start()
+            self._tracing = True
+        self._began = (perf_counter(), process_time())
+
+    def stop(self) -> None:
+        self.total.wall = perf_counter() - self._began[0]
+        self.total.cpu = process_time() - self._began[1]
+        self._sample()
+        if self._tracing:
+            self._tracemalloc.stop()
+            self._tracing = False
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageStats]:
+        """Time the body of a ``with`` statement as the stage ``name``."""
+        self._enter(name)
+        try:
+            yield self.stages[name]
+        finally:
+            self._exit(1)
+
+    def timed(self, name: str, fn: Callable[..., T]) -> Callable[..., T]:
+        """Wrap ``fn`` so that each call is timed as the stage ``name``."""
+
+        def call(*args, **kwargs) -> T:
+            self._enter(name)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._exit(1)
+
+        return call
+
+    def iterate(self, name: str, items: Iterable[T]) -> Iterator[T]:
+        """Time producing each of ``items`` as the stage ``name``."""
+        items = iter(items)
+        while True:
+            self._enter(name)
+            try:
+                item = next(items)
+            except StopIteration:
+                self._exit(0)
+                return
+            except BaseException:
+                self._exit(0)
+                raise
+            self._exit(1)
+            yield item
+
+    def report(self) -> Dict[str, object]:
+        """The stages in the order they were first run, and the totals."""
+        return {
+            "version": PROFILE_VERSION,
+            "memory": self._memory,
+            "total": self.total.as_dict(self._memory),
+            "stages": [
+                stats.as_dict(self._memory) for stats in self.stages.values()
+            ],
+        }
+
+    def dump(self, fp: IO[str]) -> None:
+        """Write the report to a file as JSON."""
+        json.dump(self.report(), fp, indent=2)
+
+    def lines(self) -> List[str]:
+        """Format the report as ``key=value`` log lines."""
+        return [
+            " ".join(
+                f"{key}={value}"
+                for key, value in stats.as_dict(self._memory).items()
+            )
+            for stats in list(self.stages.values()) + [self.total]
+        ]
+
+    def _enter(self, name: str) -> None:
+        self._sample()
+        if name not in self.stages:
+            self.stages[name] = StageStats(name)
+        self._stack.append(
+            [self.stages[name], perf_counter(), process_time(), 0.0, 0.0]
+        )
+
+    def _exit(self, count: int) -> None:
+        self._sample()
+        stats, wall, cpu, called_wall, called_cpu = self._stack.pop()
+        wall, cpu = perf_counter() - wall, process_time() - cpu
+        stats.wall += wall - called_wall
+        stats.cpu += cpu - called_cpu
+        stats.count += count
+        if self._stack:  # Excluded from the stage which called this one
+            self._stack[-1][3] += wall
+            self._stack[-1][4] += cpu
+
+    def _sample(self) -> None:
+        """Attribute the peak traced memory since the last sample to the
+        running stages.
+        """
+        tracemalloc = self._tracemalloc
+        if not self._memory or not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        if hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+            tracemalloc.reset_peak()
+        else:  # Only the memory in use at each sample can be attributed
+            peak = current
+        self.total.peak = max(self.total.peak, peak)
+        for frame in self._stack:
+            frame[0].peak = max(frame[0].peak, peak)
+
+
+def stage(profiler: Union[Profiler, None], name: str) -> ContextManager:
+    """Time a stage with ``profiler``, if it is given."""
+    return nullcontext() if profiler is None else profiler.stage(name)
+
+
+def timed(
+    profiler: Union[Profiler, None], name: str, fn: Callable[..., T]
+) -> Callable[..., T]:
+    """Time each call of ``fn`` with ``profiler``, if it is given."""
+    return fn if profiler is None else profiler.timed(name, fn)
+
+
+def iterate(
+    profiler: Union[Profiler, None], name: str, items: Iterable[T]
+) -> Iterable[T]:
+    """Time producing each of ``items`` with ``profiler``, if it is given."""
+    return items if profiler is None else profiler.iterate(name, items)
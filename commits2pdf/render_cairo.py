@@ -2,7 +2,7 @@ from datetime import datetime
 from os import path
 from textwrap import wrap
 from time import time
-from typing import Dict, List, Tuple
+from typing import BinaryIO, Dict, List, Tuple, Union
 
 from cairo import (
     FONT_SLANT_ITALIC,
@@ -10,12 +10,20 @@ from cairo import (
     FONT_WEIGHT_BOLD,
     FONT_WEIGHT_NORMAL,
     Context,
+    PDFMetadata,
     PDFSurface,
 )
 from tqdm import tqdm
 
-from .constants import HEIGHT, MARGIN, WIDTH, WRITING_PDF_INFO
+from .constants import (
+    HEIGHT,
+    MARGIN,
+    WIDTH,
+    WRAP_CACHE_SIZE,
+    WRITING_PDF_INFO,
+)
 from .logger import logger
+from .metrics import WrapCache
 
 
 class Cairo_PDF:
@@ -25,9 +33,14 @@ class Cairo_PDF:
         output: str,
         filename: str,
         appearance: Dict[str, Tuple[int]],
+        wrap_cache_size: int = WRAP_CACHE_SIZE,
+        fp: Union[BinaryIO, None] = None,
+        timestamp: Union[int, None] = None,
     ) -> None:
         """Assign attributes for use across the instance and instantiate the
-        core parts of a pycairo PDF.
+        core parts of a pycairo PDF, which is written to ``fp`` instead of
+        ``output`` if it is given. The PDF is generated at the Unix time
+        ``timestamp`` if it is given, for deterministic output.
         """
         self._commits, self._output, self._filename, self._ap = (
             commits,
@@ -35,12 +48,22 @@ class Cairo_PDF:
             filename,
             appearance,
         )
-        self.timestamp = datetime.fromtimestamp(int(time())).strftime(
-            "%d/%m/%Y %H:%M:%S"
+        generated = datetime.fromtimestamp(
+            int(time()) if timestamp is None else timestamp
         )
+        self.timestamp = generated.strftime("%d/%m/%Y %H:%M:%S")
         self.err_flag: bool = False
+        self.wrap_cache = WrapCache(wrap_cache_size)
 
-        self._s = PDFSurface(path.join(output, filename), WIDTH, HEIGHT)
+        self._s = PDFSurface(
+            fp if fp is not None else path.join(output, filename),
+            WIDTH,
+            HEIGHT,
+        )
+        if timestamp is not None:
+            self._s.set_metadata(
+                PDFMetadata.CREATE_DATE, generated.astimezone().isoformat()
+            )
         self._c = Context(self._s)
         self.page: int = 1
         self.y: int = MARGIN
@@ -52,15 +75,16 @@ class Cairo_PDF:
         self._draw_rname(commits.rname, self.y)
         self.y += 40
 
-        if len(self._commits.filtered_commits) > 0:
+        if self._commits.filtered_commits:
             self._draw_commits()
-            logger.info(
-                WRITING_PDF_INFO.format(
-                    path.normpath(self._output) + " ..."
-                    if self._output != "."
-                    else "your current directory..."
+            if fp is None:
+                logger.info(
+                    WRITING_PDF_INFO.format(
+                        path.normpath(self._output) + " ..."
+                        if self._output != "."
+                        else "your current directory..."
+                    )
                 )
-            )
             self._s.finish()
 
     def _draw_commits(self) -> None:
@@ -132,26 +156,37 @@ class Cairo_PDF:
         """Get the commit text for a commit and wrap it with a bunch of magic
         numbers.
         """
-        info: List[str] = wrap(
-            commit["info"], width=(WIDTH - MARGIN * 2) // 6.5
+        info: List[str] = self._wrap(
+            commit["info"], (WIDTH - MARGIN * 2) // 6.5, "Courier New", "n", 11
         )
-        title: List[str] = wrap(
-            commit["title"], width=(WIDTH - MARGIN * 2) // 8
+        title: List[str] = self._wrap(
+            commit["title"], (WIDTH - MARGIN * 2) // 8, "Arial", "b", 16
         )
-        diff_url: List[str] = wrap(
-            commit["diff_url"], width=(WIDTH - MARGIN * 2) // 5
+        diff_url: List[str] = self._wrap(
+            commit["diff_url"], (WIDTH - MARGIN * 2) // 5, "Arial", "n", 11
         )
 
         desc_lines: List[str] = commit["description"].split("\n")
         desc = []
         for line in desc_lines:
-            lines = wrap(line, width=(WIDTH - MARGIN * 2) // 5)
+            lines = self._wrap(
+                line, (WIDTH - MARGIN * 2) // 5, "Arial", "n", 11
+            )
             desc.extend(lines)
             if len(lines) > 1:
                 desc.append("")
 
         return info, title, desc, diff_url
 
+    def _wrap(
+        self, text: str, width: float, family: str, style: str, size: int
+    ) -> List[str]:
+        """Wrap text to a width in characters with the wrap cache."""
+        return self.wrap_cache.lookup(
+            (text, family, style, size, width),
+            lambda: wrap(text, width=width),
+        )
+
     def _draw_wrapped_text(
         self,
         lines: List[str],
@@ -1,47 +1,60 @@
 from datetime import datetime
+from itertools import islice
 from os import makedirs, path
 from pickle import dumps, loads
 from time import time
-from typing import Dict, List, Union
+from typing import BinaryIO, Callable, Dict, List, Tuple, Union
 
 from fpdf import FPDF
 from tqdm import tqdm
 
+from .append import AppendState
 from .constants import (
-    FPDF_DARK,
-    INFO_TEXT_FONT,
-    MARGIN_FONT,
     MARGIN_LR,
     MARGIN_TB,
-    MEDIUM_TEXT_FONT,
-    MEDIUM_TEXT_FONT_BOLD,
     RECURSION_ERROR,
-    SMALL_TEXT_FONT,
-    SUBTITLE_FONT,
-    TITLE_FONT,
-    TITLE_PAGE_INFO_FONT,
+    WRAP_CACHE_SIZE,
     WRITING_PDF_INFO,
 )
+from .fonts import Fonts
+from .layout import LayoutPlanner, PagePlan, Placement
 from .logger import logger
+from .metrics import (
+    ESTIMATE_BATCH_SIZE,
+    HeightEstimator,
+    WrapCache,
+    split_lines,
+)
+from .profiling import Profiler, stage, timed
+from .writer import StreamingFPDF
+
+DRAWN_FIELDS = ("info", "title", "description", "diff_url")
 
 
 def footer():
     pass
 
 
-def _beginpage_addon(func):
-    def wrapper(self, *args, **kwargs):
-        result = func(self, *args, **kwargs)
-        self.set_fill_color(*FPDF_DARK["background"])
-        self.rect(h=self.h, w=self.w, x=0, y=0, style="DF")
-        return result
+class ThemedFPDF(StreamingFPDF):
+    """A ``StreamingFPDF`` which fills each new page with ``background`` as
+    soon as it is started (including pages started by automatic page breaks),
+    if a background is given.
+    """
 
-    return wrapper
+    def __init__(self, background: Union[Tuple[int, ...], None]) -> None:
+        super().__init__()
+        self.background = background
+
+    def _beginpage(self, orientation: str) -> None:
+        super()._beginpage(orientation)
+        if self.background is not None:
+            self.set_fill_color(*self.background)
+            self.rect(h=self.h, w=self.w, x=0, y=0, style="DF")
 
 
 class FPDF_PDF:
-    """PDF generation class implementing 2 methods of generation (``gen2a`` and
-    ``gen2b``.
+    """PDF generation class implementing 3 methods of generation (``gen2a``,
+    ``gen2b`` and ``gen3``).
     """
 
     def __init__(
@@ -52,49 +65,93 @@ class FPDF_PDF:
         appearance: dict,
         mode: str,
         scaling: str,
+        wrap_cache_size: int = WRAP_CACHE_SIZE,
+        jobs: int = 1,
+        stream_write: bool = False,
+        fp: Union[BinaryIO, None] = None,
+        timestamp: Union[int, None] = None,
+        append: Union[AppendState, None] = None,
+        profiler: Union[Profiler, None] = None,
+        wrap_cache: Union[WrapCache, None] = None,
     ) -> None:
-        FPDF_PDF._set_scaling(scaling)
-
-        self.err_flag: bool = False
-        self.timestamp = datetime.fromtimestamp(int(time())).strftime(
-            "%d/%m/%Y %H:%M:%S"
+        self._jobs = jobs
+        # The file object to write the PDF to instead of ``output``, and the
+        # file the PDF is written to once it is opened
+        self._fp, self._file = fp, None
+        # The report to append the commits to (only with gen3), and the state
+        # of this report once it has been written
+        self._append = append
+        self.append_state: Union[AppendState, None] = None
+        self._profiler = profiler
+        self._commits, self._output, self._filename = commits, output, filename
+
+        # Generated at the given Unix time for deterministic output, or now
+        generated = datetime.fromtimestamp(
+            int(time()) if timestamp is None else timestamp
         )
-        self._commits, self._output, self._filename, self._ap, self._mode = (
-            commits,
-            output,
-            filename,
+        self._init_state(
             appearance,
             mode,
+            scaling,
+            generated.strftime("%d/%m/%Y %H:%M:%S"),
+            # A cache shared with other reports, or one for this report
+            WrapCache(wrap_cache_size) if wrap_cache is None else wrap_cache,
         )
-        self.commit_count = len(self._commits.filtered_commits)
-
-        if self._ap["TYPE"] == "DARK":  # Inject decorators to detect new page
-            FPDF._beginpage = _beginpage_addon(FPDF._beginpage)
-        self._p = FPDF()
-
+        if timestamp is not None:
+            self._p.creation_date = generated
+        if append is not None:
+            self._p.register_fonts(append.fonts)
         self._configure_fpdf()
+        self._p.add_page()
+        self._bg()
+        timed(self._profiler, "title", self._draw_title_page)()
+        self._p.font_family = ""  # Start the commits without a font selected
+
+        # The page left for the commit count is kept until the commits have
+        # been drawn, and any title pages before it are written
+        keep = (self._commit_count_at[0],)
+        if append is not None:  # Update the PDF, writing pages as they finish
+            self._open_file()
+            self._p.update(self._file, append.document, keep=keep)
+        elif stream_write:  # Write each page once the next page is started
+            self._open_file()
+            self._p.stream(self._file, keep=keep)
+
         self._prepare_and_draw()
-        logger.info(
-            WRITING_PDF_INFO.format(
-                path.normpath(self._output) + " ..."
-                if self._output != "."
-                else "your current directory..."
+        if self._fp is None:
+            logger.info(
+                WRITING_PDF_INFO.format(
+                    path.normpath(self._output) + " ..."
+                    if self._output != "."
+                    else "your current directory..."
+                )
+            )
+        with stage(self._profiler, "write"):
+            self._write()
+        if self.append_state is not None:
+            self.append_state = self.append_state._replace(
+                fonts=list(self._p.fonts), document=self._p.document
             )
-        )
-        self._write()
 
-    @staticmethod
-    def _set_scaling(scaling: float) -> None:
-        """Scale the fonts based on the user-selected scaling. Set to 1.0 by
-        default.
+    def _init_state(
+        self,
+        appearance: dict,
+        mode: str,
+        scaling: float,
+        timestamp: str,
+        wrap_cache: WrapCache,
+    ) -> None:
+        """Set up the state that drawing commits relies on, including the
+        ``ThemedFPDF`` instance they are drawn on. Shared with ``ChunkPDF``,
+        which draws commits without generating a report.
         """
-        TITLE_FONT[2] *= scaling
-        TITLE_PAGE_INFO_FONT[2] *= scaling
-        SUBTITLE_FONT[2] *= scaling
-        SMALL_TEXT_FONT[2] *= scaling
-        MEDIUM_TEXT_FONT[2] *= scaling
-        MEDIUM_TEXT_FONT_BOLD[2] *= scaling
-        INFO_TEXT_FONT[2] *= scaling
+        self.err_flag: bool = False
+        self._ap, self._mode = appearance, mode
+        self._fonts, self._scaling = Fonts.scaled(scaling), scaling
+        self.timestamp, self.wrap_cache = timestamp, wrap_cache
+        self._p = ThemedFPDF(
+            self._ap["background"] if self._ap["TYPE"] == "DARK" else None
+        )
 
     def _configure_fpdf(self):
         self._p.set_fill_color(*self._ap["background"])
@@ -108,23 +165,28 @@ class FPDF_PDF:
         self._p.set_margins(MARGIN_LR, MARGIN_TB)
 
     def _prepare_and_draw(self):
-        self._p.add_page()
-        self._bg()
-        self._draw_title_page()
         if self._mode == "unstable":
             self.do_pre_vis: bool = True
             self._p.set_auto_page_break(auto=False)
+        elif self._mode == "measured":
+            self.do_pre_vis: bool = False
+            self._p.set_auto_page_break(auto=False)
         else:
             self.do_pre_vis: bool = False
             self._p.set_auto_page_break(auto=True)
 
-        if self.commit_count > 0:
+        self.commit_count: int = 0
+        self.plan: PagePlan = PagePlan()  # Only used by gen3
+        if self._commits.filtered_commits:
             self._draw_commits()
+        # Commits may be streamed, so the commit count is only known once
+        # they have all been drawn
+        self._on_page(self._commit_count_at[0], self._draw_commit_count)
 
     def footer(self) -> None:
         """Draw the footer of a page."""
         self._p.set_y(-1 * (MARGIN_TB / 2))
-        self._set_font(*MARGIN_FONT)
+        self._set_font(*self._fonts.margin)
         self._p.set_text_color(*self._ap["text"])
         self._p.cell(1, 0, f"Page {self._p.page_no()}", 0, 0, "L")
         self._p.cell(
@@ -135,11 +197,48 @@ class FPDF_PDF:
         """Draw the page background as a rectangle."""
         self._p.rect(h=self._p.h, w=self._p.w, x=0, y=0, style="DF")
 
-    def _write(self) -> None:
-        """Save the file where the user has specified."""
+    def _open_file(self) -> None:
+        """Open the file where the user has specified (to add to it, if the
+        commits are appended to it), unless a file object to write to was
+        given.
+        """
+        if self._fp is not None:
+            self._file = self._fp
+            return
         if not path.exists(self._output):
             makedirs(self._output)
-        self._p.output(path.join(self._output, self._filename), "F")
+        self._file = open(
+            path.join(self._output, self._filename),
+            "wb" if self._append is None else "ab",
+        )
+
+    def _write(self) -> None:
+        """Save the file where the user has specified, or finish writing it if
+        pages have already been written.
+        """
+        if self._file is None:
+            self._open_file()
+            self._p.stream(self._file)
+        try:
+            self._p.close()
+        finally:
+            if self._fp is None:
+                self._file.close()
+
+    def _on_page(self, page: int, draw: Callable[[], None]) -> None:
+        """Temporarily return to a previous page to draw on it."""
+        current_page, auto, b_margin = (
+            self._p.page,
+            self._p.auto_page_break,
+            self._p.b_margin,
+        )
+        self._p.page = page
+        self._p.font_family = ""  # Ensure fonts are selected on this page
+        self._p.set_xy(MARGIN_LR, MARGIN_TB)
+        self._p.set_auto_page_break(auto=False)
+        draw()
+        self._p.page = current_page
+        self._p.set_auto_page_break(auto=auto, margin=b_margin)
 
     def _set_font(
         self, *args: List[float], obj: Union[str, object] = "main"
@@ -152,8 +251,9 @@ class FPDF_PDF:
         """Draw a commit that cannot fit on the existing page."""
         self.footer()
 
-        # Prevent adding a new page on the first commit
-        if self._p.page_no() == 2 and self.commit_counter == 0:
+        # Prevent adding a new page on the first commit, which is drawn on
+        # the page after the title page
+        if self.commit_counter == 0:
             self._p.set_y(MARGIN_TB)
         else:  # It is ok to add a new page, since the current one must have commits
             self._p.add_page()
@@ -164,48 +264,199 @@ class FPDF_PDF:
         self._p.set_auto_page_break(auto=False)
         self.commit_counter += 1
 
+    def _emit_commit(
+        self, commit: Dict[str, str], placement: Placement
+    ) -> None:
+        """Draw a commit where the layout plan has placed it."""
+        if placement.multipage:
+            self.footer()
+            if placement.page > self._p.page_no():
+                self._p.add_page()
+            else:  # The first commit is already on a new page
+                self._p.set_y(placement.y)
+            self._bg()
+            self._p.set_auto_page_break(auto=True, margin=MARGIN_TB)
+            self._commit(commit)
+            self._p.set_auto_page_break(auto=False)
+        else:
+            self._commit(commit)
+        self.commit_counter += 1
+
     def _draw_commits(self) -> None:
-        """Driver function to draw all the commits using either the
-        pre-visualisation method or the commit height estimation method.
+        """Driver function to draw all the commits using the
+        pre-visualisation method, a layout plan or the commit height
+        estimation method.
         """
-        self._p.add_page()  # Draw separate to the title page
-        self._bg()
+        if self._append is None:
+            self._p.add_page()  # Draw separate to the title page
+            self._bg()
+        else:  # Continue drawing where the last commit of the PDF was drawn
+            self._p.resume_page(
+                self._append.page,
+                self._append.content,
+                self._append.links,
+                self._append.drawing,
+            )
         self.commit_counter: int = 0
+        profiler = self._profiler
         # gen2b
         if self._mode == "unstable":
+            previsualise = timed(profiler, "previsualise", self._commit)
             for commit in tqdm(
                 self._commits.filtered_commits,
                 ncols=85,
                 desc="GENERATING",
             ):
-                result = self._commit(commit, pre_vis=True)
+                result = previsualise(commit, pre_vis=True)
                 self._p.footer = self.footer
-                if result == "NEW_PAGE_OK":  # Break page
-                    self._multipage_commit(commit)
-                elif (
-                    result == "NEW_PAGE_OK_BUT_NO_DIVIDER"
-                ):  # The divider just barely doesn't fit
-                    self._multipage_commit(commit, no_divider=True)
-                else:  # No need to break the page
-                    self._commit(commit)
-                    self.commit_counter += 1
+                with stage(profiler, "draw"):
+                    if result == "NEW_PAGE_OK":  # Break page
+                        self._multipage_commit(commit)
+                    elif (
+                        result == "NEW_PAGE_OK_BUT_NO_DIVIDER"
+                    ):  # The divider just barely doesn't fit
+                        self._multipage_commit(commit, no_divider=True)
+                    else:  # No need to break the page
+                        self._commit(commit)
+                        self.commit_counter += 1
                 self._p.footer = footer
             self.footer()
-
-        # gen2a
-        elif self._mode == "stable":
+            self.commit_count = self.commit_counter
+
+        # gen3
+        elif (
+            self._mode == "measured"
+            and self._jobs > 1
+            and self._append is None
+        ):
+            self._draw_commits_parallel()
+        elif self._mode == "measured":
+            if self._append is None:
+                planner = LayoutPlanner(
+                    self._p.page_no(),
+                    self._p.get_y(),
+                    self.wrap_cache,
+                    self._fonts,
+                )
+            else:
+                planner = LayoutPlanner(
+                    self._append.page,
+                    self._append.y,
+                    self.wrap_cache,
+                    self._fonts,
+                    self._append.placed,
+                )
+            place = timed(profiler, "layout", planner.place)
+            emit = timed(profiler, "draw", self._emit_commit)
             for commit in tqdm(
                 self._commits.filtered_commits,
                 ncols=85,
                 desc="GENERATING",
             ):
+                placement = place(commit)
+                self.plan.append(placement)
                 self._p.footer = self.footer
-                if self._commit_exceeds_size(commit):  # Break page
-                    self._multipage_commit(commit)
-                else:
-                    self._commit(commit)
-                    self.commit_counter += 1
+                emit(commit, placement)
+                self._p.footer = footer
+            self.commit_count = self.commit_counter
+            if self._append is not None:
+                self.commit_count += self._append.commit_count
+            self._save_append_state(planner)
+            self.footer()
+
+        # gen2a
+        elif self._mode == "stable":
+            estimator = HeightEstimator(self._p, self._fonts)
+            heights = timed(profiler, "estimate", estimator.heights)
+            commits = iter(
+                tqdm(
+                    self._commits.filtered_commits,
+                    ncols=85,
+                    desc="GENERATING",
+                )
+            )
+            # Streamed commits can only be used until the next one is
+            # produced, so the commits of each batch are copied
+            while True:
+                batch = [
+                    dict(commit)
+                    for commit in islice(commits, ESTIMATE_BATCH_SIZE)
+                ]
+                if not batch:
+                    break
+                for commit, height in zip(batch, heights(batch)):
+                    self._p.footer = self.footer
+                    with stage(profiler, "draw"):
+                        if self._commit_exceeds_size(height):  # Break page
+                            self._multipage_commit(commit)
+                        else:
+                            self._commit(commit)
+                            self.commit_counter += 1
             self.footer()
+            self.commit_count = self.commit_counter
+
+    def _save_append_state(self, planner: LayoutPlanner) -> None:
+        """Save where drawing the commits left off, before the footer of the
+        last page is drawn, so that commits can be appended to the PDF. Part
+        of the gen3 generation implementation.
+        """
+        self.append_state = AppendState(
+            hexsha="",  # Filled in by the caller
+            options={},
+            commit_count=self.commit_count,
+            page=self._p.page,
+            y=planner.y,
+            placed=planner.placed,
+            content=self._p.pages[self._p.page],
+            links=list(self._p.page_links.get(self._p.page, [])),
+            drawing=self._p.drawing_state(),
+            # Known once the PDF is written
+            fonts=[],
+            document=None,
+        )
+
+    def _draw_commits_parallel(self) -> None:
+        """Lay out all the commits, then draw them in chunks with worker
+        processes and merge the pages they draw into the PDF. Part of the gen3
+        generation implementation.
+        """
+        from .parallel import draw_chunks, register_fonts
+
+        # Only the drawn fields are copied, since the commits are sent to the
+        # workers (and streamed commits cannot be kept)
+        commits = [
+            {key: commit[key] for key in DRAWN_FIELDS}
+            for commit in self._commits.filtered_commits
+        ]
+        planner = LayoutPlanner(
+            self._p.page_no(), self._p.get_y(), self.wrap_cache, self._fonts
+        )
+        place_batch = timed(self._profiler, "layout", planner.place_batch)
+        for i in range(0, len(commits), ESTIMATE_BATCH_SIZE):
+            for placement in place_batch(commits[i : i + ESTIMATE_BATCH_SIZE]):
+                self.plan.append(placement)
+
+        # The current page is replaced by a worker's page
+        register_fonts(self._p, self._fonts, self.plan.placements[0].multipage)
+        # Drawing is timed in total, since the workers draw the commits
+        with stage(self._profiler, "draw"), tqdm(
+            total=len(commits), ncols=85, desc="GENERATING"
+        ) as bar:
+            for count, result in draw_chunks(
+                commits,
+                self.plan.placements,
+                self._jobs,
+                self._ap,
+                self.timestamp,
+                self._scaling,
+                self.wrap_cache.size,
+            ):
+                self._p.add_pages(result.pages, result.links)
+                self.wrap_cache.hits += result.hits
+                self.wrap_cache.misses += result.misses
+                bar.update(count)
+        self._p.page = self.plan.placements[-1].end_page
+        self.commit_count = len(commits)
 
     def _get_pdf_object(self, pre_vis):
         if not pre_vis or not self.do_pre_vis:
@@ -236,29 +487,27 @@ class FPDF_PDF:
         p = self._get_pdf_object(pre_vis)
 
         p.set_text_color(*self._ap["text"])
-        self._set_font(*INFO_TEXT_FONT, obj=p)
-        p.multi_cell(w=0, h=p.font_size * 1.25, align="C", txt=commit["info"])
+        self._set_font(*self._fonts.info, obj=p)
+        self._multi_cell(p, p.font_size * 1.25, "C", commit["info"])
         p.ln(p.font_size * 0.75)
         # Tells the driver code that it must add a page
         if self.do_pre_vis and pre_vis and p.get_y() > p.h * 0.95:
             return "NEW_PAGE_OK"
 
-        self._set_font(*MEDIUM_TEXT_FONT_BOLD, obj=p)
-        p.multi_cell(w=0, h=p.font_size * 1.25, align="L", txt=commit["title"])
+        self._set_font(*self._fonts.medium_bold, obj=p)
+        self._multi_cell(p, p.font_size * 1.25, "L", commit["title"])
         p.ln(-1 * p.font_size * 0.5)
         if self.do_pre_vis and pre_vis and p.get_y() > p.h * 0.95:
             return "NEW_PAGE_OK"
 
-        self._set_font(*SMALL_TEXT_FONT, obj=p)
-        p.multi_cell(
-            w=0, h=p.font_size * 1.5, align="L", txt=commit["description"]
-        )
+        self._set_font(*self._fonts.small, obj=p)
+        self._multi_cell(p, p.font_size * 1.5, "L", commit["description"])
         p.ln()
         if self.do_pre_vis and pre_vis and p.get_y() > p.h * 0.95:
             return "NEW_PAGE_OK"
 
         p.set_text_color(*self._ap["diff_url"])
-        self._set_font(*SMALL_TEXT_FONT, obj=p)
+        self._set_font(*self._fonts.small, obj=p)
         p.write(p.font_size * 1.5, "View diff on GitHub", commit["diff_url"])
         p.ln(p.font_size * 4.75)
         if self.do_pre_vis and pre_vis and p.get_y() > p.h * 0.95:
@@ -272,40 +521,28 @@ class FPDF_PDF:
             if self.do_pre_vis and pre_vis and p.get_y() > p.h * 0.97:
                 return "NEW_PAGE_OK_BUT_NO_DIVIDER"
 
-    def _commit_exceeds_size(self, commit: Dict[str, str]) -> bool:
-        """Estimate the height of the upcoming commit to see if a new page must
-        be added. It has a poor consistency that worsens with the increase/
-        decrease of scaling. It is used as part of the gen2a generation
-        implementation.
+    def _multi_cell(self, p: FPDF, h: float, align: str, txt: str) -> None:
+        """Draw text like ``FPDF.multi_cell`` with a width of 0, splitting it
+        into lines with the wrap cache.
         """
-        info_lines = (
-            len(commit["info"]) * (INFO_TEXT_FONT[2] // 2)
-        ) // self._p.w
-        title_lines = (
-            len(commit["title"]) * (MEDIUM_TEXT_FONT_BOLD[2] // 2)
-        ) // self._p.w
-        desc_lines = (
-            len(commit["description"]) * (SMALL_TEXT_FONT[2] // 2)
-        ) // self._p.w
-        diff_lines = (
-            len(commit["diff_url"]) * (SMALL_TEXT_FONT[2] // 2)
-        ) // self._p.w
-
-        height = (
-            (info_lines * INFO_TEXT_FONT[2])
-            + (title_lines * MEDIUM_TEXT_FONT_BOLD[2])
-            + (desc_lines * SMALL_TEXT_FONT[2])
-            + (diff_lines * SMALL_TEXT_FONT[2])
-        )
-
-        return height * 1.2 > self._p.h - self._p.get_y()
+        w: float = p.w - p.r_margin - p.x
+        for line in split_lines(p, txt, self.wrap_cache):
+            p.cell(w, h, line, 0, 2, align)
+        p.x = p.l_margin
+
+    def _commit_exceeds_size(self, height: float) -> bool:
+        """Check whether a commit of the estimated ``height`` would pass the
+        bottom margin, in which case a new page must be added. It is used as
+        part of the gen2a generation implementation.
+        """
+        return self._p.get_y() + height > self._p.h - MARGIN_TB
 
     def _draw_title_page(self) -> None:
         """Draw the title, repository name, and filtering information on the
-        first page of the PDF.
+        first page of the PDF, breaking the page if they do not fit on it.
         """
         # Title text ("Commit Report")
-        self._set_font(*TITLE_FONT)
+        self._set_font(*self._fonts.title)
         self._p.set_text_color(*self._ap["text"])
         self._p.cell(
             w=0, h=self._p.font_size * 1.5, txt="Commit Report", align="C"
@@ -313,7 +550,7 @@ class FPDF_PDF:
         self._p.ln()
 
         # Subtitle for "Repository"
-        self._set_font(*SUBTITLE_FONT)
+        self._set_font(*self._fonts.subtitle)
         self._p.multi_cell(
             w=0,
             h=self._p.font_size * 1.25,
@@ -323,7 +560,7 @@ class FPDF_PDF:
         self._p.ln(self._p.font_size)
 
         # Owner
-        self._set_font(*TITLE_PAGE_INFO_FONT)
+        self._set_font(*self._fonts.title_page_info)
         self._p.multi_cell(
             0,
             self._p.font_size * 1.5,
@@ -406,11 +643,27 @@ class FPDF_PDF:
         )
         self._p.ln()
 
-        # Commit count
+        # Leave space for the commit count, breaking the page if it does not
+        # fit, like ``multi_cell`` would
+        if self._p.get_y() + self._p.font_size * 1.5 > (
+            self._p.page_break_trigger
+        ):
+            self._p.add_page()
+        self._commit_count_at: Tuple[int, float] = (
+            self._p.page,
+            self._p.get_y(),
+        )
+
+    def _draw_commit_count(self) -> None:
+        """Draw the commit count on the title page, where
+        ``_draw_title_page`` left space for it.
+        """
+        self._p.set_y(self._commit_count_at[1])
+        self._set_font(*self._fonts.title_page_info)
+        self._p.set_text_color(*self._ap["text"])
         self._p.multi_cell(
             0,
             self._p.font_size * 1.5,
             align="C",
             txt=f"Commit count: {self.commit_count}",
         )
-        self._p.ln()
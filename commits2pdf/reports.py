@@ -0,0 +1,147 @@
+"""A content-addressed cache of generated reports for ``--report-cache``. A
+report is keyed by the commit at the tip of its branch and every argument that
+affects its PDF, so an unchanged repository reports the same key and the PDF
+can be copied from the cache instead of being generated. The least recently
+used reports are evicted once the cache exceeds its size limit.
+"""
+
+import json
+from hashlib import sha256
+from os import getpid, makedirs, path, remove, replace, scandir, utime
+from shutil import copyfile
+from time import strftime
+from typing import Dict, List, Tuple, Union
+
+from fpdf import FPDF_VERSION
+from git import Git, GitCommandError, Repo
+from git.exc import InvalidGitRepositoryError, NoSuchPathError
+
+from . import __version__
+from .commits import repo_name, url_name
+
+REPORT_CACHE_VERSION = 1  # Increased whenever the PDFs change
+
+
+def resolve_report(
+    rpath: str, url: Union[str, None], branch: str
+) -> Union[Tuple[str, str], None]:
+    """Find the hexsha of the tip of ``branch`` (or of the active or default
+    branch if it does not exist, like ``Commits`` does) without walking any
+    commits, and the name of the repository. Remote repositories are queried
+    with ``git ls-remote``. Return ``None`` if the tip cannot be found.
+    """
+    try:
+        if url:
+            refs: Dict[str, str] = {
+                ref: hexsha
+                for hexsha, ref in (
+                    line.split("\t")
+                    for line in Git()
+                    .ls_remote(url, "HEAD", f"refs/heads/{branch}")
+                    .splitlines()
+                )
+            }
+            tip = refs.get(f"refs/heads/{branch}") or refs.get("HEAD")
+            return (tip, url_name(url)) if tip else None
+        with Repo(rpath) as r:
+            if branch in r.heads:
+                return r.heads[branch].commit.hexsha, repo_name(r)
+            return r.head.commit.hexsha, repo_name(r)
+    except (
+        GitCommandError,
+        InvalidGitRepositoryError,
+        NoSuchPathError,
+        ValueError,
+    ):
+        return None
+
+
+def report_key(tip: str, options: Dict[str, object]) -> str:
+    """Hash the tip of a report's branch and the options that affect its PDF,
+    which are normalised by serialising them with sorted keys, along with the
+    UTC offset its dates are shown in and the versions which drew it.
+    """
+    return sha256(
+        json.dumps(
+            {
+                "version": REPORT_CACHE_VERSION,
+                "commits2pdf": __version__,
+                "fpdf": FPDF_VERSION,
+                "utc_offset": strftime("%z"),
+                "tip": tip,
+                **options,
+            },
+            sort_keys=True,
+            default=str,
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+class ReportCache:
+    """A directory of generated PDFs, keyed by ``report_key``."""
+
+    def __init__(self, cache_dir: str, max_bytes: int) -> None:
+        self._dir, self._max_bytes = cache_dir, max_bytes
+        makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key: str) -> Union[str, None]:
+        """Find the path of the cached PDF for ``key``, marking it as recently
+        used, or return ``None`` if it is not cached.
+        """
+        entry = path.join(self._dir, f"{key}.pdf")
+        try:
+            utime(entry)
+        except FileNotFoundError:
+            return None
+        return entry
+
+    def put(self, key: str, pdf: Union[str, bytes]) -> List[str]:
+        """Cache a PDF, given as a path or as bytes, and evict the least
+        recently used PDFs if the cache is too large. Return the evicted
+        paths.
+        """
+        entry = path.join(self._dir, f"{key}.pdf")
+        tmp = f"{entry}.{getpid()}.tmp"  # Never read from an incomplete PDF
+        if isinstance(pdf, bytes):
+            with open(tmp, "wb") as f:
+                f.write(pdf)
+        else:
+            copyfile(pdf, tmp)
+        replace(tmp, entry)
+        return self.evict(keep=entry)
+
+    def evict(self, keep: str) -> List[str]:
+        """Remove the least recently used PDFs until the cache is no larger
+        than its size limit. Return the removed paths.
+        """
+        entries = sorted(
+            (
+                (entry.stat().st_mtime, entry.path, entry.stat().st_size)
+                for entry in scandir(self._dir)
+                if entry.name.endswith(".pdf")
+            ),
+            reverse=True,
+        )
+        total = sum(size for _, _, size in entries)
+        evicted = []
+        while entries and total > self._max_bytes:
+            _, entry, size = entries.pop()  # Least recently used
+            if entry == keep:
+                continue
+            try:
+                remove(entry)
+            except FileNotFoundError:  # Evicted by another run
+                pass
+            total -= size
+            evicted.append(entry)
+        return evicted
+
+
+def copy_report(entry: str, dest: str) -> None:
+    """Copy a cached PDF to ``dest``. It is copied rather than hard-linked,
+    since the PDF at ``dest`` is overwritten in place when it is generated
+    again.
+    """
+    tmp = f"{dest}.{getpid()}.tmp"
+    copyfile(entry, tmp)
+    replace(tmp, dest)
@@ -0,0 +1,362 @@
+"""``c2p-serve``: a report server, so that generating many reports does not
+pay for starting ``c2p``, opening the repository, reading its commits and
+looking up font metrics each time. Reports are requested with the same
+arguments as ``c2p`` over a local HTTP port or a Unix socket, and generated on
+a bounded pool of worker processes, which keep the repositories they used
+most recently open between reports (see ``workers.py``).
+
+``POST /reports`` with a JSON object such as
+``{"args": ["owner", "-gen3"], "return": "bytes"}`` returns the PDF, or with
+``"return": "path"`` returns its path and the logs of the report as JSON.
+``GET /metrics`` returns the queue depth, the number of reports and their
+latencies as JSON, and ``GET /health`` returns ``ok``.
+
+Requests which were not sent to the address of the server, or which were sent
+by a web page (with an ``Origin`` header), are forbidden, so that web pages
+cannot request reports. Reports can only set the options in
+``SERVE_OPTIONS``, and their output directories and repos are confined to the
+roots given to the server (see ``workers.py``). The sizes of their caches are
+set by the server.
+"""
+
+import json
+import socketserver
+from argparse import Namespace
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import ERROR
+from multiprocessing import get_context
+from os import cpu_count, path, remove, stat
+from signal import SIG_DFL, SIGTERM, signal
+from stat import S_ISSOCK
+from threading import Lock
+from time import time
+from typing import Deque, Dict, FrozenSet, List, Tuple, Union
+
+from .args import serve_parser
+from .constants import (
+    FORBIDDEN_REQUEST_ERROR,
+    INVALID_ARG_WARNING,
+    INVALID_JOB_ERROR,
+    LATENCY_SAMPLES,
+    NO_UNIX_SOCKETS_ERROR,
+    NOT_A_DIRECTORY_ERROR,
+    NOT_JSON_ERROR,
+    QUEUE_FULL_ERROR,
+    REPORT_FAILED_ERROR,
+    REPORT_JOB_INFO,
+    SERVE_LOOPBACK,
+    SERVE_STOPPED_INFO,
+    SERVING_INFO,
+)
+from .logger import logger
+from .workers import CacheSizes, JobResult, Roots, init_worker, run_job
+
+
+class Metrics:
+    """Counts the reports and keeps the latencies of the most recent
+    ``LATENCY_SAMPLES`` of them. Reports are admitted while fewer than
+    ``workers`` are being generated and ``max_queue`` are waiting.
+    """
+
+    def __init__(self, workers: int, max_queue: int) -> None:
+        self._lock = Lock()
+        self._workers, self._max_queue = workers, max_queue
+        self._in_flight = self._completed = self._failed = self._rejected = 0
+        self._started = time()
+        # The total, waiting and running seconds of each report
+        self._latencies: Deque[Tuple[float, float, float]] = deque(
+            maxlen=LATENCY_SAMPLES
+        )
+
+    def admit(self) -> bool:
+        with self._lock:
+            if self._in_flight >= self._workers + self._max_queue:
+                self._rejected += 1
+                return False
+            self._in_flight += 1
+            return True
+
+    def finish(self, ok: bool, total: float, wait: float, run: float) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if ok:
+                self._completed += 1
+            else:
+                self._failed += 1
+            self._latencies.append((total, wait, run))
+
+    def report(self) -> Dict[str, object]:
+        with self._lock:
+            in_flight, latencies = self._in_flight, list(self._latencies)
+            counts = (self._completed, self._failed, self._rejected)
+        return {
+            "queue_depth": max(0, in_flight - self._workers),
+            "in_flight": in_flight,
+            "workers": self._workers,
+            "max_queue": self._max_queue,
+            "completed": counts[0],
+            "failed": counts[1],
+            "rejected": counts[2],
+            "uptime_s": round(time() - self._started, 3),
+            "latency_s": {
+                name: summarise([sample[i] for sample in latencies])
+                for i, name in enumerate(("total", "wait", "run"))
+            },
+        }
+
+
+def summarise(samples: List[float]) -> Dict[str, float]:
+    """The mean, percentiles (by nearest rank) and maximum of ``samples``."""
+    if not samples:
+        return {"count": 0}
+    samples = sorted(samples)
+    summary = {"count": len(samples), "mean": sum(samples) / len(samples)}
+    for percentile in (50, 95, 99):
+        rank = max(0, -(-len(samples) * percentile // 100) - 1)
+        summary[f"p{percentile}"] = samples[rank]
+    summary["max"] = samples[-1]
+    return {
+        key: round(value, 6) if isinstance(value, float) else value
+        for key, value in summary.items()
+    }
+
+
+class Reports:
+    """Generates reports on a pool of worker processes, which are spawned
+    rather than forked, so that they behave the same on every platform.
+    """
+
+    def __init__(self, args: Namespace, roots: Roots) -> None:
+        self.workers: int = args.workers or cpu_count() or 1
+        self.metrics = Metrics(self.workers, args.max_queue)
+        sizes = CacheSizes(
+            args.cache_size, args.clone_cache_size, args.report_cache_size
+        )
+        self._initargs = (args.warm_repos, args.wrap_cache_size, roots, sizes)
+        self._lock = Lock()
+        self._pool = self._new_pool()
+
+    def run(self, argv: List[str], to_path: bool) -> JobResult:
+        submitted = time()
+        with self._lock:
+            pool = self._pool
+        try:
+            result: JobResult = pool.submit(run_job, argv, to_path).result()
+        except BrokenProcessPool:  # A worker died, such as from lack of memory
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = self._new_pool()
+            result = JobResult(500, None, [], submitted, 0.0)
+        finally:
+            total = time() - submitted
+        wait = max(0.0, result.started - submitted)
+        self.metrics.finish(result.status == 200, total, wait, result.seconds)
+        logger.info(
+            REPORT_JOB_INFO.format(" ".join(argv), total, wait, result.status)
+        )
+        return result
+
+    def close(self) -> None:
+        self._pool.shutdown()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=get_context("spawn"),
+            initializer=init_worker,
+            initargs=self._initargs,
+        )
+
+
+class ReportHandler(BaseHTTPRequestHandler):
+    """Handles the requests of ``c2p-serve`` (see the module docstring)."""
+
+    server_version = "commits2pdf"
+
+    def do_GET(self) -> None:
+        if not self._is_allowed():
+            return
+        if self.path == "/metrics":
+            self._send_json(200, self.server.reports.metrics.report())
+        elif self.path == "/health":
+            self._send(200, b"ok\n", "text/plain")
+        else:
+            self._send_json(404, {"error": f"{self.path} does not exist."})
+
+    def do_POST(self) -> None:
+        if not self._is_allowed():
+            return
+        if self.path != "/reports":
+            return self._send_json(
+                404, {"error": f"{self.path} does not exist."}
+            )
+        if self.headers.get_content_type() != "application/json":
+            return self._send_json(415, {"error": NOT_JSON_ERROR})
+        job = self._read_job()
+        if job is None:
+            return self._send_json(400, {"error": INVALID_JOB_ERROR})
+        reports: Reports = self.server.reports
+        if not reports.metrics.admit():
+            return self._send_json(
+                503, {"error": QUEUE_FULL_ERROR}, {"Retry-After": "1"}
+            )
+        result = reports.run(*job)
+        if result.status != 200:
+            self._send_json(
+                result.status,
+                {"error": REPORT_FAILED_ERROR, "logs": result.logs},
+            )
+        elif job[1]:
+            self._send_json(200, {"path": result.pdf, "logs": result.logs})
+        else:
+            self._send(200, result.pdf, "application/pdf")
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(format % args)  # Reports are logged once generated
+
+    def _is_allowed(self) -> bool:
+        """Check that the request was sent to the address of the server, and
+        not by a web page, which could otherwise send it by rebinding a
+        domain name to this address. Forbid the request if not.
+        """
+        hosts: Union[FrozenSet[str], None] = self.server.hosts
+        host = self.headers.get("Host", "").lower()
+        if "Origin" not in self.headers and (hosts is None or host in hosts):
+            return True
+        self._send_json(403, {"error": FORBIDDEN_REQUEST_ERROR})
+        return False
+
+    def _read_job(self) -> Union[Tuple[List[str], bool], None]:
+        """The arguments of the requested report, and whether to return its
+        path, or ``None`` if the request is invalid.
+        """
+        try:
+            job = json.loads(
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            )
+        except ValueError:
+            return None
+        if not isinstance(job, dict):
+            return None
+        argv, returns = job.get("args"), job.get("return", "bytes")
+        if not isinstance(argv, list) or not all(
+            isinstance(arg, str) for arg in argv
+        ):
+            return None
+        if returns not in ("bytes", "path"):
+            return None
+        return argv, returns == "path"
+
+    def _send_json(
+        self,
+        status: int,
+        body: Dict[str, object],
+        headers: Union[Dict[str, str], None] = None,
+    ) -> None:
+        self._send(
+            status,
+            json.dumps(body, indent=2).encode() + b"\n",
+            "application/json",
+            headers,
+        )
+
+    def _send(
+        self,
+        status: int,
+        body: bytes,
+        content_type: str,
+        headers: Union[Dict[str, str], None] = None,
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _unix_server(address: str) -> socketserver.BaseServer:
+    """An HTTP server listening on the Unix socket at ``address``."""
+
+    class UnixHTTPServer(
+        socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+    ):
+        daemon_threads = True
+
+        def get_request(self) -> Tuple[object, Tuple[str, int]]:
+            request, _ = super().get_request()
+            return request, ("local", 0)  # Clients of Unix sockets are unnamed
+
+    if path.exists(address) and S_ISSOCK(stat(address).st_mode):
+        remove(address)  # Left behind by a server which was killed
+    return UnixHTTPServer(address, ReportHandler)
+
+
+def _hosts(host: str, port: int) -> FrozenSet[str]:
+    """The values of the Host header of requests sent to ``host`` on
+    ``port``, which may use any name of the loopback address if ``host`` is
+    one of them.
+    """
+    names = SERVE_LOOPBACK if host.lower() in SERVE_LOOPBACK else {host}
+    hosts = set()
+    for name in names:
+        name = f"[{name}]" if ":" in name else name.lower()
+        hosts.add(f"{name}:{port}")
+        if port == 80:  # The default port can be left out
+            hosts.add(name)
+    return frozenset(hosts)
+
+
+def _interrupt(signum: int, frame: object) -> None:
+    """Stop serving, or stop at once if the signal is sent again."""
+    signal(signum, SIG_DFL)
+    raise KeyboardInterrupt
+
+
+def main(argv: Union[List[str], None] = None) -> None:
+    """Serve reports until interrupted, given the arguments of ``c2p-serve``
+    (or those of the command line).
+    """
+    args: Namespace = serve_parser.parse_args(argv)
+    if args.quiet:  # Suppress all logs except for errors
+        logger.setLevel(ERROR)
+    if args.workers < 0 or args.max_queue < 0 or args.warm_repos < 1:
+        logger.error(INVALID_ARG_WARNING.format("number"))
+        exit(1)
+    if args.socket and not hasattr(socketserver, "UnixStreamServer"):
+        logger.error(NO_UNIX_SOCKETS_ERROR)
+        exit(1)
+    roots = Roots(
+        path.realpath(args.output_root), path.realpath(args.repo_root)
+    )
+    for root in roots:
+        if not path.isdir(root):
+            logger.error(NOT_A_DIRECTORY_ERROR.format(root))
+            exit(1)
+
+    if args.socket:
+        server = _unix_server(args.socket)
+        # Only local processes can connect, which are not web pages
+        server.hosts = None
+        address = args.socket
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), ReportHandler)
+        server.hosts = _hosts(args.host, server.server_port)
+        address = f"http://{args.host}:{server.server_port}"
+    server.reports = reports = Reports(args, roots)
+    signal(SIGTERM, _interrupt)
+    logger.info(SERVING_INFO.format(address, reports.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        reports.close()
+        if args.socket and path.exists(args.socket):
+            remove(args.socket)
+        logger.info(SERVE_STOPPED_INFO)
@@ -0,0 +1,290 @@
+"""The worker processes of ``c2p-serve`` and ``c2p-batch``. A worker
+generates reports with the same arguments as ``c2p``, keeping its most
+recently used repos and their commit caches open, and a wrap cache and the
+font metrics loaded, between the reports it generates. The messages logged
+while generating a report are returned with it rather than printed.
+"""
+
+import sys
+from argparse import Namespace
+from collections import OrderedDict
+from contextlib import redirect_stderr, redirect_stdout
+from importlib import import_module
+from io import BytesIO, StringIO
+from logging import CRITICAL, ERROR, INFO, Handler, LogRecord
+from os import devnull, path
+from time import perf_counter, time
+from traceback import format_exc
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    NamedTuple,
+    Tuple,
+    Union,
+)
+
+from .args import parser
+from .cli import _main, _report_profile
+from .constants import (
+    DISALLOWED_OPTION_ERROR,
+    OUTSIDE_ROOT_ERROR,
+    PATH_TO_STDOUT_ERROR,
+    SERVE_OPTIONS,
+    STDOUT,
+)
+from .logger import console, formatter, logger
+from .profiling import Profiler
+
+
+class JobResult(NamedTuple):
+    """The outcome of generating a report in a worker: an HTTP status, the
+    PDF (its bytes or path, or ``None`` if it was not generated), the log
+    messages of the report, and when it started (in Unix time) and how many
+    seconds it took.
+    """
+
+    status: int
+    pdf: Union[bytes, str, None]
+    logs: List[str]
+    started: float
+    seconds: float
+
+
+class Roots(NamedTuple):
+    """The directories which the output directories and repos of the reports
+    of ``c2p-serve`` are relative to, and confined to.
+    """
+
+    output: str
+    repos: str
+
+
+class CacheSizes(NamedTuple):
+    """The sizes of the caches of the reports of ``c2p-serve``, which are set
+    by the server rather than by each report (see ``args.py``).
+    """
+
+    cache_size: int
+    clone_cache_size: int
+    report_cache_size: int
+
+
+class Handles(OrderedDict):
+    """The ``size`` most recently used open handles (repos or commit caches),
+    which are closed once they are evicted. ``on_evict`` is called with the
+    key of each evicted handle.
+    """
+
+    def __init__(
+        self, size: int, on_evict: Callable[[Hashable], None] = None
+    ) -> None:
+        super().__init__()
+        self._size, self._on_evict = size, on_evict
+
+    def get(self, key: Hashable, default: object = None) -> object:
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def __setitem__(self, key: Hashable, value: object) -> None:
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self._size:
+            evicted, handle = self.popitem(last=False)
+            handle.close()
+            if self._on_evict is not None:
+                self._on_evict(evicted)
+
+    def close(self) -> None:
+        while self:
+            self.popitem(last=False)[1].close()
+
+
+class Warm:
+    """What a worker keeps between the reports it generates."""
+
+    def __init__(self, warm_repos: int, wrap_cache_size: int) -> None:
+        from .metrics import WrapCache
+
+        # Commit caches are keyed by the path of their repo first
+        self.commit_caches = Handles(warm_repos)
+        self.repos = Handles(warm_repos, self._forget_caches)
+        self.wrap_cache = WrapCache(wrap_cache_size)
+        # The branch each clone and branch was fetched as (by ``run_group``)
+        self.fetched: Dict[Tuple[str, str], str] = {}
+
+    def close(self) -> None:
+        self.commit_caches.close()
+        self.repos.close()
+
+    def _forget_caches(self, rpath: str) -> None:
+        for key in [key for key in self.commit_caches if key[0] == rpath]:
+            self.commit_caches.pop(key).close()
+
+
+class ListHandler(Handler):
+    """Collects the messages logged while generating a report."""
+
+    def __init__(self, records: List[str]) -> None:
+        super().__init__()
+        self._records = records
+        self.setFormatter(formatter)
+
+    def emit(self, record: LogRecord) -> None:
+        self._records.append(self.format(record))
+
+
+_warm: Union[Warm, None] = None  # The state of this process, if a worker
+_roots: Union[Roots, None] = None  # What its reports are confined to, if any
+_sizes: Union[CacheSizes, None] = None  # The cache sizes of its reports
+
+
+def init_worker(
+    warm_repos: int,
+    wrap_cache_size: int,
+    roots: Union[Roots, None] = None,
+    sizes: Union[CacheSizes, None] = None,
+) -> None:
+    """Prepare a worker process, importing GitPython and fpdf up front. The
+    reports it generates are confined to ``roots`` if given, and use caches
+    of ``sizes`` if given.
+    """
+    global _warm, _roots, _sizes
+    # Imported for their side effect, so that the first report does not wait
+    import_module("commits2pdf.commits")
+    import_module("commits2pdf.render_fpdf")
+
+    _warm, _roots, _sizes = Warm(warm_repos, wrap_cache_size), roots, sizes
+    console.setLevel(CRITICAL)  # The logs are returned with each report
+
+
+def run_job(
+    argv: List[str], to_path: bool, fetch_once: bool = False
+) -> JobResult:
+    """Generate the report ``c2p`` would generate given ``argv``, returning
+    its path if ``to_path`` is set, or otherwise its bytes. Cached clones are
+    only fetched once by this worker if ``fetch_once`` is set.
+    """
+    started, clock = time(), perf_counter()
+    logs: List[str] = []
+    handler = ListHandler(logs)
+    logger.addHandler(handler)
+    logger.setLevel(INFO)
+    try:
+        status, pdf = _generate(argv, to_path, fetch_once)
+    except Exception:
+        _warm.close()  # The open handles may have been left in any state
+        logs.append(format_exc())
+        status, pdf = 500, None
+    finally:
+        logger.removeHandler(handler)
+    return JobResult(status, pdf, logs, started, perf_counter() - clock)
+
+
+def run_group(jobs: List[List[str]]) -> List[JobResult]:
+    """Generate the reports of a batch which share a repo one after another,
+    so that the repo is only opened (or cloned and fetched) once.
+    """
+    return [run_job(argv, True, fetch_once=True) for argv in jobs]
+
+
+def _generate(
+    argv: List[str], to_path: bool, fetch_once: bool
+) -> Tuple[int, Union[bytes, str, None]]:
+    output = StringIO()
+    try:
+        with redirect_stdout(output), redirect_stderr(output):
+            args: Namespace = parser.parse_args(argv)
+    except SystemExit:  # The usage (or help) was printed instead
+        logger.error(output.getvalue().strip())
+        return 400, None
+    if args.quiet:
+        logger.setLevel(ERROR)
+    if not to_path:
+        args.output = STDOUT
+    elif args.output == STDOUT:
+        logger.error(PATH_TO_STDOUT_ERROR)
+        return 400, None
+    if _roots is not None:
+        error = _confine(args, _roots)
+        if error is not None:
+            logger.error(error)
+            return 403, None
+    if _sizes is not None:
+        vars(args).update(_sizes._asdict())
+    args.prevent_open = True
+    if sys.version_info < (3, 9):  # Workers cannot start processes
+        args.jobs = 1
+
+    profiler: Union[Profiler, None] = None
+    if args.profile or args.profile_output:
+        profiler = Profiler(memory=args.profile_memory)
+        profiler.start()
+    pipe = None if to_path else BytesIO()
+    try:
+        # Progress bars are written to stderr
+        with open(devnull, "w") as null, redirect_stderr(null):
+            pdf = _main(
+                args,
+                profiler,
+                pipe,
+                commits_options={
+                    "repos": _warm.repos,
+                    "commit_caches": _warm.commit_caches,
+                    "fetched": _warm.fetched if fetch_once else None,
+                },
+                render_options={"wrap_cache": _warm.wrap_cache},
+            )
+    except SystemExit:  # The arguments were invalid, which was logged
+        return 400, None
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            _report_profile(args, profiler)
+    if pipe is not None:
+        pdf = pipe.getvalue() or None
+    # Otherwise the reason was logged, such as a missing repo or branch
+    return (200, pdf) if pdf else (422, None)
+
+
+def _confine(args: Namespace, roots: Roots) -> Union[str, None]:
+    """Resolve the output directory and repo of ``args`` against ``roots``,
+    or return why ``args`` are not allowed: they set an option which is not
+    in ``SERVE_OPTIONS``, or select a directory outside of ``roots``. Only
+    the output directory needs to be confined, as names cannot contain path
+    separators.
+    """
+    for action in parser._actions:
+        if action.dest in SERVE_OPTIONS or not action.option_strings:
+            continue
+        if getattr(args, action.dest, action.default) != action.default:
+            return DISALLOWED_OPTION_ERROR.format(
+                "/".join(action.option_strings)
+            )
+    if args.output != STDOUT:
+        output = _within(roots.output, args.output)
+        if output is None:
+            return OUTSIDE_ROOT_ERROR.format(args.output, roots.output)
+        args.output = path.relpath(output)  # Output paths must be relative
+    if not args.rname:
+        rpath = _within(roots.repos, args.rpath)
+        if rpath is None:
+            return OUTSIDE_ROOT_ERROR.format(args.rpath, roots.repos)
+        args.rpath = rpath
+    return None
+
+
+def _within(root: str, value: str) -> Union[str, None]:
+    """The real path of ``value`` relative to ``root``, or ``None`` if it is
+    outside of ``root``.
+    """
+    resolved = path.realpath(path.join(root, value))
+    try:
+        if path.commonpath([root, resolved]) == root:
+            return resolved
+    except ValueError:  # On another drive
+        pass
+    return None
@@ -0,0 +1,371 @@
+"""A subclass of ``FPDF`` which writes the PDF to a file object instead of
+building it in memory. ``FPDF`` keeps every page until the document is closed
+and then adds the whole document line by line to a string, copying the string
+each time, so writing takes time quadratic in the size of the PDF. It can also
+add pages to a PDF it has written before with an incremental update, which
+appends the new and changed objects to the end of the PDF.
+"""
+
+import zlib
+from datetime import datetime
+from typing import (
+    BinaryIO,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Set,
+    Tuple,
+    Union,
+)
+
+from fpdf import FPDF, FPDF_VERSION
+
+# The attributes of ``FPDF`` which hold the state drawing continues from
+DRAWING_STATE = (
+    "font_family",
+    "font_style",
+    "font_size_pt",
+    "underline",
+    "line_width",
+    "draw_color",
+    "fill_color",
+    "text_color",
+    "color_flag",
+    "x",
+    "y",
+)
+
+
+class DocumentState(NamedTuple):
+    """Where the objects of a PDF written by ``StreamingFPDF`` are, so that
+    pages can be added to it with an incremental update.
+    """
+
+    xref: int  # The offset of the last cross-reference section
+    size: int  # The number of objects
+    pages: List[Tuple[int, int]]  # The page and content object of each page
+    info: int
+    root: int
+    length: int  # The size of the PDF in bytes
+
+
+class StreamingFPDF(FPDF):
+    """An ``FPDF`` which writes the document to ``fp`` once ``stream`` has
+    been called. Pages are written as soon as they are finished (when the next
+    page is started), except for the pages to ``keep``, which can still be
+    drawn on until the document is closed. Written pages are no longer kept in
+    memory, so memory use does not grow with the number of pages.
+
+    Pages are numbered as they are by ``FPDF`` (page n is object 1 + 2n and
+    its content is object 2 + 2n), so they can be written in any order. If
+    every page is finished before ``stream`` is called, the PDF is identical
+    to the one written by ``FPDF.output``. Once the PDF is closed, where its
+    objects are is given by ``document``.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._fp: Union[BinaryIO, None] = None
+        self._keep: Set[int] = set()
+        self._pos = 0  # The number of bytes written
+        # The date the PDF is created at, or ``None`` for when it is written
+        self.creation_date: Union[datetime, None] = None
+        self.document: Union[DocumentState, None] = None
+        # The PDF being updated, and the objects of its pages
+        self._update: Union[DocumentState, None] = None
+        self._page_objs: List[Tuple[int, int]] = []
+
+    def __getstate__(self) -> dict:
+        # Copies (such as those made by gen2b) must not write to the file
+        state = self.__dict__.copy()
+        state["_fp"] = None
+        return state
+
+    def stream(self, fp: BinaryIO, keep: Iterable[int] = ()) -> None:
+        """Write the PDF to ``fp``, starting with every finished page."""
+        self._fp, self._keep = fp, set(keep)
+        self.flush()
+
+    def update(
+        self, fp: BinaryIO, document: DocumentState, keep: Iterable[int] = ()
+    ) -> None:
+        """Write an incremental update of the PDF described by ``document`` to
+        ``fp``, which must be positioned at its end. Pages which the PDF
+        already has replace its pages, and the rest are added to it.
+        """
+        self._update, self._pos = document, document.length
+        self._page_objs = [tuple(objs) for objs in document.pages]
+        self._size = document.size
+        self.offsets = {}  # Only the objects of the update
+        self.stream(fp, keep)
+
+    def drawing_state(self) -> Dict[str, object]:
+        """Save the state which drawing on the current page continues from."""
+        return {attr: getattr(self, attr) for attr in DRAWING_STATE}
+
+    def register_fonts(self, keys: Iterable[str]) -> None:
+        """Register fonts by their keys (such as ``helveticaB``) in the given
+        order without selecting them, so that they have the same indices as in
+        the PDF being updated. Must be called before any page is added.
+        """
+        for key in keys:
+            family = key.rstrip("BI")  # Font keys end with their style
+            self.set_font(family, key[len(family) :])
+        self.font_family = ""
+
+    def resume_page(
+        self,
+        n: int,
+        content: str,
+        links: List[Tuple],
+        state: Dict[str, object],
+    ) -> None:
+        """Continue drawing on page ``n`` from its ``content`` and ``links``,
+        and the drawing state saved by ``drawing_state``.
+        """
+        self.page = n
+        self.pages[n] = content
+        self.page_links[n] = [tuple(link) for link in links]
+        for attr, value in state.items():
+            setattr(self, attr, value)
+        if self.font_family:
+            self.current_font = self.fonts[self.font_family + self.font_style]
+            self.font_size = self.font_size_pt / self.k
+
+    def flush(self) -> None:
+        """Write the finished pages, which are all the pages other than the
+        current one and the pages to keep.
+        """
+        if self._fp is None:
+            return
+        for n in sorted(self.pages):
+            if n != self.page and n not in self._keep:
+                self._putpage(n)
+
+    def add_pages(
+        self, pages: Dict[int, str], links: Dict[int, List[Tuple]]
+    ) -> None:
+        """Add finished pages drawn by another ``FPDF`` instance with the same
+        fonts, given as page content streams and links keyed by page number.
+        """
+        self.pages.update(pages)
+        self.page_links.update(links)
+        if self._fp is not None:
+            for n in sorted(pages):
+                self._putpage(n)
+
+    def _beginpage(self, orientation: str) -> None:
+        super()._beginpage(orientation)
+        self.flush()
+
+    def _out(self, s: Union[str, bytes]) -> None:
+        if self.state == 2:  # Add to the current page
+            super()._out(s)
+            return
+        if not isinstance(s, bytes):
+            s = str(s).encode("latin1")
+        self._fp.write(s + b"\n")
+        self._pos += len(s) + 1
+
+    def _newobj(self) -> None:
+        self.n += 1
+        self.offsets[self.n] = self._pos
+        self._out(f"{self.n} 0 obj")
+
+    def _putpage(self, n: int) -> None:
+        """Write a page and its content, and forget them. Mirrors
+        ``FPDF._putpages``.
+        """
+        # Pages can be written while another page is being drawn, so the state
+        # is changed to stop ``_out`` adding to the current page
+        page_obj, content_obj = self._page_objects(n)
+        last_obj, last_state = self.n, self.state
+        self.n, self.state = page_obj - 1, 1
+        if not self._pos:
+            self._putheader()
+        if self.def_orientation == "P":
+            w_pt, h_pt = self.fw_pt, self.fh_pt
+        else:
+            w_pt, h_pt = self.fh_pt, self.fw_pt
+        self._newobj()
+        self._out("<</Type /Page")
+        self._out("/Parent 1 0 R")
+        if n in self.orientation_changes:
+            self._out("/MediaBox [0 0 %.2f %.2f]" % (h_pt, w_pt))
+        self._out("/Resources 2 0 R")
+        if n in self.page_links:
+            annots = "/Annots ["
+            for pl in self.page_links.pop(n):
+                rect = "%.2f %.2f %.2f %.2f" % (
+                    pl[0],
+                    pl[1],
+                    pl[0] + pl[2],
+                    pl[1] - pl[3],
+                )
+                annots += (
+                    "<</Type /Annot /Subtype /Link /Rect ["
+                    + rect
+                    + "] /Border [0 0 0] "
+                )
+                if isinstance(pl[4], str):
+                    annots += "/A <</S /URI /URI " + self._textstring(pl[4])
+                    annots += ">>>>"
+                else:
+                    link = self.links[pl[4]]
+                    h = w_pt if link[0] in self.orientation_changes else h_pt
+                    annots += "/Dest [%d 0 R /XYZ 0 %.2f null]>>" % (
+                        self._page_objects(link[0])[0],
+                        h - link[1] * self.k,
+                    )
+            self._out(annots + "]")
+        if self.pdf_version > "1.3":
+            self._out(
+                "/Group <</Type /Group /S /Transparency /CS /DeviceRGB>>"
+            )
+        self._out(f"/Contents {content_obj} 0 R>>")
+        self._out("endobj")
+        content = self.pages.pop(n).encode("latin1")
+        if self.compress:
+            content = zlib.compress(content)
+        self.n = content_obj - 1
+        self._newobj()
+        self._out(
+            ("<</Filter /FlateDecode " if self.compress else "<<")
+            + f"/Length {len(content)}>>"
+        )
+        self._putstream(content)
+        self._out("endobj")
+        self.n, self.state = last_obj, last_state
+
+    def _page_objects(self, n: int) -> Tuple[int, int]:
+        """Find the page and content objects of page ``n``."""
+        if self._update is None:
+            return 1 + 2 * n, 2 + 2 * n
+        while len(self._page_objs) < n:  # Added pages are new objects
+            self._page_objs.append((self._size, self._size + 1))
+            self._size += 2
+        return self._page_objs[n - 1]
+
+    def _putinfo(self) -> None:
+        """Mirrors ``FPDF._putinfo``, with ``creation_date``."""
+        self._out(
+            "/Producer "
+            + self._textstring(
+                f"PyFPDF {FPDF_VERSION} http://pyfpdf.googlecode.com/"
+            )
+        )
+        for key in ("title", "subject", "author", "keywords", "creator"):
+            if hasattr(self, key):
+                self._out(
+                    f"/{key.capitalize()} "
+                    + self._textstring(getattr(self, key))
+                )
+        date = self.creation_date or datetime.now()
+        self._out(
+            "/CreationDate "
+            + self._textstring("D:" + date.strftime("%Y%m%d%H%M%S"))
+        )
+
+    def _putresources(self) -> None:
+        self._putfonts()
+        self._putimages()
+        self.offsets[2] = self._pos
+        self._out("2 0 obj")
+        self._out("<<")
+        self._putresourcedict()
+        self._out(">>")
+        self._out("endobj")
+
+    def _enddoc(self) -> None:
+        """Write the remaining pages and the rest of the document, or of the
+        incremental update. Mirrors ``FPDF._enddoc``.
+        """
+        if not self._pos:
+            self._putheader()
+        for n in sorted(self.pages):
+            self._putpage(n)
+        nb: int = self.page
+        kids = [self._page_objects(n)[0] for n in range(1, nb + 1)]
+        if self._update is None:
+            self.n = 2 + 2 * nb  # The objects of the pages
+        else:
+            self.n = self._size - 1
+        # Pages root
+        if self.def_orientation == "P":
+            w_pt, h_pt = self.fw_pt, self.fh_pt
+        else:
+            w_pt, h_pt = self.fh_pt, self.fw_pt
+        self.offsets[1] = self._pos
+        self._out("1 0 obj")
+        self._out("<</Type /Pages")
+        self._out("/Kids [" + "".join(f"{obj} 0 R " for obj in kids) + "]")
+        self._out(f"/Count {nb}")
+        self._out("/MediaBox [0 0 %.2f %.2f]" % (w_pt, h_pt))
+        self._out(">>")
+        self._out("endobj")
+        self._putresources()
+        if self._update is None:
+            # Info
+            self._newobj()
+            self._out("<<")
+            self._putinfo()
+            self._out(">>")
+            self._out("endobj")
+            # Catalog
+            self._newobj()
+            self._out("<<")
+            self._putcatalog()
+            self._out(">>")
+            self._out("endobj")
+            info, root = self.n - 1, self.n
+        else:  # The catalog is unchanged
+            info, root = self._update.info, self._update.root
+            self.offsets[info] = self._pos
+            self._out(f"{info} 0 obj")
+            self._out("<<")
+            self._putinfo()
+            self._out(">>")
+            self._out("endobj")
+        # Cross-ref
+        xref: int = self._pos
+        self._out("xref")
+        if self._update is None:
+            self._out(f"0 {self.n + 1}")
+            self._out("0000000000 65535 f ")
+            for i in range(1, self.n + 1):
+                self._out("%010d 00000 n " % self.offsets[i])
+        else:  # A subsection for each run of consecutive objects
+            self._out("0 1")  # The head of the list of free objects
+            self._out("0000000000 65535 f ")
+            objs = sorted(self.offsets)
+            starts = [
+                i for i, obj in enumerate(objs) if obj - 1 not in self.offsets
+            ]
+            for start, end in zip(starts, starts[1:] + [len(objs)]):
+                self._out(f"{objs[start]} {end - start}")
+                for obj in objs[start:end]:
+                    self._out("%010d 00000 n " % self.offsets[obj])
+        # Trailer
+        self._out("trailer")
+        self._out("<<")
+        if self._update is None:
+            self._puttrailer()
+        else:
+            self._out(f"/Size {self.n + 1}")
+            self._out(f"/Root {root} 0 R")
+            self._out(f"/Info {info} 0 R")
+            self._out(f"/Prev {self._update.xref}")
+        self._out(">>")
+        self._out("startxref")
+        self._out(xref)
+        self._out("%%EOF")
+        self.state = 3
+        self.document = DocumentState(
+            xref,
+            self.n + 1,
+            [self._page_objects(n) for n in range(1, nb + 1)],
+            info,
+            root,
+            self._pos,
+        )
@@ -22,7 +22,9 @@ setup(
     ],
     entry_points={
         "console_scripts": [
-            "c2p = commits2pdf.cli:main"
+            "c2p = commits2pdf.cli:main",
+            "c2p-serve = commits2pdf.serve:main",
+            "c2p-batch = commits2pdf.batch:main",
         ]
     },
     classifiers=[
@@ -0,0 +1,35 @@
+import shutil
+import sys
+from os import path
+
+import pytest
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import build_repo  # noqa: E402
+
+REPO_SIZE = 300
+
+
+@pytest.fixture(scope="session")
+def synthetic_repo(tmp_path_factory) -> str:
+    """A repository of ``REPO_SIZE`` commits by 8 authors, which must not be
+    changed.
+    """
+    return build_repo(
+        str(tmp_path_factory.mktemp("synthetic") / "repo"), REPO_SIZE, 8
+    )
+
+
+@pytest.fixture
+def repo(synthetic_repo, tmp_path) -> str:
+    """A copy of ``synthetic_repo`` which can be changed."""
+    return shutil.copytree(synthetic_repo, str(tmp_path / "repo"))
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch) -> str:
+    """Keep the caches of each test apart from the user's."""
+    monkeypatch.setenv("C2P_CACHE_DIR", str(tmp_path / "cache"))
+    return str(tmp_path / "cache")
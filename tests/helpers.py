@@ -0,0 +1,141 @@
+"""Helpers shared by the tests."""
+
+import re
+import subprocess
+import sys
+import zlib
+from contextlib import contextmanager
+from os import environ, path
+from typing import Dict, Iterator, List
+from unittest.mock import patch
+
+from commits2pdf.cli import main
+from commits2pdf.commits import Commits
+
+# Every option of ``Commits``, as ``c2p`` passes them by default
+COMMITS_DEFAULTS: Dict[str, object] = dict(
+    owner="owner",
+    url=None,
+    branch="main",
+    authors=None,
+    start_date=None,
+    end_date=None,
+    reverse=False,
+    newest_n_commits=None,
+    oldest_n_commits=None,
+    include=None,
+    exclude=None,
+    regex_queries=False,
+    engine="git-log",
+    stream=False,
+    cache=False,
+    cache_dir=None,
+    clear_cache=False,
+    cache_size=1_000_000,
+    clone_cache=True,
+    clone_cache_size=1024,
+    clone_filter="none",
+    after=None,
+)
+
+
+@contextmanager
+def open_commits(rpath: str, **options) -> Iterator[Commits]:
+    """Select the commits of ``rpath`` with ``options``, closing the repo
+    once they have been used.
+    """
+    commits = Commits(rpath=rpath, **{**COMMITS_DEFAULTS, **options})
+    assert not commits.err_flag
+    try:
+        yield commits
+    finally:
+        commits.close()
+
+
+def collect(rpath: str, **options) -> List[str]:
+    """The hexshas of the commits ``Commits`` selects from ``rpath``, in the
+    order they would be drawn in.
+    """
+    with open_commits(rpath, **options) as commits:
+        return [commit["hexsha_long"] for commit in commits.filtered_commits]
+
+
+def generate(repo: str, output: str, *argv: str, gen: str = "gen3") -> str:
+    """Generate the report of ``repo`` in the ``output`` directory with
+    ``c2p``, returning its path.
+    """
+    argv = ("c2p", "owner", "-rp", repo, "-o", output, "-n", "report") + (
+        f"-{gen}",
+        "-po",
+        *argv,
+    )
+    with patch.object(sys, "argv", list(argv)):
+        main()
+    return path.join(output, "report.pdf")
+
+
+def add_commits(
+    rpath: str, messages: List[str], timestamp: int, branch: str = "main"
+) -> None:
+    """Commit ``messages`` to ``branch`` of ``rpath``, a minute apart from
+    ``timestamp``, without changing its files.
+    """
+    for i, message in enumerate(messages):
+        date = f"{timestamp + i * 60} +0000"
+        env = dict(environ, GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date)
+        for role in ("AUTHOR", "COMMITTER"):
+            env[f"GIT_{role}_NAME"] = "New Author"
+            env[f"GIT_{role}_EMAIL"] = "new@example.com"
+        git = ["git", "-C", rpath]
+        hexsha = subprocess.run(
+            git
+            + ["commit-tree", f"{branch}^{{tree}}", "-p", branch]
+            + ["-m", message],
+            check=True,
+            env=env,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+        subprocess.run(
+            git + ["update-ref", f"refs/heads/{branch}", hexsha], check=True
+        )
+
+
+def pdf_objects(pdf: bytes) -> Dict[int, bytes]:
+    """The objects of a PDF by number, as of its last incremental update.
+    The cross-reference sections are read from the last one back through
+    ``/Prev``, so the latest offset of each object is used.
+    """
+    offsets: Dict[int, int] = {}
+    xref = int(re.findall(rb"startxref\s+(\d+)", pdf)[-1])
+    while xref is not None:
+        section, trailer = pdf[xref:].split(b"trailer", 1)
+        lines = section.split(b"\n")[1:]
+        i = 0
+        while i < len(lines) and b" " in lines[i].strip():
+            start, count = map(int, lines[i].split())
+            for n in range(count):
+                offset, _, kind = lines[i + 1 + n].split()
+                if kind == b"n":
+                    offsets.setdefault(start + n, int(offset))
+            i += count + 1
+        prev = re.search(rb"/Prev (\d+)", trailer.split(b">>", 1)[0])
+        xref = int(prev.group(1)) if prev else None
+    return {
+        n: pdf[offset : pdf.index(b"endobj", offset)]
+        for n, offset in offsets.items()
+    }
+
+
+def page_contents(pdf: bytes) -> List[bytes]:
+    """The decompressed content stream of each page of a PDF, found through
+    its pages root (object 1).
+    """
+    objects = pdf_objects(pdf)
+    kids = re.search(rb"/Kids \[([^\]]*)\]", objects[1]).group(1)
+    contents = []
+    for page in re.findall(rb"(\d+) 0 R", kids):
+        content = re.search(rb"/Contents (\d+) 0 R", objects[int(page)])
+        stream = objects[int(content.group(1))].split(b"stream\n", 1)[1]
+        contents.append(zlib.decompress(stream.rsplit(b"endstream", 1)[0]))
+    return contents
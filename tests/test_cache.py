@@ -0,0 +1,104 @@
+import sqlite3
+import subprocess
+
+from git import Repo
+from helpers import add_commits, collect
+
+from benchmarks.synthetic import START_TIMESTAMP
+from commits2pdf.cache import CACHE_FILENAME, CommitCache
+
+LATER = START_TIMESTAMP + 10**7  # After every commit of the synthetic repo
+
+
+def cached_count(cache_dir: str) -> int:
+    with sqlite3.connect(f"{cache_dir}/{CACHE_FILENAME}") as db:
+        return db.execute("SELECT COUNT(*) FROM commits").fetchone()[0]
+
+
+def test_cached_commits_are_the_same(repo, cache_dir):
+    expected = collect(repo)
+    assert collect(repo, cache=True) == expected  # Filling the cache
+    assert collect(repo, cache=True) == expected  # Reading from it
+    assert cached_count(cache_dir) == len(expected)
+    assert collect(repo, cache=True, reverse=True) == expected[::-1]
+
+
+def test_refresh_only_ingests_new_commits(repo, cache_dir):
+    with Repo(repo) as r:
+        cache = CommitCache(r, cache_dir, 1_000_000)
+        try:
+            assert cache.refresh("main") == 300
+            assert cache.refresh("main") == 0
+            add_commits(repo, ["new commit 1", "new commit 2"], LATER)
+            assert cache.refresh("main") == 2
+        finally:
+            cache.close()
+    assert collect(repo, cache=True) == collect(repo)
+
+
+def test_rewritten_history(repo, cache_dir):
+    collect(repo, cache=True)
+    # Replace the newest 10 commits with others
+    subprocess.run(
+        ["git", "-C", repo, "update-ref", "refs/heads/main", "main~10"],
+        check=True,
+    )
+    add_commits(repo, [f"rewritten {i}" for i in range(3)], LATER)
+    assert collect(repo, cache=True) == collect(repo)
+    assert len(collect(repo, cache=True)) == 293
+
+
+def test_clear_cache(repo, cache_dir):
+    collect(repo, cache=True)
+    with sqlite3.connect(f"{cache_dir}/{CACHE_FILENAME}") as db:
+        db.execute("UPDATE commits SET title = 'stale'")
+    # Non-ASCII queries are matched against the cached titles rather than by
+    # git
+    stale = dict(include=["stale", "✗"])
+    assert len(collect(repo, cache=True, **stale)) == 300
+    assert collect(repo, cache=True, clear_cache=True) == collect(repo)
+    assert collect(repo, cache=True, **stale) == []
+
+
+def test_least_recently_used_repos_are_evicted(repo, tmp_path, cache_dir):
+    other = str(tmp_path / "other")
+    subprocess.run(["git", "clone", "-q", repo, other], check=True)
+    add_commits(other, ["only in other"], LATER)
+    collect(repo, cache=True, cache_size=400)
+    # Caching the clone evicts ``repo``, which was used less recently
+    collect(other, cache=True, cache_size=400)
+    assert cached_count(cache_dir) == 301
+    assert collect(repo, cache=True, cache_size=400) == collect(repo)
+    assert cached_count(cache_dir) == 300
+
+
+def orphans(cache_dir: str) -> int:
+    with sqlite3.connect(f"{cache_dir}/{CACHE_FILENAME}") as db:
+        return db.execute(
+            "SELECT COUNT(*) FROM commits WHERE repo_id NOT IN (SELECT id"
+            " FROM repos)"
+        ).fetchone()[0]
+
+
+def test_repo_evicted_while_open_is_added_again(repo, cache_dir):
+    with Repo(repo) as r:
+        cache = CommitCache(r, cache_dir, 1_000_000)
+        try:
+            # As if another process evicted the repo after it was opened
+            with sqlite3.connect(f"{cache_dir}/{CACHE_FILENAME}") as db:
+                db.execute("DELETE FROM repos")
+            assert cache.refresh("main") == 300
+        finally:
+            cache.close()
+    assert orphans(cache_dir) == 0
+    assert collect(repo, cache=True) == collect(repo)
+
+
+def test_orphaned_commits_are_evicted(repo, cache_dir):
+    collect(repo, cache=True)
+    with sqlite3.connect(f"{cache_dir}/{CACHE_FILENAME}") as db:
+        for table in ("commits", "tips"):
+            db.execute(f"UPDATE {table} SET repo_id = -1")
+    collect(repo, cache=True, cache_size=400)
+    assert orphans(cache_dir) == 0
+    assert cached_count(cache_dir) == 300
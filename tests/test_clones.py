@@ -0,0 +1,79 @@
+import threading
+from os import listdir, makedirs, path, utime
+
+from helpers import COMMITS_DEFAULTS
+
+from commits2pdf.clones import CloneCache, FileLock
+from commits2pdf.commits import Commits
+
+
+def make_entry(cache_dir, name: str, age: int) -> str:
+    entry = path.join(cache_dir, name)
+    makedirs(path.join(entry, "objects"))
+    with open(path.join(entry, "objects", "pack"), "w") as f:
+        f.write("x" * 100)
+    lock = FileLock(f"{entry}.lock")
+    lock.acquire()
+    lock.release()
+    utime(entry, (age, age))
+    return entry
+
+
+def test_evict_removes_entries_and_their_locks(tmp_path):
+    cache = CloneCache(str(tmp_path), 150)
+    old, in_use, new = (
+        make_entry(tmp_path, name, age)
+        for age, name in enumerate(("old", "in-use", "new"), 1)
+    )
+    lock = FileLock(f"{in_use}.lock")
+    lock.acquire()
+    try:
+        assert cache.evict(keep=new) == [old]
+    finally:
+        lock.release()
+    assert sorted(listdir(tmp_path)) == [
+        "in-use",
+        "in-use.lock",
+        "new",
+        "new.lock",
+    ]
+
+
+def test_waiting_for_a_deleted_lock(tmp_path):
+    file = str(tmp_path / "entry.lock")
+    held, waiting, acquired = FileLock(file), FileLock(file), []
+    held.acquire()
+    waiter = threading.Thread(
+        target=lambda: acquired.append(waiting.acquire())
+    )
+    waiter.start()
+    waiter.join(0.3)
+    assert not acquired
+    held.release(delete=True)
+    waiter.join(5)
+    # The waiter locked the file which replaced the deleted one
+    assert acquired == [True]
+    assert not FileLock(file).acquire(blocking=False)
+
+
+def test_failed_fetch_keeps_the_cached_clone(synthetic_repo, cache_dir):
+    def cached_clone(branch: str) -> Commits:
+        commits = Commits.__new__(Commits)
+        commits.__dict__.update(
+            COMMITS_DEFAULTS,
+            url=f"file://{synthetic_repo}",
+            branch=branch,
+            cache_dir=cache_dir,
+            fetched=None,
+        )
+        return commits
+
+    commits = cached_clone("main")
+    assert commits._get_cached_clone() is not None
+    commits._clone_lock.release()
+
+    commits = cached_clone("missing")
+    commits._resolve_remote_branch = lambda: True  # Fetching it fails
+    assert commits._get_cached_clone() is None
+    commits._clone_lock.release()
+    assert path.isdir(path.join(commits.rpath, "objects"))
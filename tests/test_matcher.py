@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from commits2pdf.args import parser
+from commits2pdf.batch import job_argv
+from commits2pdf.cli import _validate_args
+from commits2pdf.matcher import TRIE_THRESHOLD, QueryMatcher
+
+WORDS = "fix fixes fixed prefix add added parser parse über ÜBER ß ss".split()
+
+
+def naive(queries, title, description):
+    """Match queries the way ``QueryMatcher`` does without a trie."""
+    return any(
+        q.casefold() in title.casefold()
+        or q.casefold() in description.casefold()
+        for q in queries
+    )
+
+
+@pytest.mark.parametrize("n_queries", [1, TRIE_THRESHOLD, 40])
+def test_matches_like_substring_search(n_queries):
+    rng = random.Random(n_queries)
+    words = WORDS + [f"w{i}" for i in range(60)]
+    queries = rng.sample(words, n_queries)
+    matcher = QueryMatcher(queries)
+    for _ in range(500):
+        title = " ".join(rng.choices(words, k=rng.randint(0, 6)))
+        description = "".join(rng.choices(words, k=rng.randint(0, 6)))
+        assert matcher.matches(title, description) == naive(
+            queries, title, description
+        )
+
+
+def test_trie_matches_shared_prefixes():
+    queries = ["fix", "fixes", "fixed", "prefix", "pre"] + [
+        f"q{i}" for i in range(TRIE_THRESHOLD)
+    ]
+    matcher = QueryMatcher(queries)
+    assert matcher._pattern is not None
+    assert matcher.matches("Fixed the parser", "")
+    assert matcher.matches("", "a PREFIX")
+    assert matcher.matches("q12", "")
+    assert not matcher.matches("fi xed", "q")
+
+
+def test_trie_queries_are_literal():
+    queries = [".*", "a+b", "(x)"] + [f"q{i}" for i in range(TRIE_THRESHOLD)]
+    matcher = QueryMatcher(queries)
+    assert matcher.matches("a+b", "")
+    assert matcher.matches("", "(x)")
+    assert not matcher.matches("aab", "x")
+
+
+def test_no_match_across_title_and_description():
+    for n in (1, TRIE_THRESHOLD):
+        queries = ["endstart"] + [f"q{i}" for i in range(n - 1)]
+        assert not QueryMatcher(queries).matches("end", "start")
+
+
+def test_regex_queries():
+    matcher = QueryMatcher([r"#\d*7\b", "^fix"], regex=True)
+    assert matcher.matches("Add parser #17", "")
+    assert matcher.matches("FIX the cache", "")
+    assert not matcher.matches("Add parser #71", "no fix")
+
+
+def queries(*argv: str):
+    """The include and exclude queries of ``c2p`` given ``argv``."""
+    return _validate_args(parser.parse_args(["owner", *argv]))[5:7]
+
+
+def test_regex_queries_are_not_split_on_commas():
+    assert queries("-in", "fix,add", "-ex", "a") == (["fix", "add"], ["a"])
+    include, exclude = queries("-rx", "-in", r"#\d{2,3}\b", "-ex", "a,b")
+    assert include == [r"#\d{2,3}\b"] and exclude == ["a,b"]
+    matcher = QueryMatcher(include, regex=True)
+    assert matcher.matches("Add parser #17", "")
+    assert not matcher.matches("Add parser #7", "")
+
+
+def test_batch_regex_queries_match_any_of_them():
+    def include(**options):
+        return job_argv({"include": [r"\d{2,3}", "fix"], **options})[0]
+
+    assert include() == r"--include=\d{2,3},fix"
+    expected = r"--include=(?:\d{2,3})|(?:fix)"
+    assert include(regex_queries=True) == expected
+    assert include(args=["-rx"]) == expected
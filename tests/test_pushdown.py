@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import pytest
+from helpers import collect, open_commits
+
+from benchmarks.synthetic import START_TIMESTAMP
+from commits2pdf.commits import Commits
+
+AUTHORS = "author1@example.com,author2@example.com,author3@example.com"
+FILTERS = {
+    "authors": dict(authors=AUTHORS),
+    "non-ascii authors": dict(
+        authors="auteur@exämple.com,author1@example.com"
+    ),
+    "include": dict(include=["fix", "PARSER"]),
+    "include, non-ascii": dict(include=["über", "café"]),
+    "include, ss": dict(include=["ss", "add"]),
+    "exclude": dict(exclude=["add", "Cache"]),
+    "include and exclude": dict(include=["fix"], exclude=["parser"]),
+    "include and authors": dict(include=["fix"], authors=AUTHORS),
+    "regex": dict(include=[r"#\d*7\b"], regex_queries=True),
+    "dates": dict(
+        start_date=datetime.fromtimestamp(START_TIMESTAMP + 300 * 150),
+        end_date=datetime.fromtimestamp(START_TIMESTAMP + 300 * 450),
+    ),
+    "newest n": dict(newest_n_commits=25, include=["fix"]),
+    "oldest n, reversed": dict(
+        oldest_n_commits=25, authors=AUTHORS, reverse=True
+    ),
+}
+
+
+def python_filters(self):
+    """Apply every filter in Python instead of pushing them down to git."""
+    self._git_filters = {}
+    return [
+        name
+        for name in ("include", "exclude", "authors")
+        if getattr(self, name)
+    ]
+
+
+@pytest.fixture(scope="module")
+def expected(synthetic_repo):
+    """The commits each filter selects when it is applied in Python."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(Commits, "_pushdown_filters", python_filters)
+        return {
+            name: collect(synthetic_repo, engine="gitpython", **options)
+            for name, options in FILTERS.items()
+        }
+
+
+@pytest.mark.parametrize("engine", ["gitpython", "git-log", "cache"])
+@pytest.mark.parametrize("name", FILTERS)
+def test_pushdown_selects_the_same_commits(
+    synthetic_repo, expected, engine, name
+):
+    options = dict(FILTERS[name])
+    if engine == "cache":
+        options["cache"] = True
+    else:
+        options["engine"] = engine
+    assert collect(synthetic_repo, **options) == expected[name]
+    assert 0 < len(expected[name]) < 300
+
+
+@pytest.mark.parametrize("name", ["authors", "include", "exclude"])
+def test_filters_are_pushed_down(synthetic_repo, name):
+    with open_commits(synthetic_repo, **FILTERS[name]) as commits:
+        assert commits._git_filters
+        assert name not in commits._python_filters
+
+
+def test_streamed_commits_are_the_same(synthetic_repo, expected):
+    for name, options in FILTERS.items():
+        assert collect(synthetic_repo, stream=True, **options) == (
+            expected[name]
+        )
@@ -0,0 +1,71 @@
+from os import listdir, remove, utime
+
+import pytest
+from helpers import add_commits, generate
+
+from benchmarks.synthetic import START_TIMESTAMP
+from commits2pdf.reports import ReportCache, report_key, resolve_report
+
+
+def read(pdf: str) -> bytes:
+    with open(pdf, "rb") as f:
+        return f.read()
+
+
+def test_report_key():
+    options = {"gen": "gen3", "dark": False, "authors": None}
+    key = report_key("a" * 40, options)
+    assert key == report_key("a" * 40, dict(reversed(options.items())))
+    assert key != report_key("b" * 40, options)
+    assert key != report_key("a" * 40, {**options, "dark": True})
+
+
+@pytest.mark.parametrize(
+    "name, value",
+    [
+        ("strftime", lambda fmt: "+9999"),
+        ("__version__", "0.0.0"),
+        ("FPDF_VERSION", "0.0.0"),
+    ],
+)
+def test_report_key_changes_with_the_environment(monkeypatch, name, value):
+    key = report_key("a" * 40, {})
+    monkeypatch.setattr(f"commits2pdf.reports.{name}", value)
+    assert report_key("a" * 40, {}) != key
+
+
+def test_resolve_report(synthetic_repo):
+    tip, rname = resolve_report(synthetic_repo, None, "main")
+    assert len(tip) == 40 and rname == "repo"
+    # The active branch is used if the branch does not exist, like Commits
+    assert resolve_report(synthetic_repo, None, "missing")[0] == tip
+    assert resolve_report(synthetic_repo + "-missing", None, "main") is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ReportCache(str(tmp_path), 250)
+    assert cache.get("a") is None
+    cache.put("a", b"a" * 100)
+    cache.put("b", b"b" * 100)
+    for age, key in enumerate("ab", 1):  # Timestamps may be coarse
+        utime(tmp_path / f"{key}.pdf", (age, age))
+    assert read(cache.get("a")) == b"a" * 100  # Now used more recently
+    assert cache.put("c", b"c" * 100) == [str(tmp_path / "b.pdf")]
+    assert cache.get("b") is None
+    assert sorted(listdir(tmp_path)) == ["a.pdf", "c.pdf"]
+
+
+def test_cached_reports_are_copied(repo, tmp_path, monkeypatch, caplog):
+    monkeypatch.chdir(tmp_path)  # Output directories must be relative
+    generated = read(generate(repo, "out", "-rc"))
+    remove(tmp_path / "out" / "report.pdf")
+    caplog.clear()
+    assert read(generate(repo, "out", "-rc")) == generated
+    assert "Copied the cached report" in caplog.text
+
+    # Reports with other options, or of another tip, are generated
+    caplog.clear()
+    assert read(generate(repo, "out", "-rc", "-d")) != generated
+    add_commits(repo, ["new commit"], START_TIMESTAMP + 10**7)
+    assert read(generate(repo, "out", "-rc")) != generated
+    assert "Copied the cached report" not in caplog.text
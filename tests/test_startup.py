@@ -0,0 +1,65 @@
+import subprocess
+import sys
+
+import pytest
+from conftest import ROOT
+
+from benchmarks.bench_startup import BUDGET, import_times
+
+# The packages which must only be imported once they are used
+HEAVY = {"cairo", "fpdf", "git", "numpy", "pathvalidate", "sqlite3", "tqdm"}
+# Runs ``c2p`` with the arguments after ``-c`` (or nothing if there are none),
+# then lists the imported modules on the last line
+CODE = """
+import sys
+if sys.argv[1:]:
+    from commits2pdf.cli import main
+    try:
+        main()
+    except SystemExit:
+        pass
+print("\\n" + "\\0".join(sys.modules))
+"""
+# How many times ``bench_startup``'s budget starting may take, as machines
+# running the tests may be slower than the one the budget was set on
+MARGIN = 3
+
+
+def imported_packages(argv) -> set:
+    stdout = subprocess.run(
+        [sys.executable, "-c", CODE] + argv,
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    modules = stdout.rsplit("\n", 2)[-2].split("\0")
+    return {module.split(".")[0] for module in modules}
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["-h"],
+        ["owner", "-s", "31/02/2024"],
+        ["owner", "-a", "not-an-email"],
+        ["owner", "-eng", "cobol"],
+    ],
+)
+def test_startup_only_imports_the_standard_library(argv):
+    # Less the modules imported by the interpreter itself (and ``site``)
+    packages = imported_packages(argv) - imported_packages([])
+    assert "commits2pdf" in packages
+    assert packages & HEAVY == set()
+    if hasattr(sys, "stdlib_module_names"):  # Python 3.10+
+        assert packages - {"commits2pdf"} <= set(sys.stdlib_module_names)
+
+
+def test_startup_is_within_the_budget():
+    def import_time(argv) -> int:
+        return sum(cumulative for _, cumulative in import_times(argv).values())
+
+    assert "commits2pdf.args" in import_times(["-h"])
+    # Less the modules imported by the interpreter itself (and ``site``)
+    best = min(import_time(["-h"]) for _ in range(3)) - import_time(None)
+    assert best / 1000 < BUDGET * MARGIN
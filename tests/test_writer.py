@@ -0,0 +1,99 @@
+import json
+import re
+from typing import Dict
+
+import pytest
+from git import Repo
+from helpers import add_commits, generate, page_contents, pdf_objects
+
+from benchmarks.synthetic import START_TIMESTAMP
+from commits2pdf.append import APPEND_STATE
+
+TIMESTAMP = START_TIMESTAMP + 10**7
+# Enough authors (including those of the synthetic repo and of added commits)
+# that the title page does not fit on one page
+AUTHORS = ",".join(
+    [f"author{i}@example.com" for i in range(100)] + ["new@example.com"]
+)
+
+
+@pytest.fixture(autouse=True)
+def fixed_time(tmp_path, monkeypatch):
+    """Generate every report at ``TIMESTAMP`` in ``tmp_path``."""
+    monkeypatch.chdir(tmp_path)  # Output directories must be relative
+    monkeypatch.setattr("commits2pdf.render_fpdf.time", lambda: TIMESTAMP)
+
+
+def read(pdf: str) -> bytes:
+    with open(pdf, "rb") as f:
+        return f.read()
+
+
+def objects(pdf: str) -> Dict[int, bytes]:
+    """The objects of ``pdf``, apart from its document information, which
+    has the time it was written at.
+    """
+    data = read(pdf)
+    assert data.startswith(b"%PDF-") and data.endswith(b"%%EOF\n")
+    return {
+        n: obj
+        for n, obj in pdf_objects(data).items()
+        if b"/CreationDate" not in obj
+    }
+
+
+@pytest.mark.parametrize("gen", ["gen2a", "gen2b", "gen3"])
+def test_stream_write_writes_the_same_objects(synthetic_repo, gen):
+    buffered = generate(synthetic_repo, "buffered", gen=gen)
+    streamed = generate(synthetic_repo, "streamed", "-sw", gen=gen)
+    assert objects(streamed) == objects(buffered)
+
+
+def test_parallel_gen3_writes_the_same_objects(synthetic_repo):
+    serial = generate(synthetic_repo, "serial", "-sw")
+    parallel = generate(synthetic_repo, "parallel", "-sw", "-j", "2")
+    assert objects(parallel) == objects(serial)
+
+
+def test_title_page_breaks_onto_more_pages(synthetic_repo):
+    buffered = generate(synthetic_repo, "buffered", "-a", AUTHORS)
+    streamed = generate(synthetic_repo, "streamed", "-a", AUTHORS, "-sw")
+    assert objects(streamed) == objects(buffered)
+
+    pages = page_contents(read(buffered))
+    last = next(
+        i for i, page in enumerate(pages) if b"(Commit count: 300)" in page
+    )
+    assert last > 0
+    for page in pages[: last + 1]:  # Nothing is drawn below the page
+        positions = re.findall(rb"BT [\d.]+ (-?[\d.]+) Td", page)
+        assert positions and min(map(float, positions)) > 0
+
+
+def state(pdf: str) -> dict:
+    with open(APPEND_STATE.format(pdf)) as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("argv", [[], ["-a", AUTHORS]])
+def test_append(repo, argv):
+    pdf = generate(repo, "out", "-ap", *argv)
+    original = read(pdf)
+    assert state(pdf)["commit_count"] == 300
+
+    add_commits(repo, [f"appended {i}\n\nbody" for i in range(60)], TIMESTAMP)
+    generate(repo, "out", "-ap", *argv)
+    appended = read(pdf)
+    # An incremental update of the original PDF
+    assert appended.startswith(original)
+    assert b"/Prev" in appended[len(original) :]
+    assert len(page_contents(appended)) > len(page_contents(original))
+    # With the same pages as generating the whole report again
+    assert page_contents(appended) == page_contents(
+        read(generate(repo, "fresh", *argv))
+    )
+
+    with Repo(repo) as r:
+        assert state(pdf)["hexsha"] == r.heads.main.commit.hexsha
+    generate(repo, "out", "-ap", *argv)  # Already up to date
+    assert read(pdf) == appended